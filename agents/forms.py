@@ -15,3 +15,20 @@ class AgentModelForm(forms.ModelForm):
       'first_name',
       'last_name'
     )
+
+
+class AgentInviteForm(forms.Form):
+  file = forms.FileField(help_text='CSV with a header row')
+
+
+class AgentInviteRowForm(AgentModelForm):
+  """One row of an agent invite file"""
+
+  def __init__(self, *args, **kwargs):
+    super(AgentInviteRowForm, self).__init__(*args, **kwargs)
+    # The invitation is mailed
+    self.fields['email'].required = True
+
+  def validate_unique(self):
+    # Checked for the whole file with one query, see agents.invites
+    pass
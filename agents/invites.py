@@ -0,0 +1,94 @@
+from django.contrib.auth.tokens import PasswordResetTokenGenerator
+from django.db import transaction
+from django.shortcuts import reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+from leads.caching import bump_organization_version
+from leads.importer import UNREADABLE_FILE_ERRORS, ImportResult, unreadable_file_message
+from leads.models import User, UserProfile, Agent, OutboxEmail
+from leads.outbox import build_mail
+from .forms import AgentInviteRowForm
+
+
+# Agent invitations. Agents are created with an unusable password, which
+# involves no hashing, and are mailed a link with a signed token to choose
+# their own. The token covers the stored password, so it stops working once
+# the password is set, and it expires after PASSWORD_RESET_TIMEOUT.
+
+INVITE_FROM_EMAIL = 'invite@globalcrm.org'
+INVITE_SUBJECT = 'Global CRM has invited you to be an Agent'
+INVITE_MESSAGE = (
+  'You were added as an agent on Global CRM. Please choose your password to start working '
+  'with your assigned leads:\n\n{url}\n'
+)
+
+
+class InviteTokenGenerator(PasswordResetTokenGenerator):
+  key_salt = 'agents.invites.InviteTokenGenerator'
+
+
+invite_token_generator = InviteTokenGenerator()
+
+
+def invite_path(user):
+  uidb64 = urlsafe_base64_encode(force_bytes(user.pk))
+  return reverse('agents:agent-invite-accept', args=[uidb64, invite_token_generator.make_token(user)])
+
+
+def invitation(user, build_url):
+  """The unsaved invite mail of an agent"""
+  return build_mail(
+    INVITE_SUBJECT, INVITE_MESSAGE.format(url=build_url(invite_path(user))), INVITE_FROM_EMAIL, [user.email]
+  )
+
+
+@transaction.atomic
+def invite_agents(organization, users, build_url):
+  """
+  Create agents of an organization from unsaved users and queue their
+  invitations, `build_url` turns the invite path into an absolute URL.
+  """
+  for user in users:
+    user.is_agent = True
+    user.is_organizer = False
+    user.set_unusable_password()
+  User.objects.bulk_create(users)
+  # bulk_create() skips the post_save signal that gives every user a profile
+  UserProfile.objects.bulk_create([UserProfile(user=user) for user in users])
+  agents = Agent.objects.bulk_create([Agent(user=user, organization=organization) for user in users])
+  OutboxEmail.objects.bulk_create([invitation(user, build_url) for user in users])
+  bump_organization_version(organization.pk)
+  return agents
+
+
+def invite_agents_from_rows(organization, rows, build_url, max_errors=100):
+  """Validate (line number, row) pairs and invite the valid rows all at once"""
+  result = ImportResult(max_errors)
+  users = {}
+  try:
+    for line_number, row in rows:
+      form = AgentInviteRowForm(data=row)
+      if not form.is_valid():
+        errors = [f'{field}: {error}' for field, field_errors in form.errors.items() for error in field_errors]
+        result.add_error(line_number, '; '.join(errors))
+        continue
+      user = form.save(commit=False)
+      if user.username in users:
+        result.add_error(line_number, f'username: "{user.username}" is repeated in the file')
+        continue
+      user.line_number = line_number
+      users[user.username] = user
+  except UNREADABLE_FILE_ERRORS as e:
+    # Nothing is created from a file that can't be read to the end
+    result.unreadable = unreadable_file_message(e)
+    return result
+
+  taken = User.objects.filter(username__in=users).values_list('username', flat=True)
+  for username in taken:
+    user = users.pop(username)
+    result.add_error(user.line_number, f'username: a user named "{username}" already exists')
+  result.errors.sort()
+  if users:
+    invite_agents(organization, list(users.values()), build_url)
+  result.created = len(users)
+  return result
@@ -1,3 +1,73 @@
+import re
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.shortcuts import reverse
 from django.test import TestCase
+from leads.models import User, UserProfile, Agent, OutboxEmail
 
-# Create your tests here.
+
+CSV = b"""email,username,first_name,last_name
+ann@test.com,ann,Ann,Lee
+not-an-email,bob,Bob,Ray
+cat@test.com,organizer,Cat,Poe
+dan@test.com,ann,Dan,Roe
+eve@test.com,eve,Eve,Moss
+"""
+
+
+class AgentInviteTest(TestCase):
+
+  def setUp(self):
+    self.organizer = User.objects.create_user(username='organizer')
+    self.client.force_login(self.organizer)
+
+  def invite_url(self, email):
+    body = OutboxEmail.objects.get(recipients=[email]).body
+    return re.search(r'http://testserver(\S+)', body).group(1)
+
+  def test_create_agent_queues_an_invite_without_hashing(self):
+    data = {'email': 'ann@test.com', 'username': 'ann', 'first_name': 'Ann', 'last_name': 'Lee'}
+    self.assertRedirects(self.client.post(reverse('agents:agent-create'), data), reverse('agents:agent-list'))
+    user = User.objects.get(username='ann')
+    self.assertFalse(user.has_usable_password())
+    self.assertTrue(user.is_agent)
+    self.assertEqual(Agent.objects.get(user=user).organization, self.organizer.userprofile)
+    self.assertIn('/agents/invite/', self.invite_url('ann@test.com'))
+
+  def test_csv_invites_the_valid_rows(self):
+    upload = SimpleUploadedFile('agents.csv', CSV, content_type='text/csv')
+    # The same queries for any number of rows
+    with self.assertNumQueries(9):
+      response = self.client.post(reverse('agents:agent-invite'), {'file': upload})
+    result = response.context['result']
+    self.assertEqual((result.created, result.failed), (2, 3))
+    self.assertEqual([line for line, _ in result.errors], [3, 4, 5])
+    agents = Agent.objects.filter(organization=self.organizer.userprofile).order_by('user__username')
+    self.assertEqual([agent.user.username for agent in agents], ['ann', 'eve'])
+    self.assertEqual(UserProfile.objects.filter(user__username__in=['ann', 'eve']).count(), 2)
+    self.assertEqual(OutboxEmail.objects.count(), 2)
+
+  def test_csv_that_is_not_utf8_invites_nobody(self):
+    upload = SimpleUploadedFile('agents.csv', CSV.replace(b'Moss', 'Moß'.encode('latin-1')), content_type='text/csv')
+    response = self.client.post(reverse('agents:agent-invite'), {'file': upload})
+    self.assertEqual(response.status_code, 200)
+    message = 'The file is not UTF-8 encoded text, no agents were invited'
+    self.assertFormError(response.context['form'], 'file', message)
+    self.assertFalse(Agent.objects.exists())
+    self.assertFalse(OutboxEmail.objects.exists())
+
+  def test_invite_link_sets_the_password_once(self):
+    self.client.post(reverse('agents:agent-create'), {'email': 'ann@test.com', 'username': 'ann'})
+    url = self.invite_url('ann@test.com')
+    self.client.logout()
+
+    response = self.client.get(url, follow=True)
+    self.assertTrue(response.context['validlink'])
+    password = {'new_password1': 'correct horse battery', 'new_password2': 'correct horse battery'}
+    response = self.client.post(response.redirect_chain[-1][0], password)
+    self.assertRedirects(response, reverse('leads:lead-list'), fetch_redirect_response=False)
+    user = User.objects.get(username='ann')
+    self.assertTrue(user.check_password('correct horse battery'))
+    self.assertEqual(int(self.client.session['_auth_user_id']), user.pk)
+
+    self.client.logout()
+    self.assertFalse(self.client.get(url, follow=True).context['validlink'])
@@ -1,5 +1,8 @@
 from django.urls import path
-from .views import AgentListView, AgentCreateView, AgentDetailView, AgentUpdateView, AgentDeleteView
+from .views import (
+    AgentListView, AgentCreateView, AgentDetailView, AgentUpdateView, AgentDeleteView, AgentInviteView,
+    AgentInviteResendView, AgentInviteAcceptView
+)
 
 
 app_name = 'agents'
@@ -8,7 +11,10 @@ app_name = 'agents'
 urlpatterns = [
     path('', AgentListView.as_view(), name='agent-list'),
     path('create/', AgentCreateView.as_view(), name='agent-create'),
+    path('invite/', AgentInviteView.as_view(), name='agent-invite'),
+    path('invite/<uidb64>/<token>/', AgentInviteAcceptView.as_view(), name='agent-invite-accept'),
     path('<int:pk>/', AgentDetailView.as_view(), name='agent-detail'),
     path('<int:pk>/update', AgentUpdateView.as_view(), name='agent-update'),
-    path('<int:pk>/delete', AgentDeleteView.as_view(), name='agent-delete')
+    path('<int:pk>/delete', AgentDeleteView.as_view(), name='agent-delete'),
+    path('<int:pk>/invite', AgentInviteResendView.as_view(), name='agent-invite-resend')
 ]
@@ -1,10 +1,13 @@
+from django.contrib.auth.views import PasswordResetConfirmView
+from django.http import HttpResponseRedirect
 from django.views import generic
-from django.shortcuts import reverse
-from django.core.mail import send_mail
+from django.shortcuts import reverse, get_object_or_404
+from django.urls import reverse_lazy
+from leads.importer import open_upload, read_csv
 from leads.models import Agent
-from .forms import AgentModelForm
+from .forms import AgentModelForm, AgentInviteForm
+from .invites import invitation, invite_agents, invite_agents_from_rows, invite_token_generator
 from .mixin import OrganizerAndLoginRequiredMixin
-import random
 
 
 # CRUD+L - Create, Retrieve (Read), Update, Delete, and List
@@ -14,8 +17,7 @@ class AgentListView(OrganizerAndLoginRequiredMixin, generic.ListView):
   template_name = 'agents/agent_list.html'
   
   def get_queryset(self):
-    organization = self.request.user.userprofile
-    return Agent.objects.filter(organization=organization)
+    return Agent.objects.for_user(self.request.user)
 
 
 class AgentCreateView(OrganizerAndLoginRequiredMixin, generic.CreateView):
@@ -26,22 +28,44 @@ class AgentCreateView(OrganizerAndLoginRequiredMixin, generic.CreateView):
     return reverse('agents:agent-list')
   
   def form_valid(self, form):
-    user = form.save(commit=False)
-    user.is_agent = True
-    user.is_organizer = False
-    user.set_password(f"{random.randint(0, 1000000)}")
-    user.save()
-    Agent.objects.create(
-      user=user, 
-      organization=self.request.user.userprofile
-      )
-    send_mail(
-      subject='Global CRM has invited you to be an Agent',
-      message='You were added as an agent on Global CRM. Please come and login to start working with your assigned leads.',
-      from_email='invite@globalcrm.org',
-      recipient_list=[user.email]
+    # The agent chooses a password from the mailed invite link
+    self.object = form.save(commit=False)
+    invite_agents(self.request.tenant.organization, [self.object], self.request.build_absolute_uri)
+    return HttpResponseRedirect(self.get_success_url())
+
+
+class AgentInviteView(OrganizerAndLoginRequiredMixin, generic.FormView):
+  template_name = 'agents/agent_invite.html'
+  form_class = AgentInviteForm
+
+  def form_valid(self, form):
+    result = invite_agents_from_rows(
+      self.request.tenant.organization, read_csv(open_upload(form.cleaned_data['file'])),
+      self.request.build_absolute_uri
     )
-    return super(AgentCreateView, self).form_valid(form)
+    if result.unreadable:
+      form.add_error('file', f'{result.unreadable}, no agents were invited')
+      return self.form_invalid(form)
+    return self.render_to_response(self.get_context_data(form=form, result=result))
+
+
+class AgentInviteResendView(OrganizerAndLoginRequiredMixin, generic.View):
+  """Mail a new invite link to an agent that hasn't chosen a password yet"""
+  http_method_names = ['post']
+
+  def post(self, request, *args, **kwargs):
+    agent = get_object_or_404(Agent.objects.for_user(request.user).select_related('user'), pk=kwargs['pk'])
+    if not agent.user.has_usable_password():
+      invitation(agent.user, request.build_absolute_uri).save()
+    return HttpResponseRedirect(reverse('agents:agent-detail', args=[agent.pk]))
+
+
+class AgentInviteAcceptView(PasswordResetConfirmView):
+  """Password reset confirmation with the invite token, logging the new agent in"""
+  template_name = 'agents/agent_invite_accept.html'
+  token_generator = invite_token_generator
+  post_reset_login = True
+  success_url = reverse_lazy('leads:lead-list')
 
 
 class AgentDetailView(OrganizerAndLoginRequiredMixin, generic.DetailView):
@@ -49,8 +73,7 @@ class AgentDetailView(OrganizerAndLoginRequiredMixin, generic.DetailView):
   context_object_name = 'agent'
 
   def get_queryset(self):
-    organization = self.request.user.userprofile
-    return Agent.objects.filter(organization=organization)
+    return Agent.objects.for_user(self.request.user)
 
 
 class AgentUpdateView(OrganizerAndLoginRequiredMixin, generic.UpdateView):
@@ -61,7 +84,7 @@ class AgentUpdateView(OrganizerAndLoginRequiredMixin, generic.UpdateView):
     return reverse('agents:agent-list')
   
   def get_queryset(self):
-    return Agent.objects.all()
+    return Agent.objects.for_user(self.request.user)
 
 
 class AgentDeleteView(OrganizerAndLoginRequiredMixin, generic.DeleteView):
@@ -72,5 +95,4 @@ class AgentDeleteView(OrganizerAndLoginRequiredMixin, generic.DeleteView):
     return reverse('agents:agent-list')
 
   def get_queryset(self):
-    organization = self.request.user.userprofile
-    return Agent.objects.filter(organization=organization)
+    return Agent.objects.for_user(self.request.user)
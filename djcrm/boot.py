@@ -0,0 +1,100 @@
+import hashlib
+import os
+from django.conf import settings
+from django.contrib.staticfiles.finders import get_finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.db import connections
+from django.db.migrations.executor import MigrationExecutor
+from django.template import engines
+from django.template.exceptions import TemplateSyntaxError
+from django.urls import URLResolver, get_resolver
+from django.utils import translation
+
+
+# Container start up. `manage.py boot` (see runserver.sh) only runs
+# collectstatic when the static sources changed since the last run and only
+# migrates when migrations are pending, and gunicorn.conf.py calls warm_up()
+# in the master so that every forked worker starts with its code imported,
+# its URL patterns compiled and its templates parsed.
+
+# Same as collectstatic's defaults
+STATIC_IGNORE_PATTERNS = ['CVS', '.*', '*~']
+STATIC_HASH_FILE = '.sources.sha256'
+
+
+def static_sources_hash():
+  """Digest of every file collectstatic would copy, and of the settings that change its output"""
+  digest = hashlib.sha256()
+  digest.update(f'{settings.STATICFILES_STORAGE}\0{settings.STATIC_URL}\0'.encode())
+  for finder in get_finders():
+    for path, storage in sorted(finder.list(STATIC_IGNORE_PATTERNS), key=lambda item: item[0]):
+      digest.update(path.encode() + b'\0')
+      with storage.open(path) as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+          digest.update(chunk)
+  return digest.hexdigest()
+
+
+def static_hash_path():
+  return os.path.join(settings.STATIC_ROOT, STATIC_HASH_FILE)
+
+
+def static_is_current(digest):
+  manifest = getattr(staticfiles_storage, 'manifest_name', None)
+  if manifest and not os.path.exists(os.path.join(settings.STATIC_ROOT, manifest)):
+    return False
+  try:
+    with open(static_hash_path()) as f:
+      return f.read().strip() == digest
+  except OSError:
+    return False
+
+
+def save_static_hash(digest):
+  with open(static_hash_path(), 'w') as f:
+    f.write(digest)
+
+
+def pending_migrations(database='default'):
+  executor = MigrationExecutor(connections[database])
+  return executor.migration_plan(executor.loader.graph.leaf_nodes())
+
+
+def compile_urls(resolver):
+  # reverse_dict populates the resolver, each pattern's regex is compiled on first access
+  resolver.reverse_dict
+  for pattern in resolver.url_patterns:
+    if isinstance(pattern, URLResolver):
+      compile_urls(pattern)
+    else:
+      pattern.pattern.regex
+
+
+def project_templates():
+  """(engine, template name) of every template in the project's own directories"""
+  base = str(settings.BASE_DIR)
+  for engine in engines.all():
+    for directory in engine.template_dirs:
+      directory = str(directory)
+      if not directory.startswith(base):
+        continue
+      for root, _, filenames in os.walk(directory):
+        for filename in filenames:
+          if filename.endswith(('.html', '.txt')):
+            yield engine, os.path.relpath(os.path.join(root, filename), directory)
+
+
+def warm_up():
+  """Do the work of a first request that doesn't depend on the request, returning how many templates were loaded"""
+  compile_urls(get_resolver())
+  translation.activate(settings.LANGUAGE_CODE)
+  translation.deactivate()
+  loaded = 0
+  for engine, name in project_templates():
+    try:
+      engine.get_template(name)
+    except TemplateSyntaxError:
+      # Left to fail on the request that renders it
+      continue
+    loaded += 1
+  return loaded
@@ -0,0 +1,34 @@
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.psycopg_any import IsolationLevel
+from djcrm.db.pool import get_pool
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+  """
+  The psycopg2 backend with connections checked out of a per-process pool,
+  configured by the optional POOL dict of the database settings (max_size,
+  timeout, max_lifetime, health_check_after).
+  """
+
+  @property
+  def pool(self):
+    return get_pool(self.alias, self.settings_dict.get('POOL', {}))
+
+  def get_new_connection(self, conn_params):
+    connect = super(DatabaseWrapper, self).get_new_connection
+    connection = self.pool.checkout(lambda: connect(conn_params))
+    # Normally set as a side effect of opening the connection
+    self.isolation_level = IsolationLevel(
+      self.settings_dict['OPTIONS'].get('isolation_level', IsolationLevel.READ_COMMITTED)
+    )
+    return connection
+
+  def _close(self):
+    if self.connection is None:
+      return
+    with self.wrap_database_errors:
+      if self.in_atomic_block:
+        # Django keeps this connection object around until the block exits
+        self.pool.discard(self.connection)
+      else:
+        self.pool.release(self.connection)
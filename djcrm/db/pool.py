@@ -0,0 +1,154 @@
+import os
+import threading
+import time
+from collections import Counter, deque
+
+from psycopg2 import OperationalError, extensions
+
+
+# Per-process pool of psycopg2 connections, shared by every thread of a worker.
+# Django "closes" its connection at the end of each request (CONN_MAX_AGE = 0),
+# which hands it back here instead of tearing down the session, so requests
+# only pay for a connection when the pool has to grow.
+
+COUNTERS = ('checkouts', 'connects', 'waits', 'timeouts', 'reconnects', 'expired', 'discarded')
+
+
+class ConnectionPool:
+
+  def __init__(self, max_size=10, timeout=30, max_lifetime=3600, health_check_after=5):
+    self.max_size = max_size
+    self.timeout = timeout
+    self.max_lifetime = max_lifetime
+    # Connections idle for at least this many seconds are pinged before reuse
+    self.health_check_after = health_check_after
+    self.condition = threading.Condition()
+    self.counters = Counter(dict.fromkeys(COUNTERS, 0))
+    self.reset()
+
+  def reset(self):
+    self.pid = os.getpid()
+    self.idle = deque()
+    self.born = {}
+    self.size = 0
+
+  def checkout(self, connect):
+    """Return an idle connection, or a new one from `connect()` if the pool may grow"""
+    deadline = time.monotonic() + self.timeout
+    with self.condition:
+      if self.pid != os.getpid():
+        self.after_fork()
+      self.counters['checkouts'] += 1
+      waited = False
+      while not self.idle and self.size >= self.max_size:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+          self.counters['timeouts'] += 1
+          raise OperationalError(f'No database connection available after {self.timeout}s')
+        if not waited:
+          self.counters['waits'] += 1
+          waited = True
+        self.condition.wait(remaining)
+      if self.idle:
+        # Most recently used first, so surplus connections age out
+        connection, last_used = self.idle.pop()
+      else:
+        connection, last_used = None, None
+        self.size += 1
+
+    if connection is not None and self.reusable(connection, last_used):
+      return connection
+
+    try:
+      connection = connect()
+    except Exception:
+      with self.condition:
+        self.size -= 1
+        self.condition.notify()
+      raise
+    with self.condition:
+      self.counters['connects'] += 1
+      self.born[id(connection)] = time.monotonic()
+    return connection
+
+  def reusable(self, connection, last_used):
+    """Whether an idle connection can be handed out, it is closed, keeping its slot, when not"""
+    now = time.monotonic()
+    if now - self.born[id(connection)] > self.max_lifetime:
+      self.close(connection, 'expired', free_slot=False)
+      return False
+    if now - last_used >= self.health_check_after and not self.is_usable(connection):
+      self.close(connection, 'reconnects', free_slot=False)
+      return False
+    return True
+
+  def release(self, connection):
+    """Return a connection to the pool, rolling back anything left open"""
+    if self.pid != os.getpid():
+      # Checked out before a fork, it belongs to the parent
+      inherited.append(connection)
+      return
+    try:
+      if connection.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+        connection.rollback()
+      reusable = not connection.closed
+    except Exception:
+      reusable = False
+    if not reusable or time.monotonic() - self.born.get(id(connection), 0) > self.max_lifetime:
+      self.discard(connection)
+      return
+    with self.condition:
+      self.idle.append((connection, time.monotonic()))
+      self.condition.notify()
+
+  def discard(self, connection):
+    self.close(connection, 'discarded')
+
+  def close(self, connection, reason, free_slot=True):
+    with self.condition:
+      self.counters[reason] += 1
+      self.born.pop(id(connection), None)
+      # A connection replaced during checkout hands its slot to the replacement
+      if free_slot:
+        self.size -= 1
+        self.condition.notify()
+    try:
+      connection.close()
+    except Exception:
+      pass
+
+  def is_usable(self, connection):
+    try:
+      with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+      connection.rollback()
+    except Exception:
+      return False
+    return True
+
+  def after_fork(self):
+    # The inherited sockets are shared with the parent. Closing them here would
+    # end the parent's sessions, so keep them referenced and start over.
+    inherited.extend(connection for connection, _ in self.idle)
+    self.reset()
+
+  def stats(self):
+    with self.condition:
+      return dict(self.counters, size=self.size, idle=len(self.idle), in_use=self.size - len(self.idle))
+
+
+inherited = []
+pools = {}
+pools_lock = threading.Lock()
+
+
+def get_pool(alias, options):
+  with pools_lock:
+    if alias not in pools:
+      pools[alias] = ConnectionPool(**options)
+    return pools[alias]
+
+
+def pool_stats():
+  """Counters of every pool in this process, by database alias"""
+  return {alias: pool.stats() for alias, pool in pools.items()}
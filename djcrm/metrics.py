@@ -0,0 +1,302 @@
+import atexit
+import fcntl
+import json
+import os
+import threading
+import time
+from django.conf import settings
+
+
+# Process-shared metrics without an external service. Each process keeps its
+# values in memory and writes them to METRICS_DIR/<pid>-<start time>.json at
+# the end of every request, and at most once per METRICS_FLUSH_INTERVAL in
+# between; a scrape sums the files of all processes. A scrape also folds the counters of exited processes into
+# retired.json and removes their files, so they keep counting towards the
+# totals; gauges only come from processes that are still alive.
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+RETIRED_FILE = 'retired.json'
+LOCK_FILE = '.lock'
+
+
+class Metric:
+
+  def __init__(self, registry, name, help, labelnames=()):
+    self.registry = registry
+    self.name = name
+    self.help = help
+    self.labelnames = tuple(labelnames)
+
+  def key(self, labels):
+    return json.dumps([str(labels[name]) for name in self.labelnames])
+
+
+class Counter(Metric):
+  type = 'counter'
+
+  def inc(self, amount=1, **labels):
+    self.registry.update(self, self.key(labels), lambda value: (value or 0) + amount)
+
+
+class Histogram(Metric):
+  type = 'histogram'
+
+  def __init__(self, registry, name, help, labelnames=(), buckets=DURATION_BUCKETS):
+    super(Histogram, self).__init__(registry, name, help, labelnames)
+    self.buckets = tuple(buckets)
+
+  def observe(self, value, **labels):
+    def add(series):
+      # Per-bucket (not cumulative) counts, then the sum and the count
+      series = series or [0] * (len(self.buckets) + 3)
+      index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+      series[index] += 1
+      series[-2] += value
+      series[-1] += 1
+      return series
+    self.registry.update(self, self.key(labels), add)
+
+
+class Registry:
+
+  def __init__(self):
+    self.metrics = {}
+    self.collectors = []
+    self.shared_collectors = []
+    self.lock = threading.Lock()
+    self.reset()
+
+  def reset(self):
+    self.pid = os.getpid()
+    self.started = process_start_time(self.pid)
+    self.values = {}
+    self.last_flush = 0
+
+  def counter(self, name, help, labelnames=()):
+    return self.register(Counter(self, name, help, labelnames))
+
+  def histogram(self, name, help, labelnames=(), buckets=DURATION_BUCKETS):
+    return self.register(Histogram(self, name, help, labelnames, buckets))
+
+  def register(self, metric):
+    self.metrics[metric.name] = metric
+    return metric
+
+  def register_collector(self, collector, shared=False):
+    """
+    collector() returns (name, type, help, labels, value) tuples of 'counter'
+    or 'gauge' metrics. They are read at every flush, or only when scraping
+    for shared collectors whose values are already the same in all processes.
+    """
+    (self.shared_collectors if shared else self.collectors).append(collector)
+    return collector
+
+  def update(self, metric, key, change):
+    with self.lock:
+      series = self.values.setdefault(metric.name, {})
+      series[key] = change(series.get(key))
+    self.maybe_flush()
+
+  @property
+  def directory(self):
+    return settings.METRICS_DIR
+
+  def maybe_flush(self):
+    if time.monotonic() - self.last_flush >= settings.METRICS_FLUSH_INTERVAL:
+      self.flush()
+
+  def collect(self, collectors=None):
+    collected = []
+    for collector in self.collectors if collectors is None else collectors:
+      for name, type, help, labels, value in collector():
+        collected.append([name, type, help, labels, value])
+    return collected
+
+  def flush(self):
+    with self.lock:
+      self.last_flush = time.monotonic()
+      data = {'pid': self.pid, 'started': self.started, 'values': self.values, 'collected': self.collect()}
+      os.makedirs(self.directory, exist_ok=True)
+      # The start time keeps a process that got a reused pid from overwriting its predecessor's file
+      path = os.path.join(self.directory, f'{self.pid}-{self.started}.json')
+      with open(path + '.tmp', 'w') as f:
+        json.dump(data, f)
+      os.replace(path + '.tmp', path)
+
+  def read_files(self):
+    """(path, data) of every flushed file"""
+    for filename in sorted(os.listdir(self.directory)):
+      if filename.endswith('.json'):
+        path = os.path.join(self.directory, filename)
+        try:
+          with open(path) as f:
+            yield path, json.load(f)
+        except (OSError, ValueError):
+          # Removed or half written by another process
+          continue
+
+  def read_all(self):
+    """The flushed data of every process, this one included"""
+    self.flush()
+    self.retire_exited()
+    for _, data in self.read_files():
+      yield data
+
+  def is_alive(self, data):
+    if data.get('pid') is None:
+      return False
+    return data['pid'] == self.pid or is_alive(data['pid'], data.get('started'))
+
+  def retire_exited(self):
+    """Fold the counters of exited processes into the retired file and remove their files"""
+    with open(os.path.join(self.directory, LOCK_FILE), 'w') as lock:
+      # One process at a time, or two scrapes could both fold the same file
+      fcntl.flock(lock, fcntl.LOCK_EX)
+      retired_path = os.path.join(self.directory, RETIRED_FILE)
+      retired = {'pid': None, 'values': {}, 'collected': []}
+      exited = []
+      for path, data in self.read_files():
+        if path == retired_path:
+          retired = data
+        elif not self.is_alive(data):
+          exited.append((path, data))
+      if not exited:
+        return
+      counters = {}
+      for data in [retired] + [data for _, data in exited]:
+        if data is not retired:
+          add_values(retired['values'], data['values'])
+        for name, type, help, labels, value in data['collected']:
+          if type == 'counter':
+            key = (name, json.dumps(labels, sort_keys=True))
+            entry = counters.setdefault(key, [name, type, help, labels, 0])
+            entry[-1] += value
+      retired['collected'] = list(counters.values())
+      with open(retired_path + '.tmp', 'w') as f:
+        json.dump(retired, f)
+      os.replace(retired_path + '.tmp', retired_path)
+      for path, _ in exited:
+        os.remove(path)
+
+  def aggregate(self):
+    values = {}
+    collected = {}
+    for data in self.read_all():
+      add_values(values, {name: series for name, series in data['values'].items() if name in self.metrics})
+      alive = self.is_alive(data)
+      for name, type, help, labels, value in data['collected']:
+        if type == 'gauge' and not alive:
+          continue
+        entry = collected.setdefault(name, {'type': type, 'help': help, 'series': {}})
+        key = tuple(sorted(labels.items()))
+        entry['series'][key] = entry['series'].get(key, 0) + value
+    for name, type, help, labels, value in self.collect(self.shared_collectors):
+      entry = collected.setdefault(name, {'type': type, 'help': help, 'series': {}})
+      entry['series'][tuple(sorted(labels.items()))] = value
+    return values, collected
+
+  def render(self):
+    """All metrics in the Prometheus text exposition format"""
+    values, collected = self.aggregate()
+    lines = []
+    for name, metric in sorted(self.metrics.items()):
+      lines.append(f'# HELP {name} {metric.help}')
+      lines.append(f'# TYPE {name} {metric.type}')
+      for key, value in sorted(values.get(name, {}).items()):
+        labels = list(zip(metric.labelnames, json.loads(key)))
+        if metric.type == 'histogram':
+          cumulative = 0
+          for bound, count in zip(metric.buckets + ('+Inf',), value):
+            cumulative += count
+            lines.append(f'{name}_bucket{format_labels(labels + [("le", str(bound))])} {cumulative}')
+          lines.append(f'{name}_sum{format_labels(labels)} {value[-2]}')
+          lines.append(f'{name}_count{format_labels(labels)} {value[-1]}')
+        else:
+          lines.append(f'{name}{format_labels(labels)} {value}')
+    for name, entry in sorted(collected.items()):
+      lines.append(f'# HELP {name} {entry["help"]}')
+      lines.append(f'# TYPE {name} {entry["type"]}')
+      for labels, value in sorted(entry['series'].items()):
+        lines.append(f'{name}{format_labels(labels)} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def add_values(totals, values):
+  """Add {metric name: {labels key: value}} to totals, summing histograms bucket by bucket"""
+  for name, series in values.items():
+    metric_totals = totals.setdefault(name, {})
+    for key, value in series.items():
+      if isinstance(value, list):
+        current = metric_totals.get(key) or [0] * len(value)
+        metric_totals[key] = [a + b for a, b in zip(current, value)]
+      else:
+        metric_totals[key] = metric_totals.get(key, 0) + value
+
+
+def process_start_time(pid):
+  """When a process started, in clock ticks since boot, or None where /proc isn't available"""
+  try:
+    with open(f'/proc/{pid}/stat') as f:
+      # The command name in parentheses may contain spaces, the fields after it don't
+      return int(f.read().rsplit(')', 1)[1].split()[19])
+  except (OSError, IndexError, ValueError):
+    return None
+
+
+def is_alive(pid, started=None):
+  try:
+    os.kill(pid, 0)
+  except ProcessLookupError:
+    return False
+  except PermissionError:
+    pass
+  # A different start time means the pid was reused by another process
+  return started is None or process_start_time(pid) in (None, started)
+
+
+def escape(value):
+  return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):
+  if not labels:
+    return ''
+  return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels) + '}'
+
+
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.counter('crm_http_requests_total', 'HTTP requests', ('view', 'method', 'status'))
+REQUEST_DURATION = REGISTRY.histogram('crm_http_request_duration_seconds', 'HTTP request latency', ('view',))
+OUTBOX_EMAILS = REGISTRY.counter('crm_outbox_emails_total', 'Outbox delivery attempts', ('outcome',))
+LEADS_CREATED = REGISTRY.counter('crm_leads_created_total', 'Leads created', ('source',))
+LEADS_ASSIGNED = REGISTRY.counter('crm_leads_assigned_total', 'Leads assigned to an agent', ('method',))
+
+
+@REGISTRY.register_collector
+def database_pool_metrics():
+  from djcrm.db.pool import COUNTERS, pool_stats
+
+  for alias, stats in pool_stats().items():
+    for name in COUNTERS:
+      yield f'crm_db_pool_{name}_total', 'counter', f'Connection pool {name}', {'alias': alias}, stats[name]
+    for state in ('idle', 'in_use'):
+      yield 'crm_db_pool_connections', 'gauge', 'Pooled connections', {'alias': alias, 'state': state}, stats[state]
+
+
+def fragment_cache_metrics():
+  from leads.caching import fragment_cache_stats
+
+  for fragment, (hits, misses) in fragment_cache_stats().items():
+    labels = {'fragment': fragment}
+    yield 'crm_fragment_cache_hits_total', 'counter', 'Template fragment cache hits', labels, hits
+    yield 'crm_fragment_cache_misses_total', 'counter', 'Template fragment cache misses', labels, misses
+
+
+# Kept in the cache backend, which all processes share
+REGISTRY.register_collector(fragment_cache_metrics, shared=True)
+
+
+# Fork children start empty, the parent's values are in the parent's file
+os.register_at_fork(after_in_child=REGISTRY.reset)
+atexit.register(lambda: REGISTRY.values and REGISTRY.flush())
@@ -0,0 +1,141 @@
+import json
+import logging
+import time
+from collections import Counter
+from contextlib import ExitStack
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from djcrm.metrics import REGISTRY, REQUESTS, REQUEST_DURATION
+
+
+logger = logging.getLogger('djcrm.sql')
+
+
+class QueryStats:
+  """execute_wrapper that counts and times the queries of one request"""
+
+  def __init__(self, slow_query):
+    self.slow_query = slow_query
+    self.count = 0
+    self.duration = 0.0
+    self.statements = Counter()
+    self.slow = []
+
+  def __call__(self, execute, sql, params, many, context):
+    start = time.perf_counter()
+    try:
+      return execute(sql, params, many, context)
+    finally:
+      elapsed = time.perf_counter() - start
+      self.count += 1
+      self.duration += elapsed
+      # Parameters are left out, so a query run once per row shows up as one statement
+      self.statements[sql] += 1
+      if elapsed >= self.slow_query:
+        self.slow.append((sql, elapsed))
+
+  def repeated(self, threshold):
+    return [(sql, count) for sql, count in self.statements.most_common() if count >= threshold]
+
+
+class QueryInstrumentationMiddleware:
+  """
+  Count and time every query of a request, report them in a Server-Timing
+  header and log requests with slow queries, too many queries or the same
+  statement repeated (usually an N+1). Queries run while a streaming response
+  is consumed happen after this returns and are not counted.
+  """
+  sync_capable = True
+  async_capable = True
+
+  def __init__(self, get_response):
+    self.get_response = get_response
+    if iscoroutinefunction(get_response):
+      markcoroutinefunction(self)
+    self.slow_query = settings.SQL_SLOW_QUERY_MS / 1000
+    self.max_queries = settings.SQL_MAX_QUERIES
+    self.repeat_threshold = settings.SQL_REPEATED_QUERY_THRESHOLD
+
+  def instrument(self, stack, stats):
+    for connection in connections.all():
+      stack.enter_context(connection.execute_wrapper(stats))
+
+  def __call__(self, request):
+    if iscoroutinefunction(self):
+      return self.__acall__(request)
+    stats = QueryStats(self.slow_query)
+    start = time.perf_counter()
+    with ExitStack() as stack:
+      self.instrument(stack, stats)
+      response = self.get_response(request)
+    return self.report(request, response, stats, time.perf_counter() - start)
+
+  async def __acall__(self, request):
+    stats = QueryStats(self.slow_query)
+    start = time.perf_counter()
+    with ExitStack() as stack:
+      # The async ORM runs in a worker thread, but shares this context's connections
+      self.instrument(stack, stats)
+      response = await self.get_response(request)
+    return self.report(request, response, stats, time.perf_counter() - start)
+
+  def report(self, request, response, stats, duration):
+    response['Server-Timing'] = (
+      f'db;desc="{stats.count} queries";dur={stats.duration * 1000:.1f}, total;dur={duration * 1000:.1f}'
+    )
+    repeated = stats.repeated(self.repeat_threshold)
+    if stats.slow or repeated or stats.count > self.max_queries:
+      self.log(request, response, stats, duration, repeated)
+    return response
+
+  def log(self, request, response, stats, duration, repeated):
+    match = request.resolver_match
+    reasons = [
+      reason for reason, flagged in (
+        ('slow_query', stats.slow), ('repeated_queries', repeated), ('many_queries', stats.count > self.max_queries)
+      ) if flagged
+    ]
+    record = {
+      'view': match.view_name if match else None,
+      'method': request.method,
+      'path': request.path,
+      'status': response.status_code,
+      'reasons': reasons,
+      'queries': stats.count,
+      'db_ms': round(stats.duration * 1000, 1),
+      'total_ms': round(duration * 1000, 1),
+      'repeated': [{'sql': sql, 'count': count} for sql, count in repeated[:5]],
+      'slow': [{'sql': sql, 'ms': round(elapsed * 1000, 1)} for sql, elapsed in stats.slow[:5]],
+    }
+    logger.warning(json.dumps(record), extra={'sql_stats': record})
+
+
+class MetricsMiddleware:
+  """Count requests and record their latency by view name, see djcrm.metrics"""
+  sync_capable = True
+  async_capable = True
+
+  def __init__(self, get_response):
+    self.get_response = get_response
+    if iscoroutinefunction(get_response):
+      markcoroutinefunction(self)
+
+  def __call__(self, request):
+    if iscoroutinefunction(self):
+      return self.__acall__(request)
+    start = time.perf_counter()
+    return self.record(request, self.get_response(request), start)
+
+  async def __acall__(self, request):
+    start = time.perf_counter()
+    return self.record(request, await self.get_response(request), start)
+
+  def record(self, request, response, start):
+    match = request.resolver_match
+    view = match.view_name if match else ''
+    REQUEST_DURATION.observe(time.perf_counter() - start, view=view)
+    REQUESTS.inc(view=view, method=request.method, status=response.status_code)
+    # A worker that goes idle after this request still shows it to scrapes served by the others
+    REGISTRY.flush()
+    return response
@@ -56,18 +56,25 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'djcrm.middleware.MetricsMiddleware',
+    'djcrm.middleware.QueryInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'leads.middleware.TenantMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
 ROOT_URLCONF = 'djcrm.urls'
 
+# Serve the lead list, lead detail and category pages with async views. Meant
+# for the ASGI server, under WSGI every async view gets its own event loop.
+ASYNC_VIEWS = env.bool('ASYNC_VIEWS', default=False)
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -90,19 +97,89 @@ WSGI_APPLICATION = 'djcrm.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
+# DB_POOL=True checks connections out of a per-worker pool and hands them
+# back at the end of every request, so CONN_MAX_AGE should stay 0. Without
+# the pool, DB_CONN_MAX_AGE > 0 keeps one persistent connection per thread.
+DB_POOL = env.bool('DB_POOL', default=False)
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql_psycopg2',
+        'ENGINE': 'djcrm.db.backends.pooled_postgresql' if DB_POOL else 'django.db.backends.postgresql_psycopg2',
         'NAME': env('DB_NAME'),
         'USER': env('DB_USER'),
         'PASSWORD': env('DB_PASSWORD'),
         'HOST': env('DB_HOST'),
         'PORT': env('DB_PORT'),
-
+        'CONN_MAX_AGE': 0 if DB_POOL else env.int('DB_CONN_MAX_AGE', default=0),
+        'CONN_HEALTH_CHECKS': True,
+        'POOL': {
+            'max_size': env.int('DB_POOL_SIZE', default=10),
+            # seconds to wait for a free connection before failing the request
+            'timeout': env.float('DB_POOL_TIMEOUT', default=30),
+            'max_lifetime': env.int('DB_POOL_MAX_LIFETIME', default=3600),
+            'health_check_after': env.float('DB_POOL_HEALTH_CHECK_AFTER', default=5),
+        },
     }
 }
 
 
+# Cache
+# e.g. locmemcache:// (the default) or filecache:///var/tmp/django_cache
+
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+
+# Seconds a cached template fragment lives, writes invalidate it sooner
+FRAGMENT_CACHE_TIMEOUT = env.int('FRAGMENT_CACHE_TIMEOUT', default=600)
+
+# Sessions
+# db: database only, cache: cache only (lost when the cache is flushed),
+# cached_db: read through the cache, every write also hits the database,
+# write_behind: like cached_db, but the database copy is refreshed at most
+# once per SESSION_WRITE_BEHIND_INTERVAL seconds
+
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'write_behind': 'leads.sessions',
+}
+SESSION_ENGINE = SESSION_ENGINES[env('SESSION_MODE', default='db')]
+SESSION_WRITE_BEHIND_INTERVAL = env.int('SESSION_WRITE_BEHIND_INTERVAL', default=300)
+
+# The logged in user, with its profile and agent, is loaded from the cache
+AUTHENTICATION_BACKENDS = ['leads.backends.CachedModelBackend']
+USER_CACHE_TIMEOUT = env.int('USER_CACHE_TIMEOUT', default=600)
+
+
+# SQL instrumentation, see djcrm.middleware. Requests with a query slower
+# than SQL_SLOW_QUERY_MS, more than SQL_MAX_QUERIES queries or one statement
+# run SQL_REPEATED_QUERY_THRESHOLD times or more are logged to djcrm.sql.
+SQL_SLOW_QUERY_MS = env.int('SQL_SLOW_QUERY_MS', default=100)
+SQL_MAX_QUERIES = env.int('SQL_MAX_QUERIES', default=50)
+SQL_REPEATED_QUERY_THRESHOLD = env.int('SQL_REPEATED_QUERY_THRESHOLD', default=10)
+
+# Per-process metric files, summed by /ops/metrics/ (see djcrm.metrics).
+# runserver.sh empties the directory on start, the test runner uses a
+# temporary one.
+METRICS_DIR = env('METRICS_DIR', default='/tmp/djcrm-metrics')
+METRICS_FLUSH_INTERVAL = env.float('METRICS_FLUSH_INTERVAL', default=1.0)
+
+TEST_RUNNER = 'djcrm.test_runner.TestRunner'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'djcrm.sql': {'handlers': ['console'], 'level': 'WARNING', 'propagate': False},
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -155,6 +232,43 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'leads.User'
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+
+# Outbox delivery, see `python manage.py deliver_outbox`
+OUTBOX_BATCH_SIZE = env.int('OUTBOX_BATCH_SIZE', default=100)
+OUTBOX_MAX_ATTEMPTS = env.int('OUTBOX_MAX_ATTEMPTS', default=5)
+# seconds before the first retry, doubled on every further attempt
+OUTBOX_RETRY_BACKOFF = env.int('OUTBOX_RETRY_BACKOFF', default=60)
+OUTBOX_POLL_INTERVAL = env.float('OUTBOX_POLL_INTERVAL', default=5.0)
+# seconds a worker owns the messages it claimed, longer than sending a batch takes
+OUTBOX_LEASE = env.int('OUTBOX_LEASE', default=600)
+
+# Matches ranked by the PostgreSQL lead search, the newest first, see leads.search
+SEARCH_MAX_CANDIDATES = env.int('SEARCH_MAX_CANDIDATES', default=1000)
+
+# Rows written per bulk insert by the lead import
+LEAD_IMPORT_BATCH_SIZE = env.int('LEAD_IMPORT_BATCH_SIZE', default=1000)
+
+# Lead archival, see leads.archive: leads untouched for LEAD_ARCHIVE_AFTER_DAYS
+# are moved to the archive, or after LEAD_ARCHIVE_CATEGORY_AFTER_DAYS when they
+# are in one of LEAD_ARCHIVE_CATEGORIES
+LEAD_ARCHIVE_AFTER_DAYS = env.int('LEAD_ARCHIVE_AFTER_DAYS', default=730)
+LEAD_ARCHIVE_CATEGORIES = env.list('LEAD_ARCHIVE_CATEGORIES', default=['Converted', 'Unconverted'])
+LEAD_ARCHIVE_CATEGORY_AFTER_DAYS = env.int('LEAD_ARCHIVE_CATEGORY_AFTER_DAYS', default=180)
+LEAD_ARCHIVE_CHUNK_SIZE = env.int('LEAD_ARCHIVE_CHUNK_SIZE', default=500)
+
+# Duplicate lead detection, see leads.dedup: the score from which two leads
+# are reported as duplicates, the largest block of leads sharing a key that is
+# compared (a very common name isn't worth n² comparisons) and the country
+# code of phone numbers entered without one
+DEDUP_THRESHOLD = env.float('DEDUP_THRESHOLD', default=0.5)
+DEDUP_MAX_BLOCK_SIZE = env.int('DEDUP_MAX_BLOCK_SIZE', default=50)
+DEDUP_DEFAULT_COUNTRY_CODE = env.str('DEDUP_DEFAULT_COUNTRY_CODE', default='1')
+
+# JSON API, see leads.api: default and largest `limit` of a list, and the
+# most objects a bulk create or update may send at once
+API_PAGE_SIZE = env.int('API_PAGE_SIZE', default=100)
+API_MAX_PAGE_SIZE = env.int('API_MAX_PAGE_SIZE', default=1000)
+API_MAX_BATCH_SIZE = env.int('API_MAX_BATCH_SIZE', default=5000)
 LOGIN_REDIRECT_URL = '/leads'
 LOGIN_URL = '/login'
 LOGOUT_REDIRECT_URL = '/'
@@ -0,0 +1,21 @@
+import tempfile
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from djcrm.metrics import REGISTRY
+
+
+class TestRunner(DiscoverRunner):
+  """Keeps the metric files written by the tests out of the real METRICS_DIR"""
+
+  def setup_test_environment(self, **kwargs):
+    super(TestRunner, self).setup_test_environment(**kwargs)
+    self.metrics_directory = tempfile.TemporaryDirectory(prefix='djcrm-metrics-')
+    self.metrics_dir = settings.METRICS_DIR
+    settings.METRICS_DIR = self.metrics_directory.name
+
+  def teardown_test_environment(self, **kwargs):
+    # Or the exit time flush writes the tests' values to the real directory
+    REGISTRY.reset()
+    settings.METRICS_DIR = self.metrics_dir
+    self.metrics_directory.cleanup()
+    super(TestRunner, self).teardown_test_environment(**kwargs)
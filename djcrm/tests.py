@@ -0,0 +1,233 @@
+import json
+import os
+import tempfile
+import threading
+from unittest import mock
+from io import StringIO
+from django.core.management import call_command
+from django.shortcuts import reverse
+from django.test import SimpleTestCase, TestCase, override_settings
+from psycopg2 import OperationalError, extensions
+from djcrm.boot import warm_up
+from djcrm.db.pool import ConnectionPool
+from djcrm.metrics import REGISTRY, Registry, is_alive, process_start_time
+from leads.models import User, Agent
+
+
+class Connection:
+  """Just enough of a psycopg2 connection for the pool"""
+
+  def __init__(self):
+    self.closed = 0
+    self.status = extensions.TRANSACTION_STATUS_IDLE
+    self.healthy = True
+
+  def get_transaction_status(self):
+    return self.status
+
+  def rollback(self):
+    self.status = extensions.TRANSACTION_STATUS_IDLE
+
+  def close(self):
+    self.closed = 1
+
+  def cursor(self):
+    if not self.healthy:
+      raise OperationalError('server closed the connection unexpectedly')
+    return mock.MagicMock()
+
+
+class ConnectionPoolTest(SimpleTestCase):
+
+  def test_connections_are_reused(self):
+    pool = ConnectionPool(max_size=2)
+    first = pool.checkout(Connection)
+    pool.release(first)
+    self.assertIs(pool.checkout(Connection), first)
+    self.assertEqual(pool.stats()['connects'], 1)
+    self.assertEqual(pool.stats()['checkouts'], 2)
+
+  def test_open_transaction_is_rolled_back(self):
+    pool = ConnectionPool()
+    connection = pool.checkout(Connection)
+    connection.status = extensions.TRANSACTION_STATUS_INTRANS
+    pool.release(connection)
+    self.assertEqual(connection.status, extensions.TRANSACTION_STATUS_IDLE)
+
+  def test_unhealthy_connection_is_replaced(self):
+    pool = ConnectionPool(health_check_after=0)
+    connection = pool.checkout(Connection)
+    pool.release(connection)
+    connection.healthy = False
+    replacement = pool.checkout(Connection)
+    self.assertIsNot(replacement, connection)
+    self.assertTrue(connection.closed)
+    self.assertEqual(pool.stats()['reconnects'], 1)
+    self.assertEqual(pool.stats()['size'], 1)
+
+  def test_old_connection_is_replaced(self):
+    pool = ConnectionPool(max_lifetime=0)
+    connection = pool.checkout(Connection)
+    pool.release(connection)
+    self.assertIsNot(pool.checkout(Connection), connection)
+    self.assertEqual(pool.stats()['discarded'], 1)
+
+  def test_checkout_waits_for_a_release(self):
+    pool = ConnectionPool(max_size=1, timeout=5)
+    connection = pool.checkout(Connection)
+    threading.Timer(0.05, pool.release, [connection]).start()
+    self.assertIs(pool.checkout(Connection), connection)
+    self.assertEqual(pool.stats()['waits'], 1)
+
+  def test_checkout_times_out(self):
+    pool = ConnectionPool(max_size=1, timeout=0.01)
+    pool.checkout(Connection)
+    with self.assertRaises(OperationalError):
+      pool.checkout(Connection)
+    self.assertEqual(pool.stats()['timeouts'], 1)
+
+  def test_failed_connect_frees_its_slot(self):
+    pool = ConnectionPool(max_size=1)
+    with self.assertRaises(OperationalError):
+      pool.checkout(mock.Mock(side_effect=OperationalError))
+    pool.checkout(Connection)
+    self.assertEqual(pool.stats()['in_use'], 1)
+
+  def test_inherited_connections_are_not_reused_after_fork(self):
+    pool = ConnectionPool()
+    connection = pool.checkout(Connection)
+    pool.release(connection)
+    pool.pid = -1
+    self.assertIsNot(pool.checkout(Connection), connection)
+    self.assertFalse(connection.closed)
+
+
+class QueryInstrumentationTest(TestCase):
+
+  def setUp(self):
+    organizer = User.objects.create_user(username='organizer')
+    for i in range(4):
+      user = User.objects.create_user(username=f'agent{i}', is_organizer=False, is_agent=True)
+      Agent.objects.create(user=user, organization=organizer.userprofile)
+    self.client.force_login(organizer)
+
+  def test_server_timing_header(self):
+    response = self.client.get(reverse('leads:lead-list'))
+    self.assertRegex(response['Server-Timing'], r'^db;desc="\d+ queries";dur=[\d.]+, total;dur=[\d.]+$')
+
+  @override_settings(SQL_REPEATED_QUERY_THRESHOLD=4, SQL_MAX_QUERIES=1000, SQL_SLOW_QUERY_MS=10000)
+  def test_repeated_queries_are_logged(self):
+    with self.assertLogs('djcrm.sql') as logs:
+      self.client.get(reverse('agents:agent-list'))
+    record = json.loads(logs.records[0].getMessage())
+    self.assertEqual(record['view'], 'agents:agent-list')
+    self.assertEqual(record['reasons'], ['repeated_queries'])
+    self.assertGreaterEqual(record['repeated'][0]['count'], 4)
+
+  @override_settings(SQL_REPEATED_QUERY_THRESHOLD=1000, SQL_MAX_QUERIES=1000, SQL_SLOW_QUERY_MS=10000)
+  def test_quiet_requests_are_not_logged(self):
+    with self.assertNoLogs('djcrm.sql'):
+      self.client.get(reverse('leads:lead-list'))
+
+
+class MetricsTest(TestCase):
+
+  def setUp(self):
+    directory = tempfile.TemporaryDirectory()
+    self.addCleanup(directory.cleanup)
+    self.directory = directory.name
+    self.enterContext(override_settings(METRICS_DIR=self.directory, METRICS_FLUSH_INTERVAL=0))
+
+  def test_values_of_all_processes_are_summed(self):
+    registry = Registry()
+    requests = registry.counter('requests_total', 'Requests', ('view',))
+    duration = registry.histogram('duration_seconds', 'Latency', ('view',), buckets=(0.1, 1))
+    requests.inc(view='a')
+    duration.observe(0.05, view='a')
+    # Another worker, no longer running
+    other = {
+      'pid': 2 ** 22 + 1,
+      'values': {'requests_total': {'["a"]': 2}, 'duration_seconds': {'["a"]': [0, 1, 0, 0.5, 1]}},
+      'collected': [['pool_connections', 'gauge', 'Connections', {}, 3]],
+    }
+    with open(os.path.join(self.directory, 'other.json'), 'w') as f:
+      json.dump(other, f)
+
+    lines = registry.render().splitlines()
+    self.assertIn('requests_total{view="a"} 3', lines)
+    self.assertIn('duration_seconds_bucket{view="a",le="0.1"} 1', lines)
+    self.assertIn('duration_seconds_bucket{view="a",le="1"} 2', lines)
+    self.assertIn('duration_seconds_bucket{view="a",le="+Inf"} 2', lines)
+    self.assertIn('duration_seconds_count{view="a"} 2', lines)
+    # Gauges of dead processes are dropped
+    self.assertNotIn('pool_connections 3', lines)
+    # The exited worker's counters were folded into the retired file, and are counted once
+    own = f'{os.getpid()}-{registry.started}.json'
+    self.assertEqual(sorted(os.listdir(self.directory)), sorted(['.lock', 'retired.json', own]))
+    self.assertIn('requests_total{view="a"} 3', registry.render().splitlines())
+
+  def test_reused_pid_is_not_alive(self):
+    self.assertTrue(is_alive(os.getpid(), process_start_time(os.getpid())))
+    self.assertFalse(is_alive(os.getpid(), -1))
+
+  def test_requests_are_flushed_when_they_end(self):
+    self.client.force_login(User.objects.create_user(username='organizer'))
+    with override_settings(METRICS_FLUSH_INTERVAL=3600):
+      REGISTRY.flush()
+      self.client.get(reverse('leads:lead-list'))
+    with open(os.path.join(self.directory, f'{os.getpid()}-{REGISTRY.started}.json')) as f:
+      requests = json.load(f)['values']['crm_http_requests_total']
+    key = '["leads:lead-list", "GET", "200"]'
+    self.assertEqual(requests[key], REGISTRY.values['crm_http_requests_total'][key])
+
+  def test_endpoint_is_staff_only(self):
+    user = User.objects.create_user(username='organizer')
+    self.client.force_login(user)
+    self.assertEqual(self.client.get(reverse('metrics')).status_code, 302)
+
+    user.is_staff = True
+    user.save()
+    self.client.get(reverse('leads:lead-list'))
+    response = self.client.get(reverse('metrics'))
+    self.assertEqual(response.status_code, 200)
+    self.assertContains(response, 'crm_http_requests_total{view="leads:lead-list",method="GET",status="200"}')
+    self.assertContains(response, '# TYPE crm_http_request_duration_seconds histogram')
+
+
+class BootTest(TestCase):
+
+  def setUp(self):
+    directory = tempfile.TemporaryDirectory()
+    self.addCleanup(directory.cleanup)
+    self.sources = os.path.join(directory.name, 'static')
+    self.root = os.path.join(directory.name, 'static_root')
+    os.makedirs(self.sources)
+    os.makedirs(self.root)
+    self.write_source('body {}')
+    self.enterContext(override_settings(
+      STATICFILES_DIRS=[self.sources], STATIC_ROOT=self.root,
+      STATICFILES_STORAGE='django.contrib.staticfiles.storage.ManifestStaticFilesStorage'
+    ))
+
+  def write_source(self, content):
+    with open(os.path.join(self.sources, 'site.css'), 'w') as f:
+      f.write(content)
+
+  def boot(self):
+    def collectstatic(name, **options):
+      open(os.path.join(self.root, 'staticfiles.json'), 'w').close()
+
+    with mock.patch('leads.management.commands.boot.call_command', side_effect=collectstatic) as command:
+      call_command('boot', stdout=StringIO())
+    return [args[0] for args, _ in command.call_args_list]
+
+  def test_collectstatic_only_runs_when_sources_change(self):
+    self.assertEqual(self.boot(), ['collectstatic'])
+    self.assertEqual(self.boot(), [])
+    self.write_source('body { color: red }')
+    self.assertEqual(self.boot(), ['collectstatic'])
+    os.remove(os.path.join(self.root, 'staticfiles.json'))
+    self.assertEqual(self.boot(), ['collectstatic'])
+
+  def test_warm_up_loads_the_project_templates(self):
+    self.assertGreater(warm_up(), 20)
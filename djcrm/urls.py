@@ -10,6 +10,8 @@ from django.contrib.auth.views import (
     PasswordResetCompleteView
     )
 from django.urls import path, include
+from djcrm.views import database_pool_stats, metrics
+from leads.forms import OutboxPasswordResetForm
 from leads.views import LandingPageView, SignupView
 
 urlpatterns = [
@@ -18,12 +20,14 @@ urlpatterns = [
     path('agents/', include('agents.urls', namespace='agents')),
     path('leads/', include('leads.urls', namespace='leads')),
     path('signup/', SignupView.as_view(), name='signup'),
-    path('reset-password/', PasswordResetView.as_view(), name='reset-password'),
+    path('reset-password/', PasswordResetView.as_view(form_class=OutboxPasswordResetForm), name='reset-password'),
     path('password-reset-done/', PasswordResetDoneView.as_view(), name='password_reset_done'),
     path('password-reset-confirm/<uidb64>/<token>/', PasswordResetConfirmView.as_view(), name='password_reset_confirm'),
     path('password-reset-complete/', PasswordResetCompleteView.as_view(), name='password_reset_complete'),
     path('login/', LoginView.as_view(), name='login'),
     path('logout/', LogoutView.as_view(), name='logout'),
+    path('ops/db-pool/', database_pool_stats, name='database-pool-stats'),
+    path('ops/metrics/', metrics, name='metrics'),
 ]
 
 if settings.DEBUG:
@@ -0,0 +1,16 @@
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponse, JsonResponse
+from djcrm.db.pool import pool_stats
+from djcrm.metrics import REGISTRY
+
+
+@staff_member_required
+def database_pool_stats(request):
+  """Connection pool counters of the worker process serving the request"""
+  return JsonResponse(pool_stats())
+
+
+@staff_member_required
+def metrics(request):
+  """Metrics of all worker processes in the Prometheus text format"""
+  return HttpResponse(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,13 @@
+# Read by gunicorn from the working directory, see runserver.sh
+
+# The application is imported once in the master and warmed up before the
+# workers are forked, so they share its memory and serve their first request
+# without importing views, compiling URL patterns or parsing templates
+preload_app = True
+worker_tmp_dir = '/dev/shm'
+
+
+def when_ready(server):
+  from djcrm.boot import warm_up
+  loaded = warm_up()
+  server.log.info('Warmed up, %d templates loaded', loaded)
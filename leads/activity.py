@@ -0,0 +1,82 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.utils.functional import cached_property
+from .pagination import KeysetPage
+
+
+# Lead history. Every change to the fields below is appended to LeadActivity
+# as {field: [old, new]}: by the Lead signals for single saves, and with one
+# bulk insert by the bulk writers (automatic assignment, the API). The actor is
+# the user of the request being served, set by TenantMiddleware.
+
+TRACKED_FIELDS = ('first_name', 'last_name', 'age', 'email', 'phone_number', 'description', 'agent_id', 'category_id')
+
+_request = ContextVar('activity_request', default=None)
+
+
+@contextmanager
+def acting_request(request):
+  """Attribute changes made inside the block to request.user"""
+  token = _request.set(request)
+  try:
+    yield
+  finally:
+    _request.reset(token)
+
+
+def current_actor_id():
+  user = getattr(_request.get(), 'user', None)
+  if user is None or not user.is_authenticated:
+    return None
+  return user.pk
+
+
+def tracked_values(lead):
+  return {name: getattr(lead, name) for name in TRACKED_FIELDS}
+
+
+def changes_between(old, new):
+  """{field: [old, new]} for the tracked values that differ, relations by id under their field name"""
+  return {
+    name.removesuffix('_id'): [old[name], new[name]]
+    for name in TRACKED_FIELDS
+    if old[name] != new[name]
+  }
+
+
+def describe(activities):
+  """Set activity.entries to (field, old, new) rows, with agents and categories by name"""
+  from .models import Agent, Category
+
+  ids = {'agent': set(), 'category': set()}
+  for activity in activities:
+    for field in ids:
+      ids[field].update(value for value in activity.changes.get(field, ()) if value)
+  # Two lookups per page at most, whatever the number of activities
+  names = {'agent': {}, 'category': {}}
+  if ids['agent']:
+    names['agent'] = dict(Agent.objects.filter(pk__in=ids['agent']).values_list('pk', 'user__email'))
+  if ids['category']:
+    names['category'] = dict(Category.objects.filter(pk__in=ids['category']).values_list('pk', 'name'))
+
+  def label(field, value):
+    if value is None or value == '':
+      return '-'
+    if field in names:
+      return names[field].get(value, f'#{value}')
+    return value
+
+  for activity in activities:
+    activity.entries = [
+      (field.replace('_', ' '), label(field, old), label(field, new))
+      for field, (old, new) in activity.changes.items()
+    ]
+  return activities
+
+
+class ActivityPage(KeysetPage):
+  """Keyset page of activities, newest first, described on first use of entries"""
+
+  @cached_property
+  def entries(self):
+    return describe(self.object_list)
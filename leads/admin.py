@@ -1,8 +1,10 @@
 from django.contrib import admin
-from .models import Agent, Lead, User, UserProfile, Category
+from .models import Agent, Lead, User, UserProfile, Category, LeadStatistic, OutboxEmail
 
 admin.site.register(Agent)
 admin.site.register(Lead)
 admin.site.register(User)
 admin.site.register(UserProfile)
 admin.site.register(Category)
+admin.site.register(LeadStatistic)
+admin.site.register(OutboxEmail)
@@ -0,0 +1,343 @@
+import base64
+import binascii
+import json
+from collections import Counter
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.forms import modelform_factory
+from django.http import Http404, HttpResponse, JsonResponse
+from django.utils import timezone
+from django.middleware.csrf import CsrfViewMiddleware
+from django.utils.decorators import method_decorator
+from django.views import generic
+from django.views.decorators.csrf import csrf_exempt
+from djcrm.metrics import LEADS_ASSIGNED
+from .activity import changes_between, tracked_values
+from .caching import bump_organization_version
+from .dedup import IDENTITY_FIELDS, index_leads
+from .conditional import ConditionalCheck
+from .export import filter_leads
+from .forms import LeadImportRowForm, CategoryApiForm
+from .importer import create_leads
+from .models import Lead, Agent, Category, LeadActivity, LeadStatistic
+from .pagination import KeysetPage
+
+
+# JSON API for integrations. Every endpoint is scoped with for_user() like the
+# HTML views, lists are keyset paginated on id with an opaque `after` cursor,
+# `fields=a,b` limits both the serialized keys and the loaded columns, and
+# POST / PATCH take a list of objects that is written all or nothing.
+#
+# Clients authenticate with HTTP Basic or the session cookie; session
+# authenticated writes need the CSRF token like any other form post.
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ApiError(Exception):
+
+  def __init__(self, status, message, errors=None):
+    super(ApiError, self).__init__(message)
+    self.status = status
+    self.message = message
+    self.errors = errors
+
+
+def api_response(data, status=200):
+  return JsonResponse(
+    data, status=status, safe=False, encoder=DjangoJSONEncoder, json_dumps_params={'separators': (',', ':')}
+  )
+
+
+def form_errors(form):
+  return {field: list(messages) for field, messages in form.errors.items()}
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class ApiView(generic.View):
+  model = None
+  # Serialized name -> attribute path, relations as ids
+  fields = {}
+  select_related = ()
+  ordering = ('id',)
+
+  def dispatch(self, request, *args, **kwargs):
+    try:
+      self.authenticate(request)
+      # Reads answer 304 from the organization's change marker before querying
+      check = ConditionalCheck(request)
+      response = check.response()
+      if response is None:
+        response = super(ApiView, self).dispatch(request, *args, **kwargs)
+      return check.add_headers(response)
+    except ApiError as e:
+      data = {'error': e.message}
+      if e.errors:
+        data['errors'] = e.errors
+      return api_response(data, status=e.status)
+
+  def authenticate(self, request):
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    if header.startswith('Basic '):
+      try:
+        username, _, password = base64.b64decode(header[6:]).decode().partition(':')
+      except (binascii.Error, UnicodeDecodeError):
+        raise ApiError(401, 'Invalid authorization header')
+      user = authenticate(request, username=username, password=password)
+      if user is None:
+        raise ApiError(401, 'Invalid credentials')
+      request.user = user
+    elif not request.user.is_authenticated:
+      raise ApiError(401, 'Authentication required')
+    elif request.method not in SAFE_METHODS:
+      if CsrfViewMiddleware(lambda request: None).process_view(request, None, (), {}) is not None:
+        raise ApiError(403, 'CSRF check failed')
+    if request.method not in SAFE_METHODS and not request.user.is_organizer:
+      raise ApiError(403, 'Only organizers can make changes')
+
+  def get_queryset(self):
+    return self.model.objects.for_user(self.request.user)
+
+  def get_fields(self):
+    requested = self.request.GET.get('fields')
+    if not requested:
+      return list(self.fields)
+    names = requested.split(',')
+    unknown = [name for name in names if name not in self.fields]
+    if unknown:
+      raise ApiError(400, f'Unknown fields: {", ".join(unknown)}')
+    return ['id'] + [name for name in names if name != 'id']
+
+  def project(self, queryset, fields):
+    """Load only the columns behind the requested fields"""
+    paths = [self.fields[name].replace('.', '__') for name in fields]
+    related = [path for path in self.select_related if any(p.startswith(path + '__') for p in paths)]
+    return queryset.select_related(*related).only(*paths)
+
+  def serialize(self, obj, fields):
+    data = {}
+    for name in fields:
+      value = obj
+      for attribute in self.fields[name].split('.'):
+        value = getattr(value, attribute)
+      data[name] = value
+    return data
+
+  def filter_queryset(self, queryset):
+    return queryset
+
+  def get(self, request, *args, **kwargs):
+    fields = self.get_fields()
+    try:
+      limit = min(int(request.GET.get('limit', settings.API_PAGE_SIZE)), settings.API_MAX_PAGE_SIZE)
+      queryset = self.filter_queryset(self.get_queryset())
+    except ValueError:
+      raise ApiError(400, 'Invalid filter')
+    page = KeysetPage(self.project(queryset, fields), self.ordering, max(limit, 1), after=request.GET.get('after'))
+    try:
+      results = [self.serialize(obj, fields) for obj in page]
+    except Http404:
+      raise ApiError(400, 'Invalid cursor')
+    return api_response({'results': results, 'next': page.next_cursor})
+
+  def read_objects(self):
+    try:
+      objects = json.loads(self.request.body)
+    except ValueError:
+      raise ApiError(400, 'Invalid JSON')
+    if isinstance(objects, dict):
+      objects = [objects]
+    if not isinstance(objects, list) or not all(isinstance(obj, dict) for obj in objects):
+      raise ApiError(400, 'Expected an object or a list of objects')
+    if len(objects) > settings.API_MAX_BATCH_SIZE:
+      raise ApiError(400, f'At most {settings.API_MAX_BATCH_SIZE} objects per request')
+    return objects
+
+  def build(self, data, instance=None):
+    """Return (object, errors) for one submitted object, applied to `instance` when updating"""
+    raise NotImplementedError
+
+  def post(self, request, *args, **kwargs):
+    objects = []
+    errors = {}
+    for index, data in enumerate(self.read_objects()):
+      obj, object_errors = self.build(data)
+      if object_errors:
+        errors[index] = object_errors
+      objects.append(obj)
+    if errors:
+      raise ApiError(400, 'Invalid objects, nothing was created', errors)
+    self.create(objects)
+    fields = list(self.fields)
+    return api_response({'results': [self.serialize(obj, fields) for obj in objects]}, status=201)
+
+  @transaction.atomic
+  def patch(self, request, *args, **kwargs):
+    submitted = self.read_objects()
+    ids = [data.get('id') for data in submitted]
+    if not all(isinstance(pk, int) for pk in ids):
+      raise ApiError(400, 'Every object needs an integer id')
+    if len(set(ids)) != len(ids):
+      raise ApiError(400, 'Every object needs a different id')
+    instances = self.get_queryset().select_for_update().in_bulk(ids)
+    objects = []
+    previous = {}
+    errors = {}
+    for index, data in enumerate(submitted):
+      instance = instances.get(data['id'])
+      if instance is None:
+        errors[index] = {'id': ['Not found']}
+        continue
+      previous[instance.pk] = self.snapshot(instance)
+      obj, object_errors = self.build(data, instance)
+      if object_errors:
+        errors[index] = object_errors
+      objects.append(obj)
+    if errors:
+      raise ApiError(400, 'Invalid objects, nothing was updated', errors)
+    self.update(objects, previous)
+    fields = list(self.fields)
+    return api_response({'results': [self.serialize(obj, fields) for obj in objects]})
+
+  def snapshot(self, instance):
+    return None
+
+
+class LeadApiView(ApiView):
+  model = Lead
+  fields = {
+    'id': 'id',
+    'first_name': 'first_name',
+    'last_name': 'last_name',
+    'age': 'age',
+    'email': 'email',
+    'phone_number': 'phone_number',
+    'description': 'description',
+    'date_added': 'date_added',
+    'updated_at': 'updated_at',
+    'agent': 'agent_id',
+    'category': 'category_id',
+  }
+  form_fields = LeadImportRowForm.Meta.fields
+  update_fields = form_fields + ('agent', 'category', 'updated_at')
+
+  def filter_queryset(self, queryset):
+    return filter_leads(queryset, self.request.GET)
+
+  def related_ids(self, model):
+    # Loaded once per request, not once per object
+    cache = self.__dict__.setdefault('_related_ids', {})
+    if model not in cache:
+      cache[model] = set(model.objects.for_user(self.request.user).values_list('pk', flat=True))
+    return cache[model]
+
+  def form_class(self, names):
+    # Updates only validate the submitted fields, one form class per combination
+    cache = self.__dict__.setdefault('_form_classes', {})
+    if names not in cache:
+      cache[names] = modelform_factory(Lead, form=LeadImportRowForm, fields=names)
+    return cache[names]
+
+  def build(self, data, instance=None):
+    names = self.form_fields
+    if instance is not None:
+      names = tuple(name for name in names if name in data)
+    form = self.form_class(names)(data=data, instance=instance)
+    errors = form_errors(form) if not form.is_valid() else {}
+    lead = form.instance
+    if not errors:
+      lead = form.save(commit=False)
+    for name, model in (('agent', Agent), ('category', Category)):
+      if name in data:
+        value = data[name]
+        if value is not None and value not in self.related_ids(model):
+          errors[name] = [f'Unknown {name} {value}']
+        else:
+          setattr(lead, f'{name}_id', value)
+    lead.organization = self.request.tenant.organization
+    return lead, errors
+
+  def create(self, leads):
+    create_leads(self.request.tenant.organization, leads, source='api')
+
+  def snapshot(self, lead):
+    return lead.statistic_keys(), tracked_values(lead)
+
+  def update(self, leads, previous):
+    # bulk_update() bypasses the signals that keep the statistics and history in step
+    deltas = Counter()
+    changes = {}
+    assigned = 0
+    now = timezone.now()
+    for lead in leads:
+      lead.updated_at = now
+      keys, values = previous[lead.pk]
+      for key in keys:
+        deltas[key] -= 1
+      for key in lead.statistic_keys():
+        deltas[key] += 1
+      if lead.agent_id and lead.agent_id != values['agent_id']:
+        assigned += 1
+      changes[lead.pk] = changes_between(values, tracked_values(lead))
+    Lead.objects.bulk_update(leads, self.update_fields)
+    LeadStatistic.objects.apply_deltas(deltas)
+    index_leads([lead for lead in leads if changes[lead.pk].keys() & IDENTITY_FIELDS], replace=True)
+    LeadActivity.objects.record(self.request.tenant.organization.pk, changes)
+    bump_organization_version(self.request.tenant.organization.pk)
+    if assigned:
+      LEADS_ASSIGNED.inc(assigned, method='manual')
+
+
+class LeadApiDetailView(LeadApiView):
+  http_method_names = ['get', 'delete']
+
+  def get(self, request, *args, **kwargs):
+    fields = self.get_fields()
+    try:
+      lead = self.project(self.get_queryset(), fields).get(pk=kwargs['pk'])
+    except Lead.DoesNotExist:
+      raise ApiError(404, 'Not found')
+    return api_response(self.serialize(lead, fields))
+
+  def delete(self, request, *args, **kwargs):
+    deleted, _ = self.get_queryset().filter(pk=kwargs['pk']).delete()
+    if not deleted:
+      raise ApiError(404, 'Not found')
+    return HttpResponse(status=204)
+
+
+class CategoryApiView(ApiView):
+  model = Category
+  fields = {'id': 'id', 'name': 'name'}
+
+  def build(self, data, instance=None):
+    form = CategoryApiForm(data=data, instance=instance)
+    if not form.is_valid():
+      return form.instance, form_errors(form)
+    category = form.save(commit=False)
+    category.organization = self.request.tenant.organization
+    return category, {}
+
+  def create(self, categories):
+    Category.objects.bulk_create(categories)
+    bump_organization_version(self.request.tenant.organization.pk)
+
+  def update(self, categories, previous):
+    Category.objects.bulk_update(categories, ['name'])
+    bump_organization_version(self.request.tenant.organization.pk)
+
+
+class AgentApiView(ApiView):
+  """Read only, agents are created through their user accounts"""
+  model = Agent
+  fields = {
+    'id': 'id',
+    'username': 'user.username',
+    'email': 'user.email',
+    'first_name': 'user.first_name',
+    'last_name': 'user.last_name',
+  }
+  select_related = ('user',)
+  http_method_names = ['get']
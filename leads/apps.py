@@ -1,5 +1,10 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class LeadsConfig(AppConfig):
     name = 'leads'
+
+    def ready(self):
+        from .search import install_sqlite_triggers
+        post_migrate.connect(install_sqlite_triggers, sender=self)
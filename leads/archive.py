@@ -0,0 +1,117 @@
+import time
+from collections import defaultdict
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .caching import bump_organization_version
+from .dedup import index_leads
+from .models import (
+  Lead, ArchivedLead, Agent, Category, DuplicateLeadPair, LeadActivity, LeadBlockingKey, LeadStatistic
+)
+from .search import SEARCH_FIELDS, search_terms
+
+
+# Lead archival. Stale leads are moved to ArchivedLead in small transactions,
+# each copying one chunk and deleting it from the lead table, so that no lock
+# is held for long and an interrupted run just resumes where it stopped.
+# Restoring moves a lead back with its original id.
+
+ARCHIVED_FIELDS = (
+  'id', 'organization_id', 'agent_id', 'category_id', 'first_name', 'last_name', 'age', 'description',
+  'date_added', 'updated_at', 'phone_number', 'email',
+)
+
+
+def stale_leads(days, categories=(), category_days=None, now=None):
+  """
+  Leads untouched for `days`, or for `category_days` when they are in one of
+  the named categories (closed ones like "Converted" can go sooner).
+  """
+  now = now or timezone.now()
+  condition = Q(updated_at__lt=now - timedelta(days=days))
+  if categories and category_days is not None:
+    condition |= Q(category__name__in=categories, updated_at__lt=now - timedelta(days=category_days))
+  return Lead.objects.filter(condition)
+
+
+def archive_chunk(leads):
+  """Move the given leads (as dicts of ARCHIVED_FIELDS) to the archive, in the caller's transaction"""
+  now = timezone.now()
+  ArchivedLead.objects.bulk_create([ArchivedLead(archived_at=now, **values) for values in leads])
+  ids = [values['id'] for values in leads]
+  # Plain DELETEs: the signals a Lead delete() would run are applied below
+  # for the whole chunk, and LeadActivity keeps no constraint on leads
+  LeadBlockingKey.objects.filter(lead__in=ids)._raw_delete(LeadBlockingKey.objects.db)
+  DuplicateLeadPair.objects.filter(Q(lead__in=ids) | Q(duplicate__in=ids)).delete()
+  Lead.objects.filter(pk__in=ids)._raw_delete(Lead.objects.db)
+  LeadStatistic.objects.record_leads([Lead(**values) for values in leads], sign=-1)
+  by_organization = defaultdict(dict)
+  for values in leads:
+    by_organization[values['organization_id']][values['id']] = {'archived_at': [None, now.isoformat()]}
+  for organization_id, changes in by_organization.items():
+    LeadActivity.objects.record(organization_id, changes, action=LeadActivity.ARCHIVED)
+  return by_organization.keys()
+
+
+def archive_leads(queryset, chunk_size=500, pause=0, on_chunk=None):
+  """Archive every lead of the queryset, one transaction per chunk, returning how many were moved"""
+  total = 0
+  last_pk = 0
+  organizations = set()
+  while True:
+    with transaction.atomic():
+      # Walks the primary key so each chunk starts where the last one ended
+      chunk = queryset.filter(pk__gt=last_pk).order_by('pk').select_for_update(of=('self',))
+      leads = list(chunk.values(*ARCHIVED_FIELDS)[:chunk_size])
+      if not leads:
+        break
+      organizations.update(archive_chunk(leads))
+    total += len(leads)
+    last_pk = leads[-1]['id']
+    if on_chunk:
+      on_chunk(total)
+    if pause:
+      # Leaves room for other writers and for replicas to catch up
+      time.sleep(pause)
+  for organization_id in organizations:
+    bump_organization_version(organization_id)
+  return total
+
+
+@transaction.atomic
+def restore_lead(archived):
+  """Move an archived lead back to the lead table and return it"""
+  values = {name: getattr(archived, name) for name in ARCHIVED_FIELDS}
+  # Its agent or category may have been deleted in the meantime
+  if values['agent_id'] and not Agent.objects.filter(pk=values['agent_id']).exists():
+    values['agent_id'] = None
+  if values['category_id'] and not Category.objects.filter(pk=values['category_id']).exists():
+    values['category_id'] = None
+  lead = Lead(**values)
+  # bulk_create() sets date_added and updated_at to now, put the original date_added back
+  Lead.objects.bulk_create([lead])
+  Lead.objects.filter(pk=lead.pk).update(date_added=archived.date_added)
+  lead.date_added = archived.date_added
+  archived.delete()
+  LeadStatistic.objects.record_leads([lead])
+  index_leads([lead])
+  LeadActivity.objects.record(
+    lead.organization_id, {lead.pk: {'archived_at': [archived.archived_at.isoformat(), None]}},
+    action=LeadActivity.RESTORED
+  )
+  bump_organization_version(lead.organization_id)
+  return lead
+
+
+def search_archived_leads(queryset, query):
+  """Match every word of the query, without an index: the archive is rarely searched"""
+  terms = search_terms(query)
+  if not terms:
+    return queryset.none()
+  for term in terms:
+    condition = Q()
+    for field in SEARCH_FIELDS:
+      condition |= Q(**{f'{field}__icontains': term})
+    queryset = queryset.filter(condition)
+  return queryset
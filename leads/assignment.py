@@ -0,0 +1,163 @@
+from collections import Counter, defaultdict
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from djcrm.metrics import LEADS_ASSIGNED
+from .caching import bump_organization_version
+from .models import Lead, Agent, LeadActivity, LeadStatistic, UserProfile
+
+
+# Automatic lead distribution. Agent loads come from the LeadStatistic counters
+# rather than from counting leads, and each batch of decisions is written with
+# one UPDATE per agent.
+
+
+class AssignmentStrategy:
+
+  def __init__(self, organization, agent_ids, loads):
+    self.organization = organization
+    self.agent_ids = agent_ids
+    self.loads = loads
+
+  def candidates(self, lead):
+    return self.agent_ids
+
+  def choose(self, lead):
+    raise NotImplementedError
+
+  def assigned(self, lead, agent_id):
+    self.loads[agent_id] += 1
+
+  def finish(self):
+    pass
+
+
+class RoundRobinStrategy(AssignmentStrategy):
+
+  def __init__(self, *args, **kwargs):
+    super(RoundRobinStrategy, self).__init__(*args, **kwargs)
+    # Read fresh, the organization may have come from a cached user
+    self.start = self.position = UserProfile.objects.filter(pk=self.organization.pk).values_list(
+      'round_robin_position', flat=True
+    ).get()
+
+  def choose(self, lead):
+    agent_id = self.agent_ids[self.position % len(self.agent_ids)]
+    self.position += 1
+    return agent_id
+
+  def finish(self):
+    # Relative update so that concurrent batches don't reuse the same positions
+    UserProfile.objects.filter(pk=self.organization.pk).update(
+      round_robin_position=F('round_robin_position') + (self.position - self.start)
+    )
+    self.start = self.position
+
+
+class LeastLoadedStrategy(AssignmentStrategy):
+
+  def choose(self, lead):
+    # Ties go to the longest standing agent
+    return min(self.candidates(lead), key=lambda agent_id: (self.loads[agent_id], agent_id))
+
+
+class CategoryAffinityStrategy(LeastLoadedStrategy):
+
+  def __init__(self, *args, **kwargs):
+    super(CategoryAffinityStrategy, self).__init__(*args, **kwargs)
+    self.specialists = defaultdict(list)
+    pairs = Agent.categories.through.objects.filter(agent__organization=self.organization)
+    for agent_id, category_id in pairs.values_list('agent_id', 'category_id'):
+      self.specialists[category_id].append(agent_id)
+
+  def candidates(self, lead):
+    # Fall back to every agent for uncategorized leads or categories without specialists
+    return self.specialists.get(lead.category_id) or self.agent_ids
+
+
+STRATEGIES = {
+  UserProfile.ROUND_ROBIN: RoundRobinStrategy,
+  UserProfile.LEAST_LOADED: LeastLoadedStrategy,
+  UserProfile.CATEGORY_AFFINITY: CategoryAffinityStrategy,
+}
+
+
+def get_strategy(organization, strategy=None):
+  name = strategy or organization.assignment_strategy
+  if not name:
+    return None
+  agent_ids = list(Agent.objects.filter(organization=organization).order_by('pk').values_list('pk', flat=True))
+  if not agent_ids:
+    return None
+  loads = Counter(LeadStatistic.objects.counts(organization, LeadStatistic.AGENT))
+  return STRATEGIES[name](organization, agent_ids, loads)
+
+
+@transaction.atomic
+def assign_leads(strategy, leads):
+  """
+  Assign unassigned leads (needing only id and category_id loaded), returning
+  {agent_id: [lead ids]} for the leads actually assigned.
+  """
+  plan = defaultdict(list)
+  for lead in leads:
+    agent_id = strategy.choose(lead)
+    strategy.assigned(lead, agent_id)
+    plan[agent_id].append(lead.pk)
+
+  assigned = {}
+  deltas = Counter()
+  changes = {}
+  organization_id = strategy.organization.pk
+  now = timezone.now()
+  for agent_id, lead_ids in plan.items():
+    # Leads assigned by someone else in the meantime are left alone
+    queryset = Lead.objects.filter(pk__in=lead_ids, agent__isnull=True)
+    locked_ids = list(queryset.select_for_update().values_list('pk', flat=True))
+    count = Lead.objects.filter(pk__in=locked_ids).update(agent_id=agent_id, updated_at=now)
+    if count:
+      assigned[agent_id] = locked_ids
+      changes.update((lead_id, {'agent': [None, agent_id]}) for lead_id in locked_ids)
+      deltas[(organization_id, LeadStatistic.AGENT, agent_id)] += count
+      deltas[(organization_id, LeadStatistic.AGENT, LeadStatistic.NONE)] -= count
+      LEADS_ASSIGNED.inc(count, method='auto')
+  LeadStatistic.objects.apply_deltas(deltas)
+  LeadActivity.objects.record(organization_id, changes, action=LeadActivity.ASSIGNED)
+  strategy.finish()
+  if assigned:
+    bump_organization_version(organization_id)
+  return assigned
+
+
+def assign_new_leads(organization, leads):
+  """Distribute freshly created leads if the organization has a strategy"""
+  leads = [lead for lead in leads if lead.agent_id is None]
+  strategy = get_strategy(organization) if leads else None
+  if strategy is None:
+    return {}
+  assigned = assign_leads(strategy, leads)
+  agents = {lead_id: agent_id for agent_id, lead_ids in assigned.items() for lead_id in lead_ids}
+  for lead in leads:
+    lead.agent_id = agents.get(lead.pk)
+  return assigned
+
+
+def distribute_backlog(organization, strategy=None, batch_size=500):
+  """Assign every unassigned lead of an organization, oldest first, returning how many were assigned"""
+  strategy = get_strategy(organization, strategy)
+  if strategy is None:
+    return 0
+  total = 0
+  last = None
+  while True:
+    queryset = Lead.objects.filter(organization=organization, agent__isnull=True)
+    if last:
+      queryset = queryset.filter(date_added__gte=last.date_added).exclude(
+        date_added=last.date_added, pk__lte=last.pk
+      )
+    batch = list(queryset.order_by('date_added', 'id').only('id', 'category_id', 'date_added')[:batch_size])
+    if not batch:
+      return total
+    assigned = assign_leads(strategy, batch)
+    total += sum(len(lead_ids) for lead_ids in assigned.values())
+    last = batch[-1]
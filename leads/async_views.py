@@ -0,0 +1,106 @@
+from asgiref.sync import sync_to_async
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.http import Http404
+from django.shortcuts import redirect
+from .caching import prefetch_fragments
+from .conditional import ConditionalCheck, OrganizationConditionMixin
+from .models import ArchivedLead, LeadStatistic
+from .tenancy import get_tenant
+from . import views
+
+
+# Async versions of the read-heavy lead pages, used instead of the sync ones
+# when ASYNC_VIEWS is set (see runserver.sh). They share the querysets and
+# templates of leads.views, but fetch everything with the async ORM before
+# rendering, so that a worker's event loop is never blocked on the database.
+# What only feeds {% versioned_cache %} fragments is fetched only when the
+# fragment isn't cached, like the lazy context values of the sync views.
+
+
+class AsyncLoginRequiredMixin(LoginRequiredMixin):
+  organizer_required = False
+
+  async def dispatch(self, request, *args, **kwargs):
+    # request.user and request.tenant are lazy and may query, resolve them in a thread once
+    await sync_to_async(lambda: get_tenant(request.user))()
+    if not request.user.is_authenticated:
+      return self.handle_no_permission()
+    if self.organizer_required and not request.user.is_organizer:
+      return redirect('leads:lead-list')
+    check = None
+    if isinstance(self, OrganizationConditionMixin):
+      # Cache lookups only, but the cache backend may block
+      check = await sync_to_async(ConditionalCheck)(request)
+      response = check.response()
+      if response is not None:
+        return check.add_headers(response)
+    handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+    response = await handler(request, *args, **kwargs)
+    return check.add_headers(response) if check else response
+
+
+class AsyncDetailMixin:
+
+  async def aget_object(self, queryset):
+    try:
+      return await queryset.aget(pk=self.kwargs['pk'])
+    except queryset.model.DoesNotExist:
+      raise Http404(f'No {queryset.model._meta.verbose_name} found matching the query')
+
+
+class LeadListView(AsyncLoginRequiredMixin, views.LeadListView):
+
+  async def get(self, request, *args, **kwargs):
+    self.object_list = self.get_queryset()
+    context = self.get_context_data()
+    # Vary on the same values as the template, missing parameters resolve to ''
+    fragments = {'lead_list': [request.GET.get('after', ''), request.GET.get('before', '')]}
+    if 'unassigned_leads' in context:
+      fragments['unassigned_leads'] = [
+        request.GET.get('unassigned_after', ''), request.GET.get('unassigned_before', '')
+      ]
+    missing = await sync_to_async(prefetch_fragments)(request, fragments)
+    if 'lead_list' in missing:
+      await context['page_obj'].aload()
+    if 'unassigned_leads' in missing:
+      await context['unassigned_leads'].aload()
+    return self.render_to_response(context)
+
+
+class LeadDetailView(AsyncLoginRequiredMixin, AsyncDetailMixin, views.LeadDetailView):
+
+  async def get(self, request, *args, **kwargs):
+    # The template shows the agent by email
+    try:
+      self.object = await self.aget_object(self.get_queryset().select_related('agent__user'))
+    except Http404:
+      if await ArchivedLead.objects.for_user(request.user).filter(pk=kwargs['pk']).aexists():
+        return redirect('leads:archived-lead-detail', pk=kwargs['pk'])
+      raise
+    context = self.get_context_data(object=self.object)
+    await sync_to_async(lambda: context['activities'].entries)()
+    return self.render_to_response(context)
+
+
+class CategoryListView(AsyncLoginRequiredMixin, views.CategoryListView):
+  organizer_required = True
+
+  async def get(self, request, *args, **kwargs):
+    self.object_list = self.get_queryset()
+    if await sync_to_async(prefetch_fragments)(request, {'category_list': []}):
+      self.object_list = [category async for category in self.object_list.aiterator()]
+      # Fills the cached_property read by the lazy context values
+      self.__dict__['lead_counts'] = await LeadStatistic.objects.acounts(
+        request.tenant.organization, LeadStatistic.CATEGORY
+      )
+    return self.render_to_response(self.get_context_data())
+
+
+class CategoryDetailView(AsyncLoginRequiredMixin, AsyncDetailMixin, views.CategoryDetailView):
+
+  async def get(self, request, *args, **kwargs):
+    self.object = await self.aget_object(self.get_queryset())
+    context = self.get_context_data(object=self.object)
+    if await sync_to_async(prefetch_fragments)(request, {'category_detail': [self.object.pk]}):
+      context['leads'] = [lead async for lead in context['leads'].aiterator()]
+    return self.render_to_response(context)
@@ -0,0 +1,26 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.conf import settings
+from .caching import USER_CACHE_KEY
+
+
+class CachedModelBackend(ModelBackend):
+  """
+  ModelBackend whose per-request user lookup is served from the cache,
+  together with the user's profile, agent and agent organization. Saving or
+  deleting any of those drops the cached copy.
+  """
+
+  def get_user(self, user_id):
+    key = USER_CACHE_KEY.format(user_id)
+    user = cache.get(key)
+    if user is None:
+      User = get_user_model()
+      user = User._default_manager.select_related(
+        'userprofile', 'agent__organization'
+      ).filter(pk=user_id).first()
+      if user is None:
+        return None
+      cache.set(key, user, settings.USER_CACHE_TIMEOUT)
+    return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,185 @@
+import http.client
+import statistics
+import threading
+import time
+from importlib import import_module
+from urllib.parse import urlsplit
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.db import connection, reset_queries
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from .models import Agent, Category, Lead
+
+
+# View benchmark. Every URL of the leads and agents apps is requested through
+# the test client as one user; the first request counts queries, the timed
+# ones run without query capture so they are not slowed down by it.
+
+URLCONFS = ('leads.urls', 'agents.urls')
+PERCENTILES = (50, 90, 95, 99)
+# Which object a <pk> route points at, by view name and then by namespace
+PK_SOURCES = {'leads:category-detail': 'category', 'leads': 'lead', 'agents': 'agent'}
+# The invite accept page is measured as shown for an expired link
+URL_KWARGS = {'format': 'csv', 'uidb64': 'MQ', 'token': 'expired'}
+QUERY_PARAMS = {'leads:lead-search': {'q': 'smith'}}
+
+
+def sample_objects(user):
+  leads = Lead.objects.for_user(user).order_by('-date_added', '-id')
+  return {
+    'lead': leads.first(),
+    # For routes taking a second lead, like the merge page
+    'other': leads[1:2].first(),
+    'category': Category.objects.for_user(user).order_by('pk').first(),
+    'agent': Agent.objects.for_user(user).order_by('pk').first(),
+  }
+
+
+def benchmark_urls(user, exclude=()):
+  """Yield (view name, url, query params) for every benchmarked route"""
+  objects = sample_objects(user)
+  for urlconf in URLCONFS:
+    module = import_module(urlconf)
+    for pattern in module.urlpatterns:
+      view_name = f'{module.app_name}:{pattern.name}'
+      if view_name in exclude:
+        continue
+      kwargs = {}
+      for name in pattern.pattern.converters:
+        if name in ('pk', 'other'):
+          source = name if name == 'other' else PK_SOURCES.get(view_name) or PK_SOURCES[module.app_name]
+          obj = objects[source]
+          if obj is None:
+            break
+          kwargs[name] = obj.pk
+        else:
+          kwargs[name] = URL_KWARGS[name]
+      else:
+        yield view_name, reverse(view_name, kwargs=kwargs), QUERY_PARAMS.get(view_name, {})
+
+
+def fetch(client, url, params):
+  response = client.get(url, params, secure=True)
+  if response.streaming:
+    for _ in response.streaming_content:
+      pass
+  return response
+
+
+def summarize(timings):
+  cuts = statistics.quantiles(timings, n=100, method='inclusive')
+  summary = {f'p{p}_ms': round(cuts[p - 1] * 1000, 3) for p in PERCENTILES}
+  summary['min_ms'] = round(min(timings) * 1000, 3)
+  summary['max_ms'] = round(max(timings) * 1000, 3)
+  return summary
+
+
+@override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'])
+def run_benchmark(user, iterations=20, warmup=2, exclude=(), on_result=None):
+  if iterations < 2:
+    raise ValueError('At least two iterations are needed for percentiles')
+  client = Client()
+  client.force_login(user)
+  views = {}
+  for view_name, url, params in benchmark_urls(user, exclude):
+    for _ in range(warmup):
+      fetch(client, url, params)
+    # Every request clears the query log, so start from an empty one
+    reset_queries()
+    with CaptureQueriesContext(connection) as queries:
+      response = fetch(client, url, params)
+    timings = []
+    for _ in range(iterations):
+      start = time.perf_counter()
+      fetch(client, url, params)
+      timings.append(time.perf_counter() - start)
+    views[view_name] = {'url': url, 'status': response.status_code, 'queries': len(queries), **summarize(timings)}
+    if on_result:
+      on_result(view_name, views[view_name])
+  return {
+    'meta': {
+      'user': user.username,
+      'database': connection.vendor,
+      'leads': Lead.objects.for_user(user).count(),
+      'iterations': iterations,
+    },
+    'views': views,
+  }
+
+
+def find_regressions(results, baseline, tolerance=0.25, metric='p95_ms', noise_ms=1.0):
+  """
+  Compare results to a baseline run, returning a message per view that got
+  slower by more than `tolerance` (and `noise_ms`) or runs more queries.
+  """
+  regressions = []
+  for view_name, base in baseline['views'].items():
+    current = results['views'].get(view_name)
+    if current is None:
+      continue
+    limit = max(base[metric] * (1 + tolerance), base[metric] + noise_ms)
+    if current[metric] > limit:
+      regressions.append(f'{view_name}: {metric} {current[metric]} > {base[metric]} (limit {limit:.3f})')
+    if current['queries'] > base['queries']:
+      regressions.append(f'{view_name}: {current["queries"]} queries > {base["queries"]}')
+  return regressions
+
+
+def session_cookie(user):
+  """A logged in session for `user`, as a Cookie header value"""
+  session = import_module(settings.SESSION_ENGINE).SessionStore()
+  session[SESSION_KEY] = user._meta.pk.value_to_string(user)
+  session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+  session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+  session.save()
+  return f'{settings.SESSION_COOKIE_NAME}={session.session_key}'
+
+
+def run_load(url, headers, concurrency=50, duration=10.0):
+  """
+  Request `url` from `concurrency` keep-alive clients for `duration` seconds,
+  returning the throughput and latency percentiles.
+  """
+  parts = urlsplit(url)
+  connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+  path = parts.path + (f'?{parts.query}' if parts.query else '')
+  deadline = time.perf_counter() + duration
+  timings = []
+  errors = []
+  lock = threading.Lock()
+
+  def client():
+    connection = connection_class(parts.netloc, timeout=30)
+    own_timings = []
+    own_errors = 0
+    while time.perf_counter() < deadline:
+      start = time.perf_counter()
+      try:
+        connection.request('GET', path, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        if response.status != 200:
+          own_errors += 1
+      except (OSError, http.client.HTTPException):
+        own_errors += 1
+        connection.close()
+        continue
+      own_timings.append(time.perf_counter() - start)
+    connection.close()
+    with lock:
+      timings.extend(own_timings)
+      errors.append(own_errors)
+
+  started = time.perf_counter()
+  threads = [threading.Thread(target=client) for _ in range(concurrency)]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  elapsed = time.perf_counter() - started
+  result = {'requests': len(timings), 'errors': sum(errors), 'rps': round(len(timings) / elapsed, 1)}
+  if len(timings) >= 2:
+    result.update(summarize(timings))
+  return result
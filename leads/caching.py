@@ -0,0 +1,89 @@
+import time
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+
+
+# Per-organization version counter used in template fragment cache keys.
+# Any write to an organization's leads, categories or agents bumps it, which
+# makes every cached fragment of that organization unreachable at once; the
+# stale entries simply expire.
+
+VERSION_KEY = 'crm:organization-version:{}'
+STATS_KEY = 'crm:fragment-cache:{}:{}'
+FRAGMENT_NAMES_KEY = 'crm:fragment-cache:names'
+# Users cached by leads.backends.CachedModelBackend
+USER_CACHE_KEY = 'crm:user:{}'
+
+
+def organization_version(organization_id):
+  key = VERSION_KEY.format(organization_id)
+  version = cache.get(key)
+  if version is None:
+    # Start from the clock so a counter lost to eviction never reuses an old version
+    cache.add(key, time.time_ns() // 1000, timeout=None)
+    version = cache.get(key)
+  return version
+
+
+def bump_organization_version(organization_id):
+  try:
+    return cache.incr(VERSION_KEY.format(organization_id))
+  except ValueError:
+    return organization_version(organization_id)
+
+
+def invalidate_cached_user(user_id):
+  cache.delete(USER_CACHE_KEY.format(user_id))
+
+
+def fragment_key(request, fragment_name, vary_on):
+  """Cache key of a {% versioned_cache %} fragment"""
+  organization_id = request.tenant.organization.pk
+  # Fragments differ per user (agents only see their own leads)
+  vary_on = [request.user.pk] + list(vary_on)
+  return make_template_fragment_key(
+    f'{fragment_name}:{organization_id}:{organization_version(organization_id)}', vary_on
+  )
+
+
+def prefetch_fragments(request, fragments):
+  """
+  Look up {fragment name: vary_on values} before rendering, and return the
+  names of the missing ones. The hits are kept on the request and rendered
+  by {% versioned_cache %}, so they can't expire in between.
+  """
+  if request.tenant.organization is None:
+    return set(fragments)
+  keys = {name: fragment_key(request, name, vary_on) for name, vary_on in fragments.items()}
+  found = cache.get_many(keys.values())
+  request.prefetched_fragments = {**getattr(request, 'prefetched_fragments', {}), **found}
+  return {name for name, key in keys.items() if key not in found}
+
+
+def record_fragment_lookup(fragment_name, hit):
+  key = STATS_KEY.format(fragment_name, 'hits' if hit else 'misses')
+  if not cache.add(key, 1, timeout=None):
+    try:
+      cache.incr(key)
+    except ValueError:
+      cache.add(key, 1, timeout=None)
+  if not hit:
+    names = cache.get(FRAGMENT_NAMES_KEY, set())
+    if fragment_name not in names:
+      cache.set(FRAGMENT_NAMES_KEY, names | {fragment_name}, timeout=None)
+
+
+def fragment_cache_stats():
+  """{fragment name: (hits, misses)} since the counters were last cleared"""
+  names = sorted(cache.get(FRAGMENT_NAMES_KEY, set()))
+  keys = [STATS_KEY.format(name, kind) for name in names for kind in ('hits', 'misses')]
+  values = cache.get_many(keys)
+  return {
+    name: (values.get(STATS_KEY.format(name, 'hits'), 0), values.get(STATS_KEY.format(name, 'misses'), 0))
+    for name in names
+  }
+
+
+def clear_fragment_cache_stats():
+  names = cache.get(FRAGMENT_NAMES_KEY, set())
+  cache.delete_many([STATS_KEY.format(name, kind) for name in names for kind in ('hits', 'misses')])
@@ -0,0 +1,222 @@
+import re
+from collections import defaultdict
+from difflib import SequenceMatcher
+from itertools import combinations
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from .models import Lead, LeadBlockingKey, DuplicateLeadPair
+
+
+# Duplicate lead detection. Each lead is indexed under a few normalized
+# blocking keys (canonical email, E.164 phone number, phonetic name) and only
+# leads sharing a key are ever compared, so checking a new lead is one index
+# lookup and a sweep costs the sum of the squared block sizes instead of n².
+
+EMAIL = 'e:'
+PHONE = 'p:'
+NAME = 'n:'
+
+# Leads sharing a key of each kind score this much, the name weight being scaled by similarity
+WEIGHTS = {EMAIL: 0.45, PHONE: 0.35, NAME: 0.2}
+COMPARED_FIELDS = ('first_name', 'last_name', 'email', 'phone_number', 'organization_id')
+# Changes to these (as named by leads.activity) change the keys
+IDENTITY_FIELDS = {'first_name', 'last_name', 'email', 'phone_number'}
+
+SOUNDEX_CODES = {
+  **dict.fromkeys('bfpv', '1'), **dict.fromkeys('cgjkqsxz', '2'), **dict.fromkeys('dt', '3'),
+  'l': '4', **dict.fromkeys('mn', '5'), 'r': '6',
+}
+
+
+def canonical_email(email):
+  email = (email or '').strip().lower()
+  local, _, domain = email.partition('@')
+  if not local or not domain:
+    return ''
+  local = local.split('+', 1)[0]
+  if domain in ('gmail.com', 'googlemail.com'):
+    # Gmail ignores dots in the local part
+    local, domain = local.replace('.', ''), 'gmail.com'
+  return f'{local}@{domain}'
+
+
+def e164_phone(phone):
+  """
+  E.164 form of a phone number, or '' if it is too short to identify anyone.
+  Numbers without a country code are taken to be in DEDUP_DEFAULT_COUNTRY_CODE.
+  """
+  phone = (phone or '').strip()
+  digits = re.sub(r'\D', '', phone)
+  if digits.startswith('00'):
+    # International call prefix
+    digits = digits[2:]
+  elif not phone.startswith('+') and len(digits) == 10:
+    digits = settings.DEDUP_DEFAULT_COUNTRY_CODE + digits
+  if not 8 <= len(digits) <= 15:
+    return ''
+  return f'+{digits}'
+
+
+def soundex(name):
+  letters = [c for c in (name or '').lower() if 'a' <= c <= 'z']
+  if not letters:
+    return ''
+  code = letters[0].upper()
+  previous = SOUNDEX_CODES.get(letters[0], '')
+  for letter in letters[1:]:
+    digit = SOUNDEX_CODES.get(letter, '')
+    if digit and digit != previous:
+      code += digit
+    # h and w don't separate letters with the same code, vowels do
+    if letter not in 'hw':
+      previous = digit
+  return (code + '000')[:4]
+
+
+def blocking_keys(lead):
+  keys = []
+  email = canonical_email(lead.email)
+  if email:
+    keys.append(EMAIL + email[:98])
+  phone = e164_phone(lead.phone_number)
+  if phone:
+    keys.append(PHONE + phone)
+  last, first = soundex(lead.last_name), soundex(lead.first_name)
+  if last and first:
+    keys.append(f'{NAME}{last}:{first}')
+  return keys
+
+
+def index_leads(leads, replace=False):
+  """
+  Store the blocking keys of leads written without Lead.save(), which indexes
+  its lead itself, replacing the old keys of updated leads.
+  """
+  if replace:
+    LeadBlockingKey.objects.filter(lead__in=[lead.pk for lead in leads]).delete()
+  LeadBlockingKey.objects.bulk_create([
+    LeadBlockingKey(organization_id=lead.organization_id, lead_id=lead.pk, key=key)
+    for lead in leads
+    for key in blocking_keys(lead)
+  ])
+
+
+def reindex(organization, chunk_size=5000):
+  """Rebuild an organization's blocking keys, e.g. after changing how keys are normalized"""
+  LeadBlockingKey.objects.filter(organization=organization).delete()
+  leads = Lead.objects.filter(organization=organization).only(*COMPARED_FIELDS).order_by('pk')
+  last_pk = 0
+  while True:
+    chunk = list(leads.filter(pk__gt=last_pk)[:chunk_size])
+    if not chunk:
+      return
+    index_leads(chunk)
+    last_pk = chunk[-1].pk
+
+
+def score(lead, other, shared=None):
+  """How likely two leads are to be the same person, from 0 to 1"""
+  if shared is None:
+    shared = set(blocking_keys(lead)) & set(blocking_keys(other))
+  kinds = {key[:2] for key in shared}
+  name = f'{lead.first_name} {lead.last_name}'.lower()
+  other_name = f'{other.first_name} {other.last_name}'.lower()
+  total = WEIGHTS[NAME] * SequenceMatcher(None, name, other_name).ratio()
+  for kind in (EMAIL, PHONE):
+    if kind in kinds:
+      total += WEIGHTS[kind]
+  return round(total, 3)
+
+
+def find_duplicates(lead, limit=5):
+  """[(score, lead)] of the organization's leads likely to duplicate `lead`, best first"""
+  keys = blocking_keys(lead)
+  if not keys:
+    return []
+  candidates = LeadBlockingKey.objects.filter(organization_id=lead.organization_id, key__in=keys)
+  if lead.pk:
+    candidates = candidates.exclude(lead_id=lead.pk)
+  # A cap, so that a very common name can't make the check slow
+  lead_ids = candidates.values_list('lead_id', flat=True).distinct()[:settings.DEDUP_MAX_BLOCK_SIZE]
+  scored = [
+    (score(lead, other), other)
+    for other in Lead.objects.filter(pk__in=list(lead_ids)).only(*COMPARED_FIELDS)
+  ]
+  matches = [(value, other) for value, other in scored if value >= settings.DEDUP_THRESHOLD]
+  return sorted(matches, key=lambda match: (-match[0], match[1].pk))[:limit]
+
+
+def split_duplicates(organization, leads):
+  """
+  Split unsaved leads into (new, [(lead, (score, match))]), a match being an
+  existing lead or an earlier lead of the same list. One lookup for the whole list.
+  """
+  keys = {id(lead): blocking_keys(lead) for lead in leads}
+  by_key = defaultdict(list)
+  existing = LeadBlockingKey.objects.filter(
+    organization=organization, key__in={key for lead_keys in keys.values() for key in lead_keys}
+  ).values_list('key', 'lead_id')
+  for key, lead_id in existing:
+    by_key[key].append(lead_id)
+  other_ids = {lead_id for lead_ids in by_key.values() for lead_id in lead_ids}
+  others = Lead.objects.only(*COMPARED_FIELDS).in_bulk(other_ids)
+  for key, lead_ids in by_key.items():
+    by_key[key] = [others[lead_id] for lead_id in lead_ids if lead_id in others]
+
+  new = []
+  duplicates = []
+  for lead in leads:
+    candidates = {id(other): other for key in keys[id(lead)] for other in by_key.get(key, ())}
+    best = max(((score(lead, other), other) for other in candidates.values()), default=None, key=lambda m: m[0])
+    if best and best[0] >= settings.DEDUP_THRESHOLD:
+      duplicates.append((lead, best))
+      continue
+    new.append(lead)
+    for key in keys[id(lead)]:
+      by_key[key].append(lead)
+  return new, duplicates
+
+
+def sweep(organization, chunk_size=1000):
+  """Replace the organization's DuplicateLeadPair rows by comparing the leads of every block, returning them"""
+  blocks = LeadBlockingKey.objects.filter(organization=organization).values('key').annotate(
+    size=Count('id')
+  ).filter(size__gt=1, size__lte=settings.DEDUP_MAX_BLOCK_SIZE).order_by().values_list('key', flat=True)
+  pairs = {}
+  block_keys = list(blocks)
+  for i in range(0, len(block_keys), chunk_size):
+    members = defaultdict(list)
+    rows = LeadBlockingKey.objects.filter(organization=organization, key__in=block_keys[i:i + chunk_size])
+    for key, lead_id in rows.values_list('key', 'lead_id'):
+      members[key].append(lead_id)
+    leads = Lead.objects.only(*COMPARED_FIELDS).in_bulk({pk for lead_ids in members.values() for pk in lead_ids})
+    for lead_ids in members.values():
+      for a, b in combinations(sorted(lead_ids), 2):
+        if (a, b) not in pairs:
+          pairs[(a, b)] = score(leads[a], leads[b])
+
+  found = [
+    DuplicateLeadPair(organization=organization, lead_id=a, duplicate_id=b, score=value)
+    for (a, b), value in pairs.items() if value >= settings.DEDUP_THRESHOLD
+  ]
+  with transaction.atomic():
+    DuplicateLeadPair.objects.filter(organization=organization).delete()
+    DuplicateLeadPair.objects.bulk_create(found)
+  return found
+
+
+MERGED_FIELDS = ('age', 'agent_id', 'category_id', 'description', 'phone_number', 'email')
+
+
+@transaction.atomic
+def merge_leads(kept, merged):
+  """Fill the kept lead's empty fields from the merged lead, then delete the merged lead"""
+  for name in MERGED_FIELDS:
+    if not getattr(kept, name) and getattr(merged, name):
+      setattr(kept, name, getattr(merged, name))
+  if merged.description and merged.description not in kept.description:
+    kept.description = f'{kept.description}\n\n{merged.description}'.strip()
+  merged.delete()
+  kept.save()
+  return kept
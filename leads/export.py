@@ -0,0 +1,64 @@
+import csv
+import json
+from datetime import datetime, time, timedelta
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+
+# Export column name -> ORM path
+EXPORT_COLUMNS = {
+  'id': 'id',
+  'first_name': 'first_name',
+  'last_name': 'last_name',
+  'age': 'age',
+  'email': 'email',
+  'phone_number': 'phone_number',
+  'description': 'description',
+  'date_added': 'date_added',
+  'agent': 'agent__user__email',
+  'category': 'category__name',
+}
+
+
+def start_of_day(value, days_later=0):
+  day = parse_date(value)
+  if day is None:
+    raise ValueError(value)
+  return timezone.make_aware(datetime.combine(day + timedelta(days=days_later), time.min))
+
+
+def filter_leads(queryset, params):
+  """
+  Apply the `agent`, `category` (an id or "none"), `added_after` and
+  `added_before` filters, raising ValueError for invalid values.
+  """
+  for name in ('agent', 'category'):
+    value = params.get(name)
+    if value == 'none':
+      queryset = queryset.filter(**{f'{name}__isnull': True})
+    elif value:
+      queryset = queryset.filter(**{f'{name}_id': int(value)})
+  # Compared as datetimes so that the (organization, date_added) index applies
+  if params.get('added_after'):
+    queryset = queryset.filter(date_added__gte=start_of_day(params['added_after']))
+  if params.get('added_before'):
+    queryset = queryset.filter(date_added__lt=start_of_day(params['added_before'], days_later=1))
+  return queryset
+
+
+class Echo:
+  """File-like object that hands each written line straight back to the caller"""
+  def write(self, value):
+    return value
+
+
+def stream_csv(columns, rows):
+  writer = csv.writer(Echo())
+  yield writer.writerow(columns)
+  for row in rows:
+    yield writer.writerow(row)
+
+
+def stream_jsonl(columns, rows):
+  for row in rows:
+    yield json.dumps(dict(zip(columns, row)), default=str, separators=(',', ':')) + '\n'
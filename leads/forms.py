@@ -1,7 +1,9 @@
 from django import forms
 from django.contrib.auth import get_user_model
-from django.contrib.auth.forms import UserCreationForm, UsernameField
-from .models import Lead, Agent
+from django.contrib.auth.forms import UserCreationForm, UsernameField, PasswordResetForm
+from django.template import loader
+from .models import Lead, Agent, Category, UserProfile
+from .outbox import queue_mail
 
 User = get_user_model()
 
@@ -18,6 +20,29 @@ class LeadModelForm(forms.ModelForm):
       'email',
       )
 
+class LeadImportRowForm(LeadModelForm):
+  """LeadModelForm's validation for imported rows, whose agent is looked up by name"""
+  class Meta(LeadModelForm.Meta):
+    fields = tuple(field for field in LeadModelForm.Meta.fields if field != 'agent')
+
+
+class CategoryApiForm(forms.ModelForm):
+  class Meta:
+    model = Category
+    fields = ('name',)
+
+
+class LeadImportForm(forms.Form):
+  file = forms.FileField(help_text='CSV with a header row, or one JSON object per line')
+  format = forms.ChoiceField(
+    choices=(('', 'Detect from file name'), ('csv', 'CSV'), ('jsonl', 'JSON Lines')),
+    required=False
+  )
+  skip_duplicates = forms.BooleanField(
+    required=False, initial=True, help_text='Reject rows that match an existing lead'
+  )
+
+
 class LeadForm(forms.Form):
   first_name = forms.CharField()
   last_name = forms.CharField()
@@ -31,16 +56,44 @@ class CustomUserCreationForm(UserCreationForm):
     field_classes = {'username': UsernameField}
 
 
+class OutboxPasswordResetForm(PasswordResetForm):
+  """Password reset form that queues its mail in the outbox instead of sending it inline"""
+
+  def send_mail(self, subject_template_name, email_template_name, context, from_email, to_email,
+                html_email_template_name=None):
+    subject = loader.render_to_string(subject_template_name, context)
+    # Email subject *must not* contain newlines
+    subject = ''.join(subject.splitlines())
+    body = loader.render_to_string(email_template_name, context)
+    html_body = None
+    if html_email_template_name is not None:
+      html_body = loader.render_to_string(html_email_template_name, context)
+    queue_mail(subject, body, from_email, [to_email], html_message=html_body)
+
+
 class AssignAgentForm(forms.Form):
   agent = forms.ModelChoiceField(queryset=Agent.objects.none())
 
   def __init__(self, *args, **kwargs):
     request = kwargs.pop('request')
-    agents = Agent.objects.filter(organization=request.user.userprofile)
+    agents = Agent.objects.for_user(request.user).select_related('user')
     super(AssignAgentForm, self).__init__(*args, **kwargs)
     self.fields['agent'].queryset = agents
 
 
+class AssignmentStrategyForm(forms.ModelForm):
+  distribute_now = forms.BooleanField(
+    required=False,
+    help_text='Also assign every currently unassigned lead with this strategy'
+  )
+
+  class Meta:
+    model = UserProfile
+    fields = (
+      'assignment_strategy',
+    )
+
+
 class LeadCategoryUpdateForm(forms.ModelForm):
   class Meta:
     model = Lead
@@ -0,0 +1,174 @@
+import csv
+import json
+from io import TextIOWrapper
+from django.db import transaction
+from djcrm.metrics import LEADS_CREATED
+from .assignment import assign_new_leads
+from .caching import bump_organization_version
+from .dedup import index_leads, split_duplicates
+from .forms import LeadImportRowForm
+from .models import Lead, Agent, Category, LeadStatistic
+
+
+# Streaming lead import. Rows are read one at a time, validated with the same
+# rules as LeadModelForm and written with bulk_create() in fixed size batches,
+# so memory use depends on the batch size and not on the size of the file.
+
+FORMATS = ('csv', 'jsonl')
+
+
+def guess_format(filename):
+  return 'jsonl' if filename.lower().endswith(('.jsonl', '.ndjson')) else 'csv'
+
+
+def read_csv(stream):
+  reader = csv.DictReader(stream)
+  for row in reader:
+    yield reader.line_num, row
+
+
+def read_jsonl(stream):
+  for line_number, line in enumerate(stream, 1):
+    if not line.strip():
+      continue
+    try:
+      row = json.loads(line)
+    except ValueError as e:
+      row = e
+    yield line_number, row
+
+
+def read_rows(stream, format):
+  return read_jsonl(stream) if format == 'jsonl' else read_csv(stream)
+
+
+# Raised while iterating over the rows of an upload that isn't UTF-8 text or valid CSV
+UNREADABLE_FILE_ERRORS = (UnicodeDecodeError, csv.Error)
+
+
+def open_upload(upload):
+  # Large uploads are spooled to disk by Django, read them back line by line
+  return TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+
+
+def unreadable_file_message(error):
+  if isinstance(error, UnicodeDecodeError):
+    return 'The file is not UTF-8 encoded text'
+  return f'The file is not valid CSV: {error}'
+
+
+def create_leads(organization, leads, source):
+  """Insert validated leads of one organization with everything Lead.save() would have done"""
+  with transaction.atomic():
+    Lead.objects.bulk_create(leads)
+    # bulk_create() bypasses Lead.save(), so count and index the new leads here
+    LeadStatistic.objects.record_leads(leads)
+    index_leads(leads)
+    assign_new_leads(organization, leads)
+  bump_organization_version(organization.pk)
+  LEADS_CREATED.inc(len(leads), source=source)
+
+
+class ImportResult:
+
+  def __init__(self, max_errors):
+    self.created = 0
+    self.failed = 0
+    # Only the first few errors are kept for display, the rest are just counted
+    self.errors = []
+    self.max_errors = max_errors
+    # Why reading stopped early, if it did
+    self.unreadable = None
+
+  def add_error(self, line_number, message):
+    self.failed += 1
+    if len(self.errors) < self.max_errors:
+      self.errors.append((line_number, message))
+
+
+class LeadImporter:
+
+  def __init__(self, organization, batch_size=1000, on_error=None, max_errors=100, skip_duplicates=False):
+    self.organization = organization
+    self.batch_size = batch_size
+    self.skip_duplicates = skip_duplicates
+    self.on_error = on_error
+    self.max_errors = max_errors
+    # Name lookups are built once per import instead of once per row
+    self.agents = {}
+    agents = Agent.objects.filter(organization=organization).values_list('pk', 'user__username', 'user__email')
+    for pk, username, email in agents:
+      self.agents[username.lower()] = pk
+      if email:
+        self.agents[email.lower()] = pk
+    self.categories = {
+      name.lower(): pk
+      for pk, name in Category.objects.filter(organization=organization).values_list('pk', 'name')
+    }
+
+  def resolve(self, lookup, value, label, errors):
+    # JSON rows may hold numbers or other non-string values
+    value = '' if value is None else str(value).strip()
+    if not value:
+      return None
+    pk = lookup.get(value.lower())
+    if pk is None:
+      errors.append(f'{label}: unknown {label} "{value}"')
+    return pk
+
+  def build_lead(self, row):
+    """Return (lead, errors) for one row"""
+    if not isinstance(row, dict):
+      return None, [f'invalid row: {row}']
+    form = LeadImportRowForm(data=row)
+    errors = []
+    if not form.is_valid():
+      for field, field_errors in form.errors.items():
+        errors.extend(f'{field}: {error}' for error in field_errors)
+    agent_id = self.resolve(self.agents, row.get('agent'), 'agent', errors)
+    category_id = self.resolve(self.categories, row.get('category'), 'category', errors)
+    if errors:
+      return None, errors
+    lead = form.save(commit=False)
+    lead.organization = self.organization
+    lead.agent_id = agent_id
+    lead.category_id = category_id
+    return lead, []
+
+  def flush(self, batch, result):
+    if self.skip_duplicates:
+      batch, duplicates = split_duplicates(self.organization, batch)
+      for lead, (_, match) in duplicates:
+        message = f'likely duplicate of {match.first_name} {match.last_name}'
+        if match.pk:
+          message += f' (lead {match.pk})'
+        self.reject(result, lead.line_number, message)
+    if batch:
+      create_leads(self.organization, batch, source='import')
+    result.created += len(batch)
+
+  def reject(self, result, line_number, message):
+    result.add_error(line_number, message)
+    if self.on_error:
+      self.on_error(line_number, message)
+
+  def run(self, rows):
+    result = ImportResult(self.max_errors)
+    batch = []
+    try:
+      for line_number, row in rows:
+        lead, errors = self.build_lead(row)
+        if errors:
+          self.reject(result, line_number, '; '.join(errors))
+          continue
+        lead.line_number = line_number
+        batch.append(lead)
+        if len(batch) >= self.batch_size:
+          self.flush(batch, result)
+          batch = []
+    except UNREADABLE_FILE_ERRORS as e:
+      # The rows read so far are still imported
+      result.unreadable = unreadable_file_message(e)
+    if batch:
+      self.flush(batch, result)
+    return result
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from leads.archive import archive_leads, stale_leads
+
+
+class Command(BaseCommand):
+  help = 'Move stale leads to the archive table'
+
+  def add_arguments(self, parser):
+    parser.add_argument('--organization', help='Username of a single organization')
+    parser.add_argument('--days', type=int, default=settings.LEAD_ARCHIVE_AFTER_DAYS)
+    parser.add_argument(
+      '--category', action='append', dest='categories',
+      help='Category archived after --category-days instead, can be repeated (default: LEAD_ARCHIVE_CATEGORIES)'
+    )
+    parser.add_argument('--category-days', type=int, default=settings.LEAD_ARCHIVE_CATEGORY_AFTER_DAYS)
+    parser.add_argument('--chunk-size', type=int, default=settings.LEAD_ARCHIVE_CHUNK_SIZE)
+    parser.add_argument('--pause', type=float, default=0, help='Seconds to wait between chunks')
+    parser.add_argument('--dry-run', action='store_true', help='Only count the leads that would be archived')
+
+  def handle(self, *args, **options):
+    categories = options['categories'] or settings.LEAD_ARCHIVE_CATEGORIES
+    queryset = stale_leads(options['days'], categories, options['category_days'])
+    if options['organization']:
+      queryset = queryset.filter(organization__user__username=options['organization'])
+
+    if options['dry_run']:
+      self.stdout.write(f'{queryset.count()} lead(s) would be archived')
+      return
+    total = archive_leads(
+      queryset, chunk_size=options['chunk_size'], pause=options['pause'],
+      on_chunk=lambda count: self.stdout.write(f'{count} lead(s) archived')
+    )
+    self.stdout.write(self.style.SUCCESS(f'Archived {total} lead(s)'))
@@ -0,0 +1,45 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from leads.benchmark import find_regressions, run_benchmark
+from leads.models import User
+
+
+class Command(BaseCommand):
+  help = 'Time every leads and agents view and compare the results with a stored baseline'
+
+  def add_arguments(self, parser):
+    parser.add_argument('--user', default='seed-org0', help='Username to request the views as')
+    parser.add_argument('--iterations', type=int, default=20, help='Timed requests per view')
+    parser.add_argument('--warmup', type=int, default=2, help='Untimed requests per view')
+    parser.add_argument('--exclude', nargs='*', default=[], help='View names to skip, e.g. leads:lead-export')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    parser.add_argument('--baseline', help='Fail if a view regressed compared to this JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed p95 slowdown, 0.25 = 25%%')
+
+  def handle(self, *args, **options):
+    try:
+      user = User.objects.get(username=options['user'])
+    except User.DoesNotExist:
+      raise CommandError(f'No user "{options["user"]}", see `manage.py seed_crm`')
+
+    def on_result(view_name, result):
+      self.stdout.write(
+        f'{view_name:32} {result["status"]} {result["queries"]:>4} queries  '
+        f'p50 {result["p50_ms"]:>9.2f}ms  p95 {result["p95_ms"]:>9.2f}ms  p99 {result["p99_ms"]:>9.2f}ms'
+      )
+
+    results = run_benchmark(
+      user, iterations=options['iterations'], warmup=options['warmup'],
+      exclude=options['exclude'], on_result=on_result
+    )
+    if options['output']:
+      with open(options['output'], 'w') as f:
+        json.dump(results, f, indent=2)
+
+    if options['baseline']:
+      with open(options['baseline']) as f:
+        baseline = json.load(f)
+      regressions = find_regressions(results, baseline, tolerance=options['tolerance'])
+      if regressions:
+        raise CommandError('Regressions:\n' + '\n'.join(regressions))
+      self.stdout.write(self.style.SUCCESS('No regressions'))
@@ -0,0 +1,24 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from djcrm.boot import pending_migrations, save_static_hash, static_is_current, static_sources_hash
+
+
+class Command(BaseCommand):
+  help = 'Collect static files and migrate, skipping whichever has nothing to do'
+
+  def add_arguments(self, parser):
+    parser.add_argument('--force', action='store_true', help='Run collectstatic and migrate unconditionally')
+
+  def handle(self, *args, **options):
+    verbosity = options['verbosity']
+    digest = static_sources_hash()
+    if options['force'] or not static_is_current(digest):
+      call_command('collectstatic', interactive=False, verbosity=verbosity)
+      save_static_hash(digest)
+    else:
+      self.stdout.write('Static files unchanged, skipping collectstatic')
+
+    if options['force'] or pending_migrations():
+      call_command('migrate', interactive=False, verbosity=verbosity)
+    else:
+      self.stdout.write('No pending migrations, skipping migrate')
@@ -0,0 +1,48 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from leads.benchmark import run_load, session_cookie
+from leads.models import User
+
+
+class Command(BaseCommand):
+  help = 'Compare the throughput of running servers, e.g. the WSGI and ASGI deployments of runserver.sh'
+
+  def add_arguments(self, parser):
+    parser.add_argument(
+      'targets', nargs='+', metavar='NAME=URL',
+      help='Servers to compare, e.g. wsgi=http://127.0.0.1:8000 asgi=http://127.0.0.1:8001'
+    )
+    parser.add_argument('--path', action='append', help='Paths to request, the lead and category pages by default')
+    parser.add_argument('--user', default='seed-org0', help='Username to log in as, see `manage.py seed_crm`')
+    parser.add_argument('--concurrency', type=int, default=50, help='Simultaneous clients')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds per server and path')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+
+  def handle(self, *args, **options):
+    targets = []
+    for target in options['targets']:
+      name, _, url = target.partition('=')
+      if not url:
+        raise CommandError(f'Expected NAME=URL, got "{target}"')
+      targets.append((name, url.rstrip('/')))
+    try:
+      user = User.objects.get(username=options['user'])
+    except User.DoesNotExist:
+      raise CommandError(f'No user "{options["user"]}"')
+
+    # Both servers must share this database and session store
+    headers = {'Cookie': session_cookie(user), 'X-Forwarded-Proto': 'https'}
+    paths = options['path'] or ['/leads/', '/leads/categories/']
+    results = {}
+    for path in paths:
+      for name, url in targets:
+        result = run_load(url + path, headers, options['concurrency'], options['duration'])
+        results.setdefault(path, {})[name] = result
+        self.stdout.write(
+          f'{path:24} {name:8} {result["rps"]:>8.1f} req/s  '
+          f'p50 {result.get("p50_ms", 0):>8.2f}ms  p99 {result.get("p99_ms", 0):>8.2f}ms  '
+          f'{result["errors"]} error(s)'
+        )
+    if options['output']:
+      with open(options['output'], 'w') as f:
+        json.dump(results, f, indent=2)
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from leads.outbox import OutboxWorker
+
+
+class Command(BaseCommand):
+  help = 'Send queued emails from the outbox'
+
+  def add_arguments(self, parser):
+    parser.add_argument('--batch-size', type=int, help='Messages claimed per batch')
+    parser.add_argument('--forever', action='store_true', help='Keep polling for new mail')
+    parser.add_argument('--interval', type=float, help='Seconds between polls with --forever')
+
+  def handle(self, *args, **options):
+    worker = OutboxWorker(batch_size=options['batch_size'])
+    try:
+      sent, failed = worker.run(poll_interval=options['interval'], forever=options['forever'])
+    except KeyboardInterrupt:
+      return
+    self.stdout.write(self.style.SUCCESS(f'Sent {sent} email(s), {failed} failed'))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from leads.assignment import STRATEGIES, distribute_backlog
+from leads.models import UserProfile
+
+
+class Command(BaseCommand):
+  help = 'Assign unassigned leads to agents'
+
+  def add_arguments(self, parser):
+    parser.add_argument('--organization', help='Username of a single organization')
+    parser.add_argument(
+      '--strategy', choices=list(STRATEGIES),
+      help="Defaults to each organization's own strategy; organizations without one are skipped"
+    )
+    parser.add_argument('--batch-size', type=int, default=500)
+
+  def handle(self, *args, **options):
+    organizations = UserProfile.objects.select_related('user').order_by('pk')
+    if options['organization']:
+      organizations = organizations.filter(user__username=options['organization'])
+    elif not options['strategy']:
+      organizations = organizations.exclude(assignment_strategy='')
+
+    for organization in organizations.iterator():
+      count = distribute_backlog(organization, options['strategy'], batch_size=options['batch_size'])
+      if count:
+        self.stdout.write(f'{organization}: assigned {count} lead(s)')
+    self.stdout.write(self.style.SUCCESS('Done'))
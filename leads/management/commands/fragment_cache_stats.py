@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from leads.caching import clear_fragment_cache_stats, fragment_cache_stats
+
+
+class Command(BaseCommand):
+  help = 'Show template fragment cache hits and misses'
+
+  def add_arguments(self, parser):
+    parser.add_argument('--clear', action='store_true', help='Reset the counters after printing them')
+
+  def handle(self, *args, **options):
+    for name, (hits, misses) in fragment_cache_stats().items():
+      total = hits + misses
+      ratio = hits / total if total else 0
+      self.stdout.write(f'{name}: {hits} hits, {misses} misses ({ratio:.0%} hit rate)')
+    if options['clear']:
+      clear_fragment_cache_stats()
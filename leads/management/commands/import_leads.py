@@ -0,0 +1,52 @@
+import csv
+import sys
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from leads.importer import FORMATS, LeadImporter, guess_format, read_rows
+from leads.models import UserProfile
+
+
+class Command(BaseCommand):
+  help = 'Stream leads from a CSV or JSON Lines file into an organization'
+
+  def add_arguments(self, parser):
+    parser.add_argument('path', help='File to import, or - for stdin')
+    parser.add_argument('--organization', required=True, help='Username of the organizer')
+    parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension')
+    parser.add_argument('--batch-size', type=int, default=settings.LEAD_IMPORT_BATCH_SIZE)
+    parser.add_argument('--errors', help='Write rejected rows to this CSV file (line, error)')
+    parser.add_argument('--skip-duplicates', action='store_true', help='Reject rows that match an existing lead')
+
+  def handle(self, *args, **options):
+    try:
+      organization = UserProfile.objects.get(user__username=options['organization'])
+    except UserProfile.DoesNotExist:
+      raise CommandError(f'No organization for user "{options["organization"]}"')
+
+    path = options['path']
+    format = options['format'] or guess_format(path)
+    error_file = open(options['errors'], 'w', newline='') if options['errors'] else None
+    error_writer = csv.writer(error_file) if error_file else None
+    if error_writer:
+      error_writer.writerow(['line', 'error'])
+
+    def on_error(line_number, message):
+      if error_writer:
+        error_writer.writerow([line_number, message])
+      else:
+        self.stderr.write(f'line {line_number}: {message}')
+
+    stream = sys.stdin if path == '-' else open(path, encoding='utf-8-sig', newline='')
+    try:
+      importer = LeadImporter(
+        organization, batch_size=options['batch_size'], on_error=on_error, max_errors=0,
+        skip_duplicates=options['skip_duplicates']
+      )
+      result = importer.run(read_rows(stream, format))
+    finally:
+      if stream is not sys.stdin:
+        stream.close()
+      if error_file:
+        error_file.close()
+
+    self.stdout.write(self.style.SUCCESS(f'Imported {result.created} lead(s), rejected {result.failed} row(s)'))
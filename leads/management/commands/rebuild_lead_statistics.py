@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from leads.models import UserProfile
+from leads.stats import find_drift, rebuild_lead_statistics
+
+
+class Command(BaseCommand):
+  help = 'Recompute the lead statistics table from scratch and report any drift'
+
+  def add_arguments(self, parser):
+    parser.add_argument('--organization', help='Username of a single organization to rebuild')
+    parser.add_argument(
+      '--check', action='store_true',
+      help='Only report drift, exiting with an error if any is found'
+    )
+
+  def handle(self, *args, **options):
+    organizations = UserProfile.objects.select_related('user').order_by('pk')
+    if options['organization']:
+      organizations = organizations.filter(user__username=options['organization'])
+
+    drifted = 0
+    for organization in organizations.iterator():
+      drift = find_drift(organization)
+      for (_, dimension, key), stored, actual in drift:
+        self.stdout.write(f'{organization}: {dimension} {key or "none"} stored {stored}, actual {actual}')
+      if drift:
+        drifted += 1
+        if not options['check']:
+          rebuild_lead_statistics(organization)
+
+    if options['check'] and drifted:
+      raise CommandError(f'Lead statistics drifted for {drifted} organization(s)')
+    self.stdout.write(self.style.SUCCESS(
+      f'{drifted} organization(s) drifted' + ('' if options['check'] else ', rebuilt')
+    ))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from leads.models import UserProfile
+from leads.rollups import refresh_rollups
+
+
+class Command(BaseCommand):
+  help = 'Recount the daily lead rollups of the days with writes since the last refresh'
+
+  def add_arguments(self, parser):
+    parser.add_argument('--full', action='store_true', help='Recount every day instead of the changed ones')
+
+  def handle(self, *args, **options):
+    def report(organization_id, days):
+      if days:
+        self.stdout.write(f'Organization {organization_id}: {days} day(s) recounted')
+
+    organization_ids = UserProfile.objects.order_by('pk').values_list('pk', flat=True)
+    total = refresh_rollups(organization_ids, full=options['full'], on_organization=report)
+    self.stdout.write(self.style.SUCCESS(f'Recounted {total} day(s)'))
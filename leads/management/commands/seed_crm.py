@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from leads.models import User
+from leads.seed import CRMSeeder
+
+
+class Command(BaseCommand):
+  help = 'Generate organizations, agents, categories and leads for load testing'
+
+  def add_arguments(self, parser):
+    parser.add_argument('--leads', type=int, default=10000, help='Leads in total, spread over the organizations')
+    parser.add_argument('--organizations', type=int, default=1)
+    parser.add_argument('--agents', type=int, default=10, help='Agents per organization')
+    parser.add_argument('--categories', type=int, default=6, help='Categories per organization')
+    parser.add_argument('--days', type=int, default=365, help='Spread date_added over this many days')
+    parser.add_argument('--prefix', default='seed', help='Prefix of the generated usernames')
+    parser.add_argument('--password', help='Password of every generated user, unusable by default')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    parser.add_argument('--batch-size', type=int, default=5000)
+
+  def handle(self, *args, **options):
+    prefix = options['prefix']
+    if User.objects.filter(username__startswith=f'{prefix}-org').exists():
+      raise CommandError(f'Users prefixed "{prefix}-org" already exist, choose another --prefix')
+
+    seeder = CRMSeeder(
+      prefix=prefix, seed=options['seed'], batch_size=options['batch_size'],
+      password=options['password'], days=options['days'], stdout=self.stdout
+    )
+    count = seeder.run(
+      organizations=options['organizations'], agents=options['agents'],
+      categories=options['categories'], leads=options['leads']
+    )
+    self.stdout.write(self.style.SUCCESS(f'Created {count} lead(s)'))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from leads.dedup import reindex, sweep
+from leads.models import UserProfile
+
+
+class Command(BaseCommand):
+  help = 'Find likely duplicate leads, comparing only leads that share a blocking key'
+
+  def add_arguments(self, parser):
+    parser.add_argument('--organization', help='Username of a single organization')
+    parser.add_argument(
+      '--reindex', action='store_true', help='Rebuild the blocking keys first, e.g. after changing DEDUP_* settings'
+    )
+
+  def handle(self, *args, **options):
+    organizations = UserProfile.objects.select_related('user').order_by('pk')
+    if options['organization']:
+      organizations = organizations.filter(user__username=options['organization'])
+
+    total = 0
+    for organization in organizations:
+      if options['reindex']:
+        reindex(organization)
+      pairs = sweep(organization)
+      total += len(pairs)
+      if pairs:
+        self.stdout.write(f'{organization}: {len(pairs)} likely duplicate pair(s)')
+    self.stdout.write(self.style.SUCCESS(f'Found {total} likely duplicate pair(s)'))
@@ -0,0 +1,28 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.utils.functional import SimpleLazyObject
+from .activity import acting_request
+from .tenancy import get_tenant
+
+
+class TenantMiddleware:
+  """Set request.tenant, resolved on first use, and make request.user the actor of lead activity"""
+  sync_capable = True
+  async_capable = True
+
+  def __init__(self, get_response):
+    self.get_response = get_response
+    if iscoroutinefunction(get_response):
+      markcoroutinefunction(self)
+
+  def __call__(self, request):
+    if iscoroutinefunction(self):
+      return self.__acall__(request)
+    request.tenant = SimpleLazyObject(lambda: get_tenant(request.user))
+    with acting_request(request):
+      return self.get_response(request)
+
+  async def __acall__(self, request):
+    request.tenant = SimpleLazyObject(lambda: get_tenant(request.user))
+    # Sync code run with sync_to_async() sees a copy of this context
+    with acting_request(request):
+      return await self.get_response(request)
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.14 on 2026-10-18 18:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def count_existing_leads(apps, schema_editor):
+    Lead = apps.get_model('leads', 'Lead')
+    LeadStatistic = apps.get_model('leads', 'LeadStatistic')
+    leads = Lead.objects.order_by()
+    statistics = []
+    for dimension, field in (('agent', 'agent'), ('category', 'category')):
+        for organization_id, key, lead_count in leads.values_list('organization', field).annotate(models.Count('id')):
+            statistics.append(LeadStatistic(
+                organization_id=organization_id, dimension=dimension, key=key or 0, lead_count=lead_count
+            ))
+    LeadStatistic.objects.bulk_create(statistics)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0010_auto_20210908_1942'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeadStatistic',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('agent', 'Agent'), ('category', 'Category')], max_length=10)),
+                ('key', models.BigIntegerField(default=0)),
+                ('lead_count', models.IntegerField(default=0)),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='leads.userprofile')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='leadstatistic',
+            constraint=models.UniqueConstraint(fields=('organization', 'dimension', 'key'), name='unique_lead_statistic'),
+        ),
+        migrations.RunPython(count_existing_leads, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.14 on 2026-10-18 18:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0011_leadstatistic'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['organization', 'agent', 'date_added'], name='lead_org_agent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['organization', 'category'], name='lead_org_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['organization', 'date_added', 'id'], name='lead_org_date_added_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(condition=models.Q(('agent__isnull', True)), fields=['organization', 'date_added', 'id'], name='lead_org_unassigned_idx'),
+        ),
+    ]
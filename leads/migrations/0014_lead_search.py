@@ -0,0 +1,64 @@
+from django.db import migrations
+
+
+POSTGRES_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    ALTER TABLE leads_lead ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', first_name || ' ' || last_name), 'A') ||
+        setweight(to_tsvector('simple', email || ' ' || phone_number), 'B') ||
+        setweight(to_tsvector('simple', description), 'C')
+    ) STORED
+    """,
+    "CREATE INDEX lead_search_vector_idx ON leads_lead USING GIN (search_vector)",
+    """
+    CREATE INDEX lead_search_trgm_idx ON leads_lead USING GIN (
+        (first_name || ' ' || last_name || ' ' || email || ' ' || phone_number) gin_trgm_ops
+    )
+    """,
+]
+
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS lead_search_trgm_idx",
+    "DROP INDEX IF EXISTS lead_search_vector_idx",
+    "ALTER TABLE leads_lead DROP COLUMN IF EXISTS search_vector",
+]
+
+# The triggers keeping this table in sync are installed by leads.search.install_sqlite_triggers
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE leads_lead_fts USING fts5(
+        first_name, last_name, email, phone_number, description,
+        content='leads_lead', content_rowid='id'
+    )
+    """,
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS leads_lead_fts_insert",
+    "DROP TRIGGER IF EXISTS leads_lead_fts_delete",
+    "DROP TRIGGER IF EXISTS leads_lead_fts_update",
+    "DROP TABLE IF EXISTS leads_lead_fts",
+]
+
+
+def run_for_vendor(postgres, sqlite):
+    def run(apps, schema_editor):
+        statements = {'postgresql': postgres, 'sqlite': sqlite}.get(schema_editor.connection.vendor, [])
+        for sql in statements:
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0013_outboxemail'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_for_vendor(POSTGRES_FORWARD, SQLITE_FORWARD),
+            run_for_vendor(POSTGRES_BACKWARD, SQLITE_BACKWARD),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.14 on 2026-10-18 18:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0014_lead_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='agent',
+            name='categories',
+            field=models.ManyToManyField(blank=True, related_name='specialists', to='leads.category'),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='assignment_strategy',
+            field=models.CharField(blank=True, choices=[('', 'Assign leads by hand'), ('round_robin', 'Round robin'), ('least_loaded', 'Agent with the fewest leads'), ('category_affinity', 'Least loaded agent specialized in the category')], max_length=20),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='round_robin_position',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
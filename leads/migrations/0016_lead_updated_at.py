@@ -0,0 +1,26 @@
+# Generated by Django 4.2.14 on 2026-10-18 19:09
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_updated_at(apps, schema_editor):
+    # Existing leads were last known to change when they were added
+    Lead = apps.get_model('leads', 'Lead')
+    Lead.objects.update(updated_at=F('date_added'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0015_lead_assignment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lead',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.14 on 2026-10-18 19:11
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0016_lead_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeadActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(choices=[('updated', 'Updated'), ('assigned', 'Assigned'), ('categorized', 'Categorized'), ('deleted', 'Deleted')], max_length=12)),
+                ('changes', models.JSONField(default=dict)),
+                ('timestamp', models.DateTimeField(default=django.utils.timezone.now)),
+                ('actor', models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('lead', models.ForeignKey(db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='activities', to='leads.lead')),
+                ('organization', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='leads.userprofile')),
+            ],
+            options={
+                'verbose_name_plural': 'lead activities',
+                'indexes': [models.Index(fields=['organization', 'timestamp', 'id'], name='activity_org_time_idx'), models.Index(fields=['lead', 'timestamp', 'id'], name='activity_lead_time_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.14 on 2026-10-18 19:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0017_lead_activity'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='leadactivity',
+            name='action',
+            field=models.CharField(choices=[('updated', 'Updated'), ('assigned', 'Assigned'), ('categorized', 'Categorized'), ('deleted', 'Deleted'), ('archived', 'Archived'), ('restored', 'Restored')], max_length=12),
+        ),
+        migrations.CreateModel(
+            name='ArchivedLead',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('first_name', models.CharField(max_length=20)),
+                ('last_name', models.CharField(max_length=20)),
+                ('age', models.PositiveIntegerField(default=0)),
+                ('description', models.TextField()),
+                ('date_added', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('phone_number', models.CharField(max_length=20)),
+                ('email', models.EmailField(max_length=254)),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('agent', models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='leads.agent')),
+                ('category', models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='leads.category')),
+                ('organization', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='leads.userprofile')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['organization', 'date_added', 'id'], name='archived_lead_org_idx')],
+            },
+        ),
+    ]
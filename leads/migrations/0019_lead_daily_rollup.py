@@ -0,0 +1,44 @@
+# Generated by Django 4.2.14 on 2026-10-18 19:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0018_archived_lead'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeadDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('agent', 'Agent'), ('category', 'Category')], max_length=10)),
+                ('day', models.DateField()),
+                ('key', models.BigIntegerField(default=0)),
+                ('lead_count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('value', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['organization', 'updated_at'], name='lead_org_updated_idx'),
+        ),
+        migrations.AddField(
+            model_name='leaddailyrollup',
+            name='organization',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='leads.userprofile'),
+        ),
+        migrations.AddConstraint(
+            model_name='leaddailyrollup',
+            constraint=models.UniqueConstraint(fields=('organization', 'dimension', 'day', 'key'), name='unique_lead_daily_rollup'),
+        ),
+    ]
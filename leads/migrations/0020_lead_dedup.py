@@ -0,0 +1,47 @@
+# Generated by Django 4.2.14 on 2026-10-18 19:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0019_lead_daily_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeadBlockingKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100)),
+                ('lead', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='blocking_keys', to='leads.lead')),
+                ('organization', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='leads.userprofile')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DuplicateLeadPair',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('found_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('duplicate', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='leads.lead')),
+                ('lead', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='leads.lead')),
+                ('organization', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='leads.userprofile')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='leadblockingkey',
+            constraint=models.UniqueConstraint(fields=('organization', 'key', 'lead'), name='unique_lead_blocking_key'),
+        ),
+        migrations.AddIndex(
+            model_name='duplicateleadpair',
+            index=models.Index(fields=['organization', '-score', 'id'], name='duplicate_pair_org_score_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='duplicateleadpair',
+            constraint=models.UniqueConstraint(fields=('lead', 'duplicate'), name='unique_duplicate_lead_pair'),
+        ),
+    ]
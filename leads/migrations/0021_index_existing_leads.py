@@ -0,0 +1,32 @@
+from django.db import migrations
+
+
+def index_existing_leads(apps, schema_editor):
+    from leads.dedup import COMPARED_FIELDS, blocking_keys
+
+    Lead = apps.get_model('leads', 'Lead')
+    LeadBlockingKey = apps.get_model('leads', 'LeadBlockingKey')
+    leads = Lead.objects.only(*COMPARED_FIELDS).order_by('pk')
+    last_pk = 0
+    while True:
+        chunk = list(leads.filter(pk__gt=last_pk)[:5000])
+        if not chunk:
+            return
+        # Leads saved since 0020 are indexed already
+        LeadBlockingKey.objects.bulk_create([
+            LeadBlockingKey(organization_id=lead.organization_id, lead_id=lead.pk, key=key)
+            for lead in chunk
+            for key in blocking_keys(lead)
+        ], ignore_conflicts=True)
+        last_pk = chunk[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0020_lead_dedup'),
+    ]
+
+    operations = [
+        migrations.RunPython(index_existing_leads, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,13 @@
 from io import TextIOWrapper
-from django.db import models
-from django.db.models.signals import post_save
+from collections import Counter
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.signals import post_save, pre_save, post_delete, pre_delete
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
+from .activity import TRACKED_FIELDS, changes_between, current_actor_id, tracked_values
+from .caching import bump_organization_version, invalidate_cached_user
+from .tenancy import get_tenant
 
 
 class User(AbstractUser):
@@ -10,12 +16,47 @@ class User(AbstractUser):
 
 
 class UserProfile(models.Model):
+  ROUND_ROBIN = 'round_robin'
+  LEAST_LOADED = 'least_loaded'
+  CATEGORY_AFFINITY = 'category_affinity'
+  ASSIGNMENT_STRATEGY_CHOICES = (
+    ('', 'Assign leads by hand'),
+    (ROUND_ROBIN, 'Round robin'),
+    (LEAST_LOADED, 'Agent with the fewest leads'),
+    (CATEGORY_AFFINITY, 'Least loaded agent specialized in the category'),
+  )
+
   user = models.OneToOneField(User, on_delete=models.CASCADE)
+  # How new and unassigned leads are distributed to agents, see leads.assignment
+  assignment_strategy = models.CharField(max_length=20, choices=ASSIGNMENT_STRATEGY_CHOICES, blank=True)
+  round_robin_position = models.PositiveIntegerField(default=0)
 
   def __str__(self):
     return self.user.username
 
 
+class LeadQuerySet(models.QuerySet):
+
+  def for_user(self, user):
+    """Leads of the user's organization, narrowed to their own leads for agents"""
+    tenant = get_tenant(user)
+    if tenant.organization is None:
+      return self.none()
+    queryset = self.filter(organization=tenant.organization)
+    if tenant.is_agent:
+      queryset = queryset.filter(agent=tenant.agent)
+    return queryset
+
+
+class OrganizationQuerySet(models.QuerySet):
+
+  def for_user(self, user):
+    tenant = get_tenant(user)
+    if tenant.organization is None:
+      return self.none()
+    return self.filter(organization=tenant.organization)
+
+
 class Lead(models.Model):
   first_name = models.CharField(max_length=20)
   last_name = models.CharField(max_length=20)
@@ -25,9 +66,73 @@ class Lead(models.Model):
   category = models.ForeignKey("Category", related_name="Leads" , null=True, blank=True, on_delete=models.SET_NULL)
   description = models.TextField()
   date_added = models.DateTimeField(auto_now_add=True)
+  # Set by save(), bulk writes must set it themselves
+  updated_at = models.DateTimeField(auto_now=True)
   phone_number = models.CharField(max_length=20)
   email = models.EmailField()
 
+  objects = LeadQuerySet.as_manager()
+
+  class Meta:
+    # Every lead query is scoped to an organization first
+    indexes = [
+      models.Index(fields=['organization', 'agent', 'date_added'], name='lead_org_agent_idx'),
+      models.Index(fields=['organization', 'category'], name='lead_org_category_idx'),
+      models.Index(fields=['organization', 'date_added', 'id'], name='lead_org_date_added_idx'),
+      models.Index(
+        fields=['organization', 'date_added', 'id'],
+        condition=models.Q(agent__isnull=True),
+        name='lead_org_unassigned_idx'
+      ),
+      # Finds what changed since the last rollup refresh
+      models.Index(fields=['organization', 'updated_at'], name='lead_org_updated_idx'),
+    ]
+
+  def __str__(self):
+    return f"{self.first_name} {self.last_name}"
+
+  def save(self, *args, **kwargs):
+    # Keep the lead and its statistics in the same transaction
+    with transaction.atomic():
+      super(Lead, self).save(*args, **kwargs)
+
+  def statistic_keys(self):
+    return LeadStatistic.keys_for(self.organization_id, self.agent_id, self.category_id)
+
+
+class ArchivedLead(models.Model):
+  """
+  Cold storage for stale leads, moved here by leads.archive so that the lead
+  table and its indexes only hold active work. Keeps the lead's id, so that
+  its activity history still applies and a restore puts it back unchanged.
+  """
+  id = models.BigIntegerField(primary_key=True)
+  organization = models.ForeignKey(UserProfile, on_delete=models.CASCADE, db_index=False)
+  # Agents and categories may be deleted while the lead is archived, checked on restore
+  agent = models.ForeignKey(
+    'Agent', null=True, blank=True, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, related_name='+'
+  )
+  category = models.ForeignKey(
+    'Category', null=True, blank=True, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False,
+    related_name='+'
+  )
+  first_name = models.CharField(max_length=20)
+  last_name = models.CharField(max_length=20)
+  age = models.PositiveIntegerField(default=0)
+  description = models.TextField()
+  date_added = models.DateTimeField()
+  updated_at = models.DateTimeField()
+  phone_number = models.CharField(max_length=20)
+  email = models.EmailField()
+  archived_at = models.DateTimeField(default=timezone.now)
+
+  objects = LeadQuerySet.as_manager()
+
+  class Meta:
+    indexes = [
+      models.Index(fields=['organization', 'date_added', 'id'], name='archived_lead_org_idx'),
+    ]
+
   def __str__(self):
     return f"{self.first_name} {self.last_name}"
 
@@ -35,6 +140,10 @@ class Lead(models.Model):
 class Agent(models.Model):
   user = models.OneToOneField(User, on_delete=models.CASCADE)
   organization = models.ForeignKey(UserProfile, on_delete=models.CASCADE)
+  # Categories preferred by the category affinity assignment strategy
+  categories = models.ManyToManyField('Category', blank=True, related_name='specialists')
+
+  objects = OrganizationQuerySet.as_manager()
 
   def __str__(self):
     return self.user.email
@@ -44,13 +153,352 @@ class Category(models.Model):
   name = models.CharField(max_length=30)
   organization = models.ForeignKey(UserProfile, on_delete=models.CASCADE)
 
+  objects = OrganizationQuerySet.as_manager()
+
   def __str__(self):
     return self.name
 
 
+class LeadStatisticManager(models.Manager):
+
+  def apply_deltas(self, deltas):
+    """Add a Counter of {(organization_id, dimension, key): change} to the stored counts"""
+    # Sorted so that concurrent writers lock rows in the same order
+    for (organization_id, dimension, key), delta in sorted(deltas.items()):
+      if not delta:
+        continue
+      lookup = {'organization_id': organization_id, 'dimension': dimension, 'key': key}
+      if not self.filter(**lookup).update(lead_count=F('lead_count') + delta):
+        self.bulk_create([self.model(**lookup)], ignore_conflicts=True)
+        self.filter(**lookup).update(lead_count=F('lead_count') + delta)
+
+  def record_leads(self, leads, sign=1):
+    """Count (or with sign=-1, uncount) leads written without going through Lead.save()"""
+    deltas = Counter()
+    for lead in leads:
+      for key in lead.statistic_keys():
+        deltas[key] += sign
+    self.apply_deltas(deltas)
+
+  def counts(self, organization, dimension):
+    return dict(self.filter(organization=organization, dimension=dimension).values_list('key', 'lead_count'))
+
+  async def acounts(self, organization, dimension):
+    queryset = self.filter(organization=organization, dimension=dimension).values_list('key', 'lead_count')
+    # Not aiterator(), which runs values_list() queries synchronously in Django 4.2
+    return {key: count async for key, count in queryset}
+
+
+class LeadStatistic(models.Model):
+  """Denormalized lead counts per organization, by agent or by category"""
+  AGENT = 'agent'
+  CATEGORY = 'category'
+  DIMENSION_CHOICES = (
+    (AGENT, 'Agent'),
+    (CATEGORY, 'Category'),
+  )
+  # key used for leads without an agent or category
+  NONE = 0
+
+  organization = models.ForeignKey(UserProfile, on_delete=models.CASCADE)
+  dimension = models.CharField(max_length=10, choices=DIMENSION_CHOICES)
+  key = models.BigIntegerField(default=NONE)
+  lead_count = models.IntegerField(default=0)
+
+  objects = LeadStatisticManager()
+
+  class Meta:
+    constraints = [
+      models.UniqueConstraint(fields=['organization', 'dimension', 'key'], name='unique_lead_statistic'),
+    ]
+
+  def __str__(self):
+    return f"{self.organization} {self.dimension} {self.key}: {self.lead_count}"
+
+  @classmethod
+  def keys_for(cls, organization_id, agent_id, category_id):
+    return (
+      (organization_id, cls.AGENT, agent_id or cls.NONE),
+      (organization_id, cls.CATEGORY, category_id or cls.NONE),
+    )
+
+
+class LeadBlockingKey(models.Model):
+  """Normalized email, phone and name keys of a lead, see leads.dedup"""
+  organization = models.ForeignKey(UserProfile, on_delete=models.CASCADE, db_index=False)
+  lead = models.ForeignKey(Lead, on_delete=models.CASCADE, related_name='blocking_keys')
+  key = models.CharField(max_length=100)
+
+  class Meta:
+    constraints = [
+      # Leads sharing a key form a block, looked up and grouped through this index
+      models.UniqueConstraint(fields=['organization', 'key', 'lead'], name='unique_lead_blocking_key'),
+    ]
+
+  def __str__(self):
+    return f"{self.lead_id}: {self.key}"
+
+
+class DuplicateLeadPair(models.Model):
+  """Likely duplicates found by the dedup sweep, lead being the older of the two"""
+  organization = models.ForeignKey(UserProfile, on_delete=models.CASCADE, db_index=False)
+  lead = models.ForeignKey(Lead, on_delete=models.CASCADE, related_name='+')
+  duplicate = models.ForeignKey(Lead, on_delete=models.CASCADE, related_name='+')
+  score = models.FloatField()
+  found_at = models.DateTimeField(default=timezone.now)
+
+  class Meta:
+    constraints = [
+      models.UniqueConstraint(fields=['lead', 'duplicate'], name='unique_duplicate_lead_pair'),
+    ]
+    indexes = [
+      models.Index(fields=['organization', '-score', 'id'], name='duplicate_pair_org_score_idx'),
+    ]
+
+  def __str__(self):
+    return f"{self.lead_id} ~ {self.duplicate_id} ({self.score:.2f})"
+
+
+class LeadDailyRollup(models.Model):
+  """Leads added per organization, day and agent or category, kept by leads.rollups"""
+  organization = models.ForeignKey(UserProfile, on_delete=models.CASCADE, db_index=False)
+  dimension = models.CharField(max_length=10, choices=LeadStatistic.DIMENSION_CHOICES)
+  day = models.DateField()
+  key = models.BigIntegerField(default=LeadStatistic.NONE)
+  lead_count = models.IntegerField(default=0)
+
+  class Meta:
+    constraints = [
+      # Also the index of the dashboard's date range queries
+      models.UniqueConstraint(fields=['organization', 'dimension', 'day', 'key'], name='unique_lead_daily_rollup'),
+    ]
+
+  def __str__(self):
+    return f"{self.organization} {self.day} {self.dimension} {self.key}: {self.lead_count}"
+
+
+class RollupWatermark(models.Model):
+  """How far a rollup has been refreshed, leads changed before `value` are counted"""
+  name = models.CharField(max_length=50, primary_key=True)
+  value = models.DateTimeField()
+
+  def __str__(self):
+    return f"{self.name}: {self.value}"
+
+
+class OutboxEmail(models.Model):
+  """Mail written in the same transaction as the change it announces, delivered by deliver_outbox"""
+  PENDING = 'pending'
+  SENT = 'sent'
+  DEAD = 'dead'
+  STATUS_CHOICES = (
+    (PENDING, 'Pending'),
+    (SENT, 'Sent'),
+    (DEAD, 'Dead'),
+  )
+
+  subject = models.CharField(max_length=255)
+  body = models.TextField()
+  html_body = models.TextField(blank=True)
+  from_email = models.CharField(max_length=254)
+  recipients = models.JSONField(default=list)
+  status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+  attempts = models.PositiveIntegerField(default=0)
+  next_attempt_at = models.DateTimeField(default=timezone.now)
+  last_error = models.TextField(blank=True)
+  created_at = models.DateTimeField(auto_now_add=True)
+  sent_at = models.DateTimeField(null=True, blank=True)
+
+  class Meta:
+    indexes = [
+      models.Index(
+        fields=['next_attempt_at', 'id'],
+        condition=models.Q(status='pending'),
+        name='outbox_pending_idx'
+      ),
+    ]
+
+  def __str__(self):
+    return f"{self.subject} ({self.status})"
+
+
+class LeadActivityManager(models.Manager):
+
+  def record(self, organization_id, changes, action=None):
+    """Append {lead_id: {field: [old, new]}} for the current actor, in one insert"""
+    actor_id = current_actor_id()
+    now = timezone.now()
+    return self.bulk_create([
+      self.model(
+        organization_id=organization_id, lead_id=lead_id, actor_id=actor_id,
+        action=action or self.model.action_for(lead_changes), changes=lead_changes, timestamp=now
+      )
+      for lead_id, lead_changes in changes.items() if lead_changes
+    ])
+
+
+class LeadActivity(models.Model):
+  """Append only history of lead changes, see leads.activity"""
+  UPDATED = 'updated'
+  ASSIGNED = 'assigned'
+  CATEGORIZED = 'categorized'
+  DELETED = 'deleted'
+  ARCHIVED = 'archived'
+  RESTORED = 'restored'
+  ACTION_CHOICES = (
+    (UPDATED, 'Updated'),
+    (ASSIGNED, 'Assigned'),
+    (CATEGORIZED, 'Categorized'),
+    (DELETED, 'Deleted'),
+    (ARCHIVED, 'Archived'),
+    (RESTORED, 'Restored'),
+  )
+
+  # No foreign key constraints or single column indexes: the history outlives
+  # deleted leads and users, deleting a lead never touches it, and every query
+  # goes through one of the composite indexes below
+  organization = models.ForeignKey(UserProfile, on_delete=models.CASCADE, db_index=False)
+  lead = models.ForeignKey(
+    Lead, null=True, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, related_name='activities'
+  )
+  actor = models.ForeignKey(
+    User, null=True, blank=True, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, related_name='+'
+  )
+  action = models.CharField(max_length=12, choices=ACTION_CHOICES)
+  changes = models.JSONField(default=dict)
+  timestamp = models.DateTimeField(default=timezone.now)
+
+  objects = LeadActivityManager()
+
+  class Meta:
+    verbose_name_plural = 'lead activities'
+    indexes = [
+      models.Index(fields=['organization', 'timestamp', 'id'], name='activity_org_time_idx'),
+      models.Index(fields=['lead', 'timestamp', 'id'], name='activity_lead_time_idx'),
+    ]
+
+  def __str__(self):
+    return f"Lead {self.lead_id} {self.action} at {self.timestamp}"
+
+  def save(self, *args, **kwargs):
+    if not self._state.adding:
+      raise ValueError('Lead activities are append only')
+    super(LeadActivity, self).save(*args, **kwargs)
+
+  @classmethod
+  def action_for(cls, changes):
+    if changes.keys() == {'agent'}:
+      return cls.ASSIGNED
+    if changes.keys() == {'category'}:
+      return cls.CATEGORIZED
+    return cls.UPDATED
+
+
 def post_user_created_signal(sender, instance, created, **kwargs):
   print(instance, created)
   if created:
     UserProfile.objects.create(user=instance)
 
 post_save.connect(post_user_created_signal, sender=User)
+
+
+def pre_lead_saved_signal(sender, instance, **kwargs):
+  # Read the stored row under lock so concurrent reassignments can't double count
+  previous = None
+  if instance.pk is not None:
+    queryset = Lead.objects.select_for_update().filter(pk=instance.pk)
+    previous = queryset.values('organization_id', *TRACKED_FIELDS).first()
+  instance._previous_values = previous
+  instance._previous_statistic_keys = LeadStatistic.keys_for(
+    previous['organization_id'], previous['agent_id'], previous['category_id']
+  ) if previous else ()
+
+
+def post_lead_saved_signal(sender, instance, created, **kwargs):
+  deltas = Counter()
+  for key in getattr(instance, '_previous_statistic_keys', ()):
+    deltas[key] -= 1
+  for key in instance.statistic_keys():
+    deltas[key] += 1
+  LeadStatistic.objects.apply_deltas(deltas)
+  previous = getattr(instance, '_previous_values', None)
+  changes = changes_between(previous, tracked_values(instance)) if previous else {}
+  if changes:
+    LeadActivity.objects.record(instance.organization_id, {instance.pk: changes})
+  from .dedup import IDENTITY_FIELDS, index_leads
+  if created or changes.keys() & IDENTITY_FIELDS:
+    index_leads([instance], replace=not created)
+
+
+def is_organization_deletion(origin, organization_id):
+  """
+  Whether `origin`, the instance or queryset whose delete() started the
+  cascade, deletes the organization itself rather than, e.g., an agent's user.
+  """
+  model = getattr(origin, 'model', type(origin))
+  if model not in (User, UserProfile):
+    return False
+  # Signals run once per deleted row, so the answer is kept on the origin. The
+  # collector deletes leads and agents before profiles and users, which are
+  # still in the database here.
+  answers = origin.__dict__.setdefault('_deletes_organization', {})
+  if organization_id not in answers:
+    owners = origin if isinstance(origin, models.QuerySet) else [origin.pk]
+    lookup = 'user__in' if model is User else 'pk__in'
+    answers[organization_id] = UserProfile.objects.filter(pk=organization_id, **{lookup: owners}).exists()
+  return answers[organization_id]
+
+
+def post_lead_deleted_signal(sender, instance, origin=None, **kwargs):
+  # Statistics are deleted along with their organization
+  if is_organization_deletion(origin, instance.organization_id):
+    return
+  LeadStatistic.objects.record_leads([instance], sign=-1)
+  # Keeps the name, the lead row itself is gone, and the day it was added for the rollups
+  LeadActivity.objects.record(
+    instance.organization_id,
+    {instance.pk: {'name': [str(instance), None], 'date_added': [instance.date_added.isoformat(), None]}},
+    action=LeadActivity.DELETED
+  )
+
+
+def pre_agent_or_category_deleted_signal(sender, instance, origin=None, **kwargs):
+  if is_organization_deletion(origin, instance.organization_id):
+    return
+  # Deleting an agent or category nulls the FK on its leads without saving them,
+  # so fold its count into the "none" bucket here
+  dimension = LeadStatistic.AGENT if sender is Agent else LeadStatistic.CATEGORY
+  statistic = LeadStatistic.objects.filter(
+    organization_id=instance.organization_id, dimension=dimension, key=instance.pk
+  ).first()
+  if statistic:
+    LeadStatistic.objects.apply_deltas(Counter({
+      (instance.organization_id, dimension, LeadStatistic.NONE): statistic.lead_count
+    }))
+    statistic.delete()
+
+
+pre_save.connect(pre_lead_saved_signal, sender=Lead)
+post_save.connect(post_lead_saved_signal, sender=Lead)
+post_delete.connect(post_lead_deleted_signal, sender=Lead)
+pre_delete.connect(pre_agent_or_category_deleted_signal, sender=Agent)
+pre_delete.connect(pre_agent_or_category_deleted_signal, sender=Category)
+
+
+def organization_changed_signal(sender, instance, **kwargs):
+  # Invalidates the organization's cached template fragments
+  bump_organization_version(instance.organization_id)
+
+
+for model in (Lead, Category, Agent):
+  post_save.connect(organization_changed_signal, sender=model)
+  post_delete.connect(organization_changed_signal, sender=model)
+
+
+def cached_user_changed_signal(sender, instance, **kwargs):
+  invalidate_cached_user(instance.pk if sender is User else instance.user_id)
+
+
+for model in (User, UserProfile, Agent):
+  post_save.connect(cached_user_changed_signal, sender=model)
+  post_delete.connect(cached_user_changed_signal, sender=model)
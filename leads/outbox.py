@@ -0,0 +1,131 @@
+import logging
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from djcrm.metrics import OUTBOX_EMAILS
+from .models import OutboxEmail
+
+
+logger = logging.getLogger(__name__)
+
+
+def build_mail(subject, message, from_email, recipient_list, html_message=None):
+  """An unsaved outbox message, for writing many with bulk_create()"""
+  return OutboxEmail(
+    subject=subject,
+    body=message,
+    html_body=html_message or '',
+    from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+    recipients=list(recipient_list),
+  )
+
+
+def queue_mail(subject, message, from_email, recipient_list, html_message=None):
+  """Same arguments as send_mail(), but only writes the message to the outbox"""
+  email = build_mail(subject, message, from_email, recipient_list, html_message)
+  email.save()
+  return email
+
+
+class OutboxWorker:
+  """Drains the outbox in batches over one reused mail connection"""
+
+  def __init__(self, batch_size=None, max_attempts=None, retry_backoff=None, connection=None, lease=None):
+    self.batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+    self.lease = lease or settings.OUTBOX_LEASE
+    self.max_attempts = max_attempts or settings.OUTBOX_MAX_ATTEMPTS
+    self.retry_backoff = retry_backoff or settings.OUTBOX_RETRY_BACKOFF
+    self.connection = connection or get_connection()
+    self.is_open = False
+
+  def backoff(self, attempts):
+    # 1, 2, 4, 8... times the base delay, capped at a day
+    return timedelta(seconds=min(self.retry_backoff * 2 ** (attempts - 1), 24 * 60 * 60))
+
+  def send(self, email):
+    if not self.is_open:
+      self.connection.open()
+      self.is_open = True
+    message = EmailMultiAlternatives(
+      email.subject, email.body, email.from_email, email.recipients, connection=self.connection
+    )
+    if email.html_body:
+      message.attach_alternative(email.html_body, 'text/html')
+    message.send()
+
+  def close(self):
+    if self.is_open:
+      try:
+        self.connection.close()
+      finally:
+        self.is_open = False
+
+  def claim(self):
+    """Lease a batch of due messages to this worker, in a transaction that ends before sending"""
+    with transaction.atomic():
+      # skip_locked lets several workers drain the outbox side by side
+      emails = list(
+        OutboxEmail.objects.select_for_update(skip_locked=True)
+        .filter(status=OutboxEmail.PENDING, next_attempt_at__lte=timezone.now())
+        .order_by('next_attempt_at', 'id')[:self.batch_size]
+      )
+      # Not due again until the lease runs out, so a crashed worker's messages are retried
+      lease = timezone.now() + timedelta(seconds=self.lease)
+      OutboxEmail.objects.filter(pk__in=[email.pk for email in emails]).update(
+        attempts=F('attempts') + 1, next_attempt_at=lease
+      )
+    for email in emails:
+      email.attempts += 1
+      email.next_attempt_at = lease
+    return emails
+
+  def deliver_batch(self):
+    """Send one batch of due messages, returning (sent, failed)"""
+    sent = failed = 0
+    for email in self.claim():
+      try:
+        self.send(email)
+      except Exception as e:
+        # The connection may be unusable now, reopen it for the next message
+        self.close()
+        failed += 1
+        email.last_error = f'{type(e).__name__}: {e}'
+        if email.attempts >= self.max_attempts:
+          email.status = OutboxEmail.DEAD
+          logger.error('Outbox email %s dead after %s attempts: %s', email.pk, email.attempts, email.last_error)
+        else:
+          email.next_attempt_at = timezone.now() + self.backoff(email.attempts)
+      else:
+        sent += 1
+        email.status = OutboxEmail.SENT
+        email.sent_at = timezone.now()
+        email.last_error = ''
+      # Recorded right away, a crash only resends the message that was in flight
+      email.save(update_fields=['status', 'next_attempt_at', 'last_error', 'sent_at'])
+    if sent:
+      OUTBOX_EMAILS.inc(sent, outcome='sent')
+    if failed:
+      OUTBOX_EMAILS.inc(failed, outcome='failed')
+    return sent, failed
+
+  def run(self, poll_interval=None, forever=False):
+    """Deliver until the outbox is empty, or poll for new mail when forever is set"""
+    total_sent = total_failed = 0
+    try:
+      while True:
+        sent, failed = self.deliver_batch()
+        total_sent += sent
+        total_failed += failed
+        if sent + failed < self.batch_size:
+          if not forever:
+            break
+          # Don't hold an idle SMTP session open between polls
+          self.close()
+          time.sleep(poll_interval or settings.OUTBOX_POLL_INTERVAL)
+    finally:
+      self.close()
+    return total_sent, total_failed
@@ -0,0 +1,152 @@
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+from django.http import Http404
+from django.utils.functional import cached_property
+
+
+# Keyset (cursor) pagination. Instead of OFFSET, each page remembers the sort
+# key of its first and last rows and the next page filters past them, so page
+# 1000 costs the same as page 1. Ordering names may be prefixed with '-' for a
+# descending key, like order_by().
+
+
+def encode_cursor(values):
+  raw = '|'.join(v.isoformat() if isinstance(v, datetime) else str(v) for v in values)
+  return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, fields):
+  try:
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+    parts = raw.split('|')
+    if len(parts) != len(fields):
+      raise ValueError(cursor)
+    return [field.to_python(part) for field, part in zip(fields, parts)]
+  except Exception:
+    raise Http404('Invalid page cursor')
+
+
+class KeysetPage:
+  """A single page of a keyset paginated queryset, fetched lazily."""
+
+  def __init__(self, queryset, ordering, per_page, after=None, before=None):
+    self.queryset = queryset
+    self.ordering = ordering
+    self.per_page = per_page
+    self.after = after
+    self.before = before
+
+  @property
+  def _names(self):
+    return [name.lstrip('-') for name in self.ordering]
+
+  def _keyset_filter(self, values, forward):
+    # (a, b) > (x, y)  <=>  a > x OR (a = x AND b > y)
+    condition = Q()
+    for i, name in enumerate(self._names):
+      lookup = 'gt' if forward != self.ordering[i].startswith('-') else 'lt'
+      term = Q(**{f'{name}__{lookup}': values[i]})
+      for prev_name, prev_value in zip(self._names[:i], values[:i]):
+        term &= Q(**{prev_name: prev_value})
+      condition |= term
+    return condition
+
+  def _fields(self):
+    opts = self.queryset.model._meta
+    return [opts.get_field(name) for name in self._names]
+
+  def _reversed_ordering(self):
+    return [name[1:] if name.startswith('-') else f'-{name}' for name in self.ordering]
+
+  def _page_queryset(self):
+    queryset = self.queryset
+    if self.before:
+      values = decode_cursor(self.before, self._fields())
+      queryset = queryset.filter(self._keyset_filter(values, forward=False))
+      queryset = queryset.order_by(*self._reversed_ordering())
+    else:
+      if self.after:
+        values = decode_cursor(self.after, self._fields())
+        queryset = queryset.filter(self._keyset_filter(values, forward=True))
+      queryset = queryset.order_by(*self.ordering)
+    return queryset[:self.per_page + 1]
+
+  def _split(self, rows):
+    has_more = len(rows) > self.per_page
+    rows = rows[:self.per_page]
+    if self.before:
+      rows.reverse()
+    return rows, has_more
+
+  @cached_property
+  def _rows(self):
+    return self._split(list(self._page_queryset()))
+
+  async def aload(self):
+    """Fetch the page with the async ORM, for async views"""
+    if '_rows' not in self.__dict__:
+      self.__dict__['_rows'] = self._split([row async for row in self._page_queryset().aiterator()])
+
+  @property
+  def object_list(self):
+    return self._rows[0]
+
+  def __iter__(self):
+    return iter(self.object_list)
+
+  def __len__(self):
+    return len(self.object_list)
+
+  def has_next(self):
+    if self.before:
+      return True
+    return self._rows[1]
+
+  def has_previous(self):
+    if self.before:
+      return self._rows[1]
+    return bool(self.after)
+
+  def has_other_pages(self):
+    return self.has_next() or self.has_previous()
+
+  def _cursor_for(self, obj):
+    return encode_cursor([getattr(obj, name) for name in self._names])
+
+  @property
+  def next_cursor(self):
+    if self.has_next() and self.object_list:
+      return self._cursor_for(self.object_list[-1])
+    return None
+
+  @property
+  def previous_cursor(self):
+    if self.has_previous() and self.object_list:
+      return self._cursor_for(self.object_list[0])
+    return None
+
+
+class KeysetPaginationMixin:
+  """
+  Replaces the OFFSET based paginator of a MultipleObjectMixin with keyset
+  pagination on `keyset_ordering`, driven by `?after=` / `?before=` cursors.
+  """
+  keyset_ordering = ('date_added', 'id')
+  keyset_page_class = KeysetPage
+  paginate_by = 50
+
+  def keyset_paginate(self, queryset, per_page, prefix=''):
+    return self.keyset_page_class(
+      queryset,
+      self.keyset_ordering,
+      per_page,
+      after=self.request.GET.get(f'{prefix}after'),
+      before=self.request.GET.get(f'{prefix}before'),
+    )
+
+  def paginate_queryset(self, queryset, page_size):
+    page = self.keyset_paginate(queryset, page_size)
+    # Nothing is fetched until the template iterates the page
+    return (None, page, page, True)
@@ -0,0 +1,155 @@
+from collections import Counter
+from datetime import datetime, time, timedelta
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+from .models import Lead, ArchivedLead, Agent, Category, LeadActivity, LeadDailyRollup, LeadStatistic, RollupWatermark
+
+
+# Daily lead rollups for the dashboard. LeadDailyRollup holds the leads added
+# per organization, local day and agent or category, archived leads included.
+# refresh_rollups() recounts only the days of leads written (or deleted) since
+# the last refresh, found through the (organization, updated_at) index, so its
+# cost follows the write volume and not the size of the lead table.
+
+WATERMARK = 'lead_daily'
+DIMENSIONS = ((LeadStatistic.AGENT, 'agent_id'), (LeadStatistic.CATEGORY, 'category_id'))
+# Days recounted per query and transaction
+DAYS_PER_BATCH = 31
+
+
+def day_start(day):
+  return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def changed_days(organization_id, since):
+  """Local days with leads added, changed or deleted since `since`"""
+  leads = Lead.objects.filter(organization_id=organization_id, updated_at__gte=since).order_by()
+  days = set(leads.annotate(day=TruncDate('date_added')).values_list('day', flat=True).distinct())
+  deleted = LeadActivity.objects.filter(
+    organization_id=organization_id, timestamp__gte=since, action=LeadActivity.DELETED
+  ).values_list('changes', flat=True)
+  for changes in deleted:
+    if 'date_added' in changes:
+      days.add(timezone.localdate(datetime.fromisoformat(changes['date_added'][0])))
+  return days
+
+
+def days_condition(days):
+  """date_added within any of the days, one range per run of consecutive days"""
+  condition = Q()
+  days = sorted(days)
+  start = previous = days[0]
+  for day in days[1:] + [None]:
+    if day is not None and day == previous + timedelta(days=1):
+      previous = day
+      continue
+    condition |= Q(date_added__gte=day_start(start), date_added__lt=day_start(previous + timedelta(days=1)))
+    start = previous = day
+  return condition
+
+
+def count_days(organization_id, days=None):
+  """{(dimension, day, key): leads} counted from the lead and archive tables, for every day if days is None"""
+  counts = Counter()
+  for model in (Lead, ArchivedLead):
+    leads = model.objects.filter(organization_id=organization_id).order_by()
+    if days is not None:
+      leads = leads.filter(days_condition(days))
+    leads = leads.annotate(day=TruncDate('date_added'))
+    for dimension, field in DIMENSIONS:
+      for day, key, lead_count in leads.values_list('day', field).annotate(Count('id')):
+        counts[(dimension, day, key or LeadStatistic.NONE)] += lead_count
+  return counts
+
+
+@transaction.atomic
+def write_rollups(organization_id, counts, days=None):
+  rollups = LeadDailyRollup.objects.filter(organization_id=organization_id)
+  if days is not None:
+    rollups = rollups.filter(day__in=days)
+  rollups.delete()
+  LeadDailyRollup.objects.bulk_create([
+    LeadDailyRollup(organization_id=organization_id, dimension=dimension, day=day, key=key, lead_count=lead_count)
+    for (dimension, day, key), lead_count in counts.items()
+  ])
+
+
+def refresh_organization(organization_id, since=None):
+  """Recount the days changed since `since`, or all of them, returning how many days were recounted"""
+  if since is None:
+    counts = count_days(organization_id)
+    write_rollups(organization_id, counts)
+    return len({day for _, day, _ in counts})
+  days = sorted(changed_days(organization_id, since))
+  for i in range(0, len(days), DAYS_PER_BATCH):
+    batch = days[i:i + DAYS_PER_BATCH]
+    write_rollups(organization_id, count_days(organization_id, batch), batch)
+  return len(days)
+
+
+def refresh_rollups(organization_ids, full=False, overlap=timedelta(minutes=5), on_organization=None):
+  """
+  Refresh the rollups of the given organizations from the watermark and move
+  it forward. The new watermark trails the start of the refresh by `overlap`,
+  so leads committed late by transactions that were open meanwhile are picked
+  up next time; recounting a day twice is harmless.
+  """
+  started = timezone.now()
+  watermark = RollupWatermark.objects.filter(name=WATERMARK).first()
+  since = None if full or watermark is None else watermark.value
+  total = 0
+  for organization_id in organization_ids:
+    days = refresh_organization(organization_id, since)
+    total += days
+    if on_organization:
+      on_organization(organization_id, days)
+  RollupWatermark.objects.update_or_create(name=WATERMARK, defaults={'value': started - overlap})
+  return total
+
+
+def bars(rows):
+  """(label, value) rows with the value as a percentage of the largest, for CSS bar charts"""
+  largest = max((value for _, value in rows), default=0) or 1
+  return [(label, value, round(value * 100 / largest)) for label, value in rows]
+
+
+def dashboard(organization, start, end):
+  """Rollup totals between two days (inclusive) bucketed so that any range gives at most ~60 bars"""
+  rollups = LeadDailyRollup.objects.filter(organization=organization, day__gte=start, day__lte=end)
+  span = (end - start).days
+  if span <= 62:
+    trunc, label = F('day'), 'M j'
+  elif span <= 7 * 60:
+    trunc, label = TruncWeek('day'), 'M j'
+  else:
+    trunc, label = TruncMonth('day'), 'M Y'
+
+  # Every lead is in exactly one category bucket, so these add up to the totals
+  by_category = rollups.filter(dimension=LeadStatistic.CATEGORY).order_by()
+  trend = list(by_category.annotate(bucket=trunc).values_list('bucket').annotate(Sum('lead_count')).order_by('bucket'))
+  categories = dict(by_category.values_list('key').annotate(Sum('lead_count')))
+  agents = dict(
+    rollups.filter(dimension=LeadStatistic.AGENT).order_by().values_list('key').annotate(Sum('lead_count'))
+  )
+
+  agent_names = dict(Agent.objects.filter(pk__in=agents).values_list('pk', 'user__email'))
+  category_names = dict(Category.objects.filter(pk__in=categories).values_list('pk', 'name'))
+  watermark = RollupWatermark.objects.filter(name=WATERMARK).values_list('value', flat=True).first()
+  return {
+    'total': sum(categories.values()),
+    'trend': bars(trend),
+    'trend_label': label,
+    'agents': bars(sorted(
+      ((agent_names.get(key, 'Unassigned' if key == LeadStatistic.NONE else 'Deleted agent'), count)
+       for key, count in agents.items()),
+      key=lambda row: -row[1]
+    )),
+    'categories': bars(sorted(
+      ((category_names.get(key, 'Uncategorized' if key == LeadStatistic.NONE else 'Deleted category'), count)
+       for key, count in categories.items()),
+      key=lambda row: -row[1]
+    )),
+    'refreshed_at': watermark,
+  }
@@ -0,0 +1,111 @@
+import re
+from django.conf import settings
+from django.db import connections
+from django.db.models import BooleanField, Q
+from django.db.models.expressions import RawSQL
+
+
+# Full-text lead search. PostgreSQL matches against the generated, GIN indexed
+# leads_lead.search_vector column plus a trigram index for substrings of names,
+# emails and phone numbers. SQLite uses the leads_lead_fts FTS5 table kept in
+# sync by triggers. Both are created by migration 0014.
+
+SEARCH_FIELDS = ('first_name', 'last_name', 'email', 'phone_number', 'description')
+
+# Must match the expression of the lead_search_trgm_idx index
+POSTGRES_TEXT = "(leads_lead.first_name || ' ' || leads_lead.last_name || ' ' || " \
+  "leads_lead.email || ' ' || leads_lead.phone_number)"
+
+SQLITE_TRIGGERS = {
+  'leads_lead_fts_insert': """
+    CREATE TRIGGER IF NOT EXISTS leads_lead_fts_insert AFTER INSERT ON leads_lead BEGIN
+      INSERT INTO leads_lead_fts(rowid, first_name, last_name, email, phone_number, description)
+      VALUES (new.id, new.first_name, new.last_name, new.email, new.phone_number, new.description);
+    END
+  """,
+  'leads_lead_fts_delete': """
+    CREATE TRIGGER IF NOT EXISTS leads_lead_fts_delete AFTER DELETE ON leads_lead BEGIN
+      INSERT INTO leads_lead_fts(leads_lead_fts, rowid, first_name, last_name, email, phone_number, description)
+      VALUES ('delete', old.id, old.first_name, old.last_name, old.email, old.phone_number, old.description);
+    END
+  """,
+  'leads_lead_fts_update': """
+    CREATE TRIGGER IF NOT EXISTS leads_lead_fts_update AFTER UPDATE ON leads_lead BEGIN
+      INSERT INTO leads_lead_fts(leads_lead_fts, rowid, first_name, last_name, email, phone_number, description)
+      VALUES ('delete', old.id, old.first_name, old.last_name, old.email, old.phone_number, old.description);
+      INSERT INTO leads_lead_fts(rowid, first_name, last_name, email, phone_number, description)
+      VALUES (new.id, new.first_name, new.last_name, new.email, new.phone_number, new.description);
+    END
+  """,
+}
+
+
+def install_sqlite_triggers(using='default', **kwargs):
+  """
+  post_migrate handler. SQLite migrations rebuild leads_lead for most schema
+  changes, which drops its triggers, so recreate them and reindex if needed.
+  """
+  connection = connections[using]
+  if connection.vendor != 'sqlite':
+    return
+  with connection.cursor() as cursor:
+    tables = connection.introspection.table_names(cursor)
+    if 'leads_lead_fts' not in tables:
+      return
+    cursor.execute(
+      "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'leads_lead'"
+    )
+    existing = {name for name, in cursor.fetchall()}
+    if existing >= SQLITE_TRIGGERS.keys():
+      return
+    for sql in SQLITE_TRIGGERS.values():
+      cursor.execute(sql)
+    cursor.execute("INSERT INTO leads_lead_fts(leads_lead_fts) VALUES ('rebuild')")
+
+
+def search_terms(query):
+  return re.findall(r'\w+', query)
+
+
+def search_leads(queryset, query, max_candidates=None):
+  """
+  Filter a lead queryset down to the leads matching every word of the query.
+  PostgreSQL ranks only the newest `max_candidates` matches.
+  """
+  terms = search_terms(query)
+  if not terms:
+    return queryset.none()
+  vendor = connections[queryset.db].vendor
+
+  if vendor == 'postgresql':
+    tsquery = ' & '.join(f'{term}:*' for term in terms)
+    pattern = '%' + re.sub(r'([%_\\])', r'\\\1', query.strip()) + '%'
+    condition = RawSQL(
+      f"(leads_lead.search_vector @@ to_tsquery('simple', %s) OR {POSTGRES_TEXT} ILIKE %s)",
+      [tsquery, pattern],
+      output_field=BooleanField(),
+    )
+    rank = RawSQL("ts_rank(leads_lead.search_vector, to_tsquery('simple', %s))", [tsquery])
+    # Broad terms match a large part of the table, so ts_rank is only computed and sorted for the
+    # newest matches. They are fetched up front: as a subquery the raw leads_lead references
+    # would point at the outer table.
+    candidates = queryset.filter(condition).order_by('-date_added', '-id').values_list('pk', flat=True)
+    candidates = list(candidates[:max_candidates or settings.SEARCH_MAX_CANDIDATES])
+    return queryset.filter(pk__in=candidates).annotate(search_rank=rank).order_by('-search_rank', '-date_added')
+
+  if vendor == 'sqlite':
+    match = ' '.join(f'"{term}"*' for term in terms)
+    condition = RawSQL(
+      'leads_lead.id IN (SELECT rowid FROM leads_lead_fts WHERE leads_lead_fts MATCH %s)',
+      [match],
+      output_field=BooleanField(),
+    )
+    return queryset.filter(condition).order_by('-date_added')
+
+  # Unindexed fallback for other databases
+  for term in terms:
+    condition = Q()
+    for field in SEARCH_FIELDS:
+      condition |= Q(**{f'{field}__icontains': term})
+    queryset = queryset.filter(condition)
+  return queryset.order_by('-date_added')
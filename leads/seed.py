@@ -0,0 +1,150 @@
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+from .caching import bump_organization_version
+from .dedup import index_leads
+from .models import User, UserProfile, Agent, Category, Lead, LeadStatistic
+
+
+# Synthetic data for load testing. Everything is written with bulk_create() in
+# fixed size batches and generated from a seeded random.Random, so the same
+# arguments always produce the same data set.
+
+FIRST_NAMES = (
+  'James', 'Mary', 'John', 'Patricia', 'Robert', 'Jennifer', 'Michael', 'Linda', 'William', 'Elizabeth',
+  'David', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica', 'Thomas', 'Sarah', 'Charles', 'Karen',
+  'Daniel', 'Nancy', 'Matthew', 'Lisa', 'Anthony', 'Betty', 'Mark', 'Sandra', 'Steven', 'Ashley',
+)
+LAST_NAMES = (
+  'Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez', 'Martinez',
+  'Hernandez', 'Lopez', 'Gonzalez', 'Wilson', 'Anderson', 'Thomas', 'Taylor', 'Moore', 'Jackson', 'Martin',
+  'Lee', 'Perez', 'Thompson', 'White', 'Harris', 'Sanchez', 'Clark', 'Ramirez', 'Lewis', 'Robinson',
+)
+CATEGORY_NAMES = ('New', 'Contacted', 'Qualified', 'Proposal', 'Negotiation', 'Converted', 'Unconverted', 'Lost')
+DOMAINS = ('example.com', 'example.org', 'example.net', 'mail.test')
+WORDS = (
+  'interested', 'pricing', 'demo', 'call', 'back', 'next', 'week', 'budget', 'approved', 'renewal',
+  'referral', 'webinar', 'trial', 'upgrade', 'contract', 'question', 'support', 'follow', 'up', 'meeting',
+)
+
+
+@contextmanager
+def explicit_timestamps():
+  """
+  Let bulk_create() keep the given date_added and updated_at instead of the
+  current time. Changes the fields for the whole process, so only for the
+  single threaded seeder.
+  """
+  date_added = Lead._meta.get_field('date_added')
+  updated_at = Lead._meta.get_field('updated_at')
+  date_added.auto_now_add = updated_at.auto_now = False
+  try:
+    yield
+  finally:
+    date_added.auto_now_add = updated_at.auto_now = True
+
+
+class CRMSeeder:
+
+  def __init__(self, prefix='seed', seed=0, batch_size=5000, password=None, days=365, stdout=None):
+    self.prefix = prefix
+    self.random = random.Random(seed)
+    self.batch_size = batch_size
+    # Hashing is slow on purpose, so every seeded user shares one hash
+    self.password = make_password(password)
+    self.days = days
+    self.stdout = stdout
+
+  def log(self, message):
+    if self.stdout:
+      self.stdout.write(message)
+
+  def create_users(self, usernames, is_organizer):
+    users = User.objects.bulk_create([
+      User(
+        username=username, email=f'{username}@example.com', password=self.password,
+        is_organizer=is_organizer, is_agent=not is_organizer
+      )
+      for username in usernames
+    ], batch_size=self.batch_size)
+    # bulk_create() skips the post_save signal that gives every user a profile
+    profiles = UserProfile.objects.bulk_create(
+      [UserProfile(user=user) for user in users], batch_size=self.batch_size
+    )
+    return users, profiles
+
+  def create_organizations(self, organizations, agents, categories):
+    usernames = [f'{self.prefix}-org{i}' for i in range(organizations)]
+    _, profiles = self.create_users(usernames, is_organizer=True)
+    result = []
+    for i, organization in enumerate(profiles):
+      agent_users, _ = self.create_users(
+        [f'{usernames[i]}-agent{j}' for j in range(agents)], is_organizer=False
+      )
+      organization_agents = Agent.objects.bulk_create([
+        Agent(user=user, organization=organization) for user in agent_users
+      ])
+      organization_categories = Category.objects.bulk_create([
+        Category(name=CATEGORY_NAMES[j % len(CATEGORY_NAMES)], organization=organization)
+        for j in range(categories)
+      ])
+      # Some agents specialize in a category or two, for category affinity assignment
+      Agent.categories.through.objects.bulk_create([
+        Agent.categories.through(agent=agent, category=category)
+        for agent in organization_agents
+        for category in self.random.sample(
+          organization_categories, min(len(organization_categories), self.random.randint(0, 2))
+        )
+      ])
+      result.append((organization, organization_agents, organization_categories))
+    return result
+
+  def make_lead(self, organization, agents, categories, now):
+    rand = self.random
+    first_name = rand.choice(FIRST_NAMES)
+    last_name = rand.choice(LAST_NAMES)
+    lead = Lead(
+      first_name=first_name,
+      last_name=last_name,
+      age=rand.randint(18, 80),
+      organization=organization,
+      # Most leads are worked on, a few wait in the unassigned or uncategorized lists
+      agent=rand.choice(agents) if agents and rand.random() < 0.85 else None,
+      category=rand.choice(categories) if categories and rand.random() < 0.75 else None,
+      description=' '.join(rand.choices(WORDS, k=rand.randint(3, 20))),
+      date_added=now - timedelta(seconds=rand.randint(0, self.days * 86400)),
+      phone_number=f'+1{rand.randint(200, 999)}{rand.randint(200, 999)}{rand.randint(0, 9999):04d}',
+      email=f'{first_name}.{last_name}{rand.randint(1, 9999)}@{rand.choice(DOMAINS)}'.lower(),
+    )
+    # Untouched since it was added, as far as archival is concerned
+    lead.updated_at = lead.date_added
+    return lead
+
+  def create_leads(self, organizations, count):
+    now = timezone.now()
+    created = 0
+    with explicit_timestamps():
+      while created < count:
+        size = min(self.batch_size, count - created)
+        batch = []
+        for _ in range(size):
+          organization, agents, categories = self.random.choice(organizations)
+          batch.append(self.make_lead(organization, agents, categories, now))
+        with transaction.atomic():
+          Lead.objects.bulk_create(batch)
+          LeadStatistic.objects.record_leads(batch)
+          index_leads(batch)
+        created += size
+        self.log(f'{created}/{count} leads')
+    for organization, _, _ in organizations:
+      bump_organization_version(organization.pk)
+    return created
+
+  def run(self, organizations=1, agents=10, categories=6, leads=10000):
+    with transaction.atomic():
+      created = self.create_organizations(organizations, agents, categories)
+    self.log(f'{organizations} organization(s) with {agents} agent(s) and {categories} categories each')
+    return self.create_leads(created, leads)
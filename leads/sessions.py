@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+
+
+class SessionStore(CachedDBStore):
+  """
+  cached_db sessions with write-behind: every save goes to the cache, but the
+  database copy is only rewritten once per SESSION_WRITE_BEHIND_INTERVAL
+  seconds. If the cache entry is lost the session falls back to that copy.
+  """
+  cache_key_prefix = 'leads.sessions.'
+
+  @property
+  def synced_key(self):
+    return self.cache_key + ':synced'
+
+  def save(self, must_create=False):
+    if must_create or not self._cache.get(self.synced_key):
+      super(SessionStore, self).save(must_create)
+      self._cache.set(self.synced_key, True, settings.SESSION_WRITE_BEHIND_INTERVAL)
+    else:
+      self._cache.set(self.cache_key, self._get_session(no_load=must_create), self.get_expiry_age())
+
+  def delete(self, session_key=None):
+    if session_key is None and self.session_key is not None:
+      session_key = self.session_key
+    if session_key is not None:
+      self._cache.delete(self.cache_key_prefix + session_key + ':synced')
+    super(SessionStore, self).delete(session_key)
@@ -0,0 +1,43 @@
+from django.db import transaction
+from django.db.models import Count
+from .caching import bump_organization_version
+from .models import Lead, LeadStatistic
+
+
+def count_lead_statistics(organization):
+  """Recount an organization's statistics straight from the Lead table"""
+  leads = Lead.objects.filter(organization=organization).order_by()
+  counts = {}
+  for dimension, field in ((LeadStatistic.AGENT, 'agent'), (LeadStatistic.CATEGORY, 'category')):
+    for key, lead_count in leads.values_list(field).annotate(Count('id')):
+      counts[(organization.pk, dimension, key or LeadStatistic.NONE)] = lead_count
+  return counts
+
+
+def stored_lead_statistics(organization):
+  statistics = LeadStatistic.objects.filter(organization=organization)
+  return {
+    (organization.pk, dimension, key): lead_count
+    for dimension, key, lead_count in statistics.values_list('dimension', 'key', 'lead_count')
+  }
+
+
+def find_drift(organization):
+  """Return (key, stored, actual) for every statistic that disagrees with the Lead table"""
+  actual = count_lead_statistics(organization)
+  stored = stored_lead_statistics(organization)
+  drift = []
+  for key in sorted(actual.keys() | stored.keys()):
+    if actual.get(key, 0) != stored.get(key, 0):
+      drift.append((key, stored.get(key, 0), actual.get(key, 0)))
+  return drift
+
+
+@transaction.atomic
+def rebuild_lead_statistics(organization):
+  LeadStatistic.objects.filter(organization=organization).delete()
+  LeadStatistic.objects.bulk_create([
+    LeadStatistic(organization_id=organization_id, dimension=dimension, key=key, lead_count=lead_count)
+    for (organization_id, dimension, key), lead_count in count_lead_statistics(organization).items()
+  ])
+  bump_organization_version(organization.pk)
@@ -0,0 +1,56 @@
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from leads.caching import fragment_key, record_fragment_lookup
+
+
+register = template.Library()
+
+
+class VersionedCacheNode(template.Node):
+
+  def __init__(self, nodelist, fragment_name, vary_on):
+    self.nodelist = nodelist
+    self.fragment_name = fragment_name
+    self.vary_on = vary_on
+
+  def render(self, context):
+    request = context['request']
+    organization = request.tenant.organization
+    if organization is None:
+      return self.nodelist.render(context)
+
+    key = fragment_key(request, self.fragment_name, [var.resolve(context) for var in self.vary_on])
+    # Async views look their fragments up before rendering, see prefetch_fragments()
+    value = getattr(request, 'prefetched_fragments', {}).get(key)
+    if value is None:
+      value = cache.get(key)
+    record_fragment_lookup(self.fragment_name, hit=value is not None)
+    if value is None:
+      value = self.nodelist.render(context)
+      cache.set(key, value, settings.FRAGMENT_CACHE_TIMEOUT)
+    return value
+
+
+@register.tag('versioned_cache')
+def do_versioned_cache(parser, token):
+  """
+  Cache a template fragment until the current organization's data changes.
+
+  Usage::
+
+      {% load fragment_cache %}
+      {% versioned_cache lead_list request.GET.after %}
+          .. some expensive processing ..
+      {% endversioned_cache %}
+  """
+  nodelist = parser.parse(('endversioned_cache',))
+  parser.delete_first_token()
+  tokens = token.split_contents()
+  if len(tokens) < 2:
+    raise template.TemplateSyntaxError(f"'{tokens[0]}' tag requires at least 1 argument.")
+  return VersionedCacheNode(
+    nodelist,
+    tokens[1],
+    [parser.compile_filter(t) for t in tokens[2:]],
+  )
@@ -0,0 +1,38 @@
+class Tenant:
+  """The organization a user works in, and their agent record if they are an agent"""
+
+  def __init__(self, organization=None, agent=None):
+    self.organization = organization
+    self.agent = agent
+
+  @property
+  def is_agent(self):
+    return self.agent is not None
+
+
+def resolve_tenant(user):
+  from .models import Agent
+
+  if not user.is_authenticated:
+    return Tenant()
+  if user.is_organizer:
+    return Tenant(organization=user.userprofile)
+  # One query for the agent and its organization, unless the user came with them
+  if user.__class__.agent.is_cached(user):
+    agent = user.__class__.agent.related.get_cached_value(user)
+  else:
+    agent = Agent.objects.select_related('organization').filter(user=user).first()
+    if agent is not None:
+      user.agent = agent
+  if agent is None:
+    return Tenant()
+  return Tenant(organization=agent.organization, agent=agent)
+
+
+def get_tenant(user):
+  """Resolve a user's tenant once and keep it on the user for the rest of the request"""
+  try:
+    return user._tenant
+  except AttributeError:
+    user._tenant = resolve_tenant(user)
+    return user._tenant
@@ -0,0 +1,71 @@
+from django.shortcuts import reverse
+from django.test import TestCase
+from leads.assignment import distribute_backlog
+from leads.models import User, UserProfile, Agent, Category, Lead, LeadActivity
+
+
+class LeadActivityTest(TestCase):
+
+  def setUp(self):
+    self.organizer = User.objects.create_user(username='organizer')
+    self.organization = self.organizer.userprofile
+    self.agent = Agent.objects.create(
+      user=User.objects.create_user(username='agent', email='agent@test.com', is_organizer=False, is_agent=True),
+      organization=self.organization
+    )
+    self.category = Category.objects.create(name='Contacted', organization=self.organization)
+    self.lead = Lead.objects.create(
+      first_name='Joe', last_name='Smith', organization=self.organization,
+      description='', phone_number='555', email='joe@test.com'
+    )
+    self.client.force_login(self.organizer)
+
+  def test_view_changes_are_recorded(self):
+    self.client.post(reverse('leads:assign-agent', args=[self.lead.pk]), {'agent': self.agent.pk})
+    self.client.post(reverse('leads:lead-category-update', args=[self.lead.pk]), {'category': self.category.pk})
+    activities = list(LeadActivity.objects.order_by('id'))
+    self.assertEqual([a.action for a in activities], [LeadActivity.ASSIGNED, LeadActivity.CATEGORIZED])
+    self.assertEqual(activities[0].changes, {'agent': [None, self.agent.pk]})
+    self.assertEqual({a.actor_id for a in activities}, {self.organizer.pk})
+
+    response = self.client.get(reverse('leads:lead-detail', args=[self.lead.pk]))
+    self.assertContains(response, 'Agent: - &rarr; agent@test.com', html=True)
+    response = self.client.get(reverse('leads:lead-activity'))
+    self.assertContains(response, 'Category: - &rarr; Contacted', html=True)
+
+  def test_bulk_assignment_and_deletion(self):
+    self.organization.assignment_strategy = UserProfile.ROUND_ROBIN
+    self.organization.save()
+    distribute_backlog(self.organization)
+    activity = LeadActivity.objects.get()
+    self.assertEqual(
+      (activity.lead_id, activity.action, activity.actor_id), (self.lead.pk, LeadActivity.ASSIGNED, None)
+    )
+
+    lead_id = self.lead.pk
+    self.lead.delete()
+    self.assertEqual(LeadActivity.objects.filter(lead_id=lead_id).count(), 2)
+    response = self.client.get(reverse('leads:lead-activity'))
+    self.assertContains(response, f'Lead #{lead_id}')
+
+  def test_timeline_pages(self):
+    for age in range(1, 26):
+      self.lead.age = age
+      self.lead.save()
+    url = reverse('leads:lead-detail', args=[self.lead.pk])
+    ages = []
+    params = {}
+    while True:
+      page = self.client.get(url, params).context['activities']
+      ages.extend(activity.changes['age'][1] for activity in page)
+      if not page.has_next():
+        break
+      params = {'activity_after': page.next_cursor}
+    self.assertEqual(ages, list(range(25, 0, -1)))
+
+  def test_append_only(self):
+    self.lead.age = 30
+    self.lead.save()
+    activity = LeadActivity.objects.get()
+    with self.assertRaises(ValueError):
+      activity.save()
@@ -0,0 +1,112 @@
+import base64
+import json
+from django.shortcuts import reverse
+from django.test import TestCase
+from leads.models import User, Agent, Category, Lead
+from leads.stats import find_drift
+
+
+class LeadApiTest(TestCase):
+
+  @classmethod
+  def setUpTestData(cls):
+    cls.organizer = User.objects.create_user(username='organizer', password='secret')
+    cls.organization = cls.organizer.userprofile
+    cls.agent = Agent.objects.create(
+      user=User.objects.create_user(username='agent', email='agent@test.com', is_organizer=False, is_agent=True),
+      organization=cls.organization
+    )
+    cls.category = Category.objects.create(name='Contacted', organization=cls.organization)
+    for i in range(5):
+      Lead.objects.create(
+        first_name=f'Lead{i}', last_name='Smith', organization=cls.organization, agent=cls.agent,
+        description='', phone_number='555', email=f'lead{i}@test.com'
+      )
+    other = User.objects.create_user(username='other')
+    Lead.objects.create(
+      first_name='Other', last_name='Smith', organization=other.userprofile,
+      description='', phone_number='555', email='other@test.com'
+    )
+
+  def setUp(self):
+    self.client.force_login(self.organizer)
+
+  def send(self, method, url, data):
+    return getattr(self.client, method)(url, json.dumps(data), content_type='application/json')
+
+  def test_cursor_pagination_and_fields(self):
+    url = reverse('leads:api-lead-list')
+    names = []
+    params = {'limit': 2, 'fields': 'first_name'}
+    while True:
+      data = self.client.get(url, params).json()
+      names.extend(lead['first_name'] for lead in data['results'])
+      self.assertEqual(set(data['results'][0]), {'id', 'first_name'})
+      if not data['next']:
+        break
+      params['after'] = data['next']
+    self.assertEqual(names, [f'Lead{i}' for i in range(5)])
+    self.assertEqual(self.client.get(url, {'fields': 'password'}).status_code, 400)
+
+  def test_bulk_create_is_all_or_nothing(self):
+    url = reverse('leads:api-lead-list')
+    lead = {
+      'first_name': 'New', 'last_name': 'Lead', 'age': 30, 'email': 'new@test.com', 'phone_number': '1',
+      'description': 'From the API', 'category': self.category.pk
+    }
+    response = self.send('post', url, [lead, {**lead, 'email': 'not an email', 'agent': 999}])
+    self.assertEqual(response.status_code, 400)
+    self.assertEqual(set(response.json()['errors']['1']), {'email', 'agent'})
+    self.assertFalse(Lead.objects.filter(first_name='New').exists())
+
+    response = self.send('post', url, [lead] * 3)
+    self.assertEqual(response.status_code, 201)
+    self.assertEqual(len(response.json()['results']), 3)
+    self.assertEqual(Lead.objects.filter(first_name='New', category=self.category).count(), 3)
+    self.assertEqual(find_drift(self.organization), [])
+
+  def test_bulk_update(self):
+    leads = list(Lead.objects.filter(organization=self.organization)[:2])
+    response = self.send('patch', reverse('leads:api-lead-list'), [
+      {'id': leads[0].pk, 'category': self.category.pk, 'agent': None},
+      {'id': leads[1].pk, 'last_name': 'Jones'},
+    ])
+    self.assertEqual(response.status_code, 200)
+    leads[0].refresh_from_db()
+    leads[1].refresh_from_db()
+    self.assertEqual((leads[0].category, leads[0].agent), (self.category, None))
+    self.assertEqual((leads[1].last_name, leads[1].first_name), ('Jones', 'Lead1'))
+    self.assertEqual(find_drift(self.organization), [])
+
+  def test_bulk_update_rejects_repeated_ids(self):
+    lead = Lead.objects.filter(organization=self.organization).first()
+    response = self.send('patch', reverse('leads:api-lead-list'), [
+      {'id': lead.pk, 'category': self.category.pk}, {'id': lead.pk, 'agent': None},
+    ])
+    self.assertEqual(response.status_code, 400)
+    lead.refresh_from_db()
+    self.assertEqual((lead.category, lead.agent), (None, self.agent))
+    self.assertEqual(find_drift(self.organization), [])
+
+  def test_tenant_scoping(self):
+    other_lead = Lead.objects.get(first_name='Other')
+    self.assertEqual(self.client.get(reverse('leads:api-lead-detail', args=[other_lead.pk])).status_code, 404)
+    response = self.send('patch', reverse('leads:api-lead-list'), [{'id': other_lead.pk, 'first_name': 'Mine'}])
+    self.assertEqual(response.status_code, 400)
+    other_lead.refresh_from_db()
+    self.assertEqual(other_lead.first_name, 'Other')
+
+  def test_basic_auth_and_agents(self):
+    self.client.logout()
+    url = reverse('leads:api-agent-list')
+    self.assertEqual(self.client.get(url).status_code, 401)
+    credentials = base64.b64encode(b'organizer:secret').decode()
+    response = self.client.get(url, HTTP_AUTHORIZATION=f'Basic {credentials}')
+    self.assertEqual(response.json()['results'], [
+      {'id': self.agent.pk, 'username': 'agent', 'email': 'agent@test.com', 'first_name': '', 'last_name': ''}
+    ])
+
+  def test_category_create(self):
+    response = self.send('post', reverse('leads:api-category-list'), {'name': 'Converted'})
+    self.assertEqual(response.status_code, 201)
+    self.assertTrue(Category.objects.filter(organization=self.organization, name='Converted').exists())
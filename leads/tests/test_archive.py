@@ -0,0 +1,67 @@
+from datetime import timedelta
+from io import StringIO
+from django.core.management import call_command
+from django.shortcuts import reverse
+from django.test import TestCase
+from django.utils import timezone
+from leads.models import User, Agent, Category, Lead, ArchivedLead, LeadActivity
+from leads.search import search_leads
+from leads.stats import find_drift
+
+
+class LeadArchiveTest(TestCase):
+
+  def setUp(self):
+    self.organizer = User.objects.create_user(username='organizer')
+    self.organization = self.organizer.userprofile
+    self.agent = Agent.objects.create(
+      user=User.objects.create_user(username='agent', is_organizer=False, is_agent=True),
+      organization=self.organization
+    )
+    converted = Category.objects.create(name='Converted', organization=self.organization)
+    now = timezone.now()
+    leads = [
+      ('Old', None, 800),
+      ('Closed', converted, 200),
+      ('Recent', converted, 10),
+      ('Active', None, 0),
+    ]
+    for i, (name, category, days) in enumerate(leads * 2):
+      lead = Lead.objects.create(
+        first_name=name, last_name=f'Smith{i}', organization=self.organization, agent=self.agent,
+        category=category, description='', phone_number='555', email=f'{name.lower()}@test.com'
+      )
+      Lead.objects.filter(pk=lead.pk).update(updated_at=now - timedelta(days=days))
+    self.client.force_login(self.organizer)
+
+  def test_archive_in_chunks_and_restore(self):
+    out = StringIO()
+    call_command('archive_leads', '--chunk-size=3', stdout=out)
+    self.assertIn('Archived 4 lead(s)', out.getvalue())
+    self.assertEqual(set(ArchivedLead.objects.values_list('first_name', flat=True)), {'Old', 'Closed'})
+    self.assertEqual(set(Lead.objects.values_list('first_name', flat=True)), {'Recent', 'Active'})
+    self.assertFalse(search_leads(Lead.objects.all(), 'Old').exists())
+    self.assertEqual(find_drift(self.organization), [])
+
+    archived = ArchivedLead.objects.filter(first_name='Old').first()
+    response = self.client.get(reverse('leads:archived-lead-list'), {'q': 'old smith'})
+    self.assertContains(response, 'old@test.com', count=2)
+    response = self.client.get(reverse('leads:lead-detail', args=[archived.pk]))
+    self.assertRedirects(response, reverse('leads:archived-lead-detail', args=[archived.pk]))
+
+    self.agent.delete()
+    response = self.client.post(reverse('leads:archived-lead-restore', args=[archived.pk]))
+    self.assertRedirects(response, reverse('leads:lead-detail', args=[archived.pk]))
+    lead = Lead.objects.get(pk=archived.pk)
+    self.assertEqual((lead.date_added, lead.agent_id), (archived.date_added, None))
+    self.assertTrue(search_leads(Lead.objects.all(), 'Old').exists())
+    self.assertFalse(ArchivedLead.objects.filter(pk=archived.pk).exists())
+    self.assertEqual(find_drift(self.organization), [])
+    actions = LeadActivity.objects.filter(lead_id=lead.pk).order_by('id').values_list('action', flat=True)
+    self.assertEqual(list(actions), [LeadActivity.ARCHIVED, LeadActivity.RESTORED])
+
+  def test_dry_run(self):
+    out = StringIO()
+    call_command('archive_leads', '--dry-run', '--days=100', '--category-days=5', stdout=out)
+    self.assertIn('6 lead(s) would be archived', out.getvalue())
+    self.assertEqual(ArchivedLead.objects.count(), 0)
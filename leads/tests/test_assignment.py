@@ -0,0 +1,72 @@
+from collections import Counter
+from django.shortcuts import reverse
+from django.test import TestCase
+from leads.assignment import distribute_backlog
+from leads.models import User, UserProfile, Agent, Category, Lead, LeadStatistic
+from leads.stats import find_drift
+
+
+class LeadAssignmentTest(TestCase):
+
+  def setUp(self):
+    self.organizer = User.objects.create_user(username='organizer')
+    self.organization = self.organizer.userprofile
+    self.agents = [
+      Agent.objects.create(
+        user=User.objects.create_user(username=f'agent{i}', is_organizer=False, is_agent=True),
+        organization=self.organization
+      )
+      for i in range(3)
+    ]
+    self.category = Category.objects.create(name='Roofing', organization=self.organization)
+
+  def create_leads(self, count, **kwargs):
+    for i in range(count):
+      Lead.objects.create(
+        first_name=f'Lead{i}', last_name='Smith', organization=self.organization,
+        description='', phone_number='555', email='lead@test.com', **kwargs
+      )
+
+  def agent_counts(self):
+    return Counter(Lead.objects.filter(agent__isnull=False).values_list('agent_id', flat=True))
+
+  def test_round_robin(self):
+    self.create_leads(7)
+    self.assertEqual(distribute_backlog(self.organization, UserProfile.ROUND_ROBIN, batch_size=2), 7)
+    counts = self.agent_counts()
+    self.assertEqual(sorted(counts.values()), [2, 2, 3])
+    self.organization.refresh_from_db()
+    self.assertEqual(self.organization.round_robin_position, 7)
+    self.assertEqual(find_drift(self.organization), [])
+
+  def test_least_loaded_uses_existing_load(self):
+    self.create_leads(3, agent=self.agents[0])
+    self.create_leads(4)
+    distribute_backlog(self.organization, UserProfile.LEAST_LOADED)
+    counts = self.agent_counts()
+    self.assertEqual(counts[self.agents[0].pk], 3)
+    self.assertEqual(counts[self.agents[1].pk] + counts[self.agents[2].pk], 4)
+    self.assertEqual(find_drift(self.organization), [])
+
+  def test_category_affinity(self):
+    self.agents[2].categories.add(self.category)
+    self.create_leads(3, category=self.category)
+    self.create_leads(1)
+    distribute_backlog(self.organization, UserProfile.CATEGORY_AFFINITY)
+    self.assertEqual(
+      set(Lead.objects.filter(category=self.category).values_list('agent_id', flat=True)),
+      {self.agents[2].pk}
+    )
+    self.assertFalse(Lead.objects.filter(agent__isnull=True).exists())
+
+  def test_new_leads_are_assigned_on_create(self):
+    self.organization.assignment_strategy = UserProfile.LEAST_LOADED
+    self.organization.save()
+    self.client.force_login(self.organizer)
+    self.client.post(reverse('leads:lead-create'), {
+      'first_name': 'Joe', 'last_name': 'Smith', 'age': 30, 'description': 'A lead',
+      'phone_number': '555', 'email': 'joe@test.com',
+    })
+    self.assertEqual(Lead.objects.get().agent, self.agents[0])
+    counts = LeadStatistic.objects.counts(self.organization, LeadStatistic.AGENT)
+    self.assertEqual(counts, {LeadStatistic.NONE: 0, self.agents[0].pk: 1})
@@ -0,0 +1,83 @@
+from unittest import mock
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.shortcuts import reverse
+from django.utils.functional import SimpleLazyObject
+from django.test import TestCase, AsyncRequestFactory
+from leads import async_views
+from leads.models import User, Agent, Category, Lead, LeadStatistic
+from leads.pagination import KeysetPage
+from leads.tenancy import get_tenant
+
+
+class AsyncViewTest(TestCase):
+
+  @classmethod
+  def setUpTestData(cls):
+    cls.organizer = User.objects.create_user(username='organizer', email='organizer@test.com')
+    organization = cls.organizer.userprofile
+    agent = Agent.objects.create(
+      user=User.objects.create_user(username='agent', email='agent@test.com', is_organizer=False, is_agent=True),
+      organization=organization
+    )
+    cls.category = Category.objects.create(name='Contacted', organization=organization)
+    cls.lead = Lead.objects.create(
+      first_name='Joe', last_name='Smith', organization=organization, agent=agent, category=cls.category,
+      description='', phone_number='555', email='joe@test.com'
+    )
+    Lead.objects.create(
+      first_name='Ann', last_name='Unassigned', organization=organization,
+      description='', phone_number='555', email='ann@test.com'
+    )
+
+  async def get(self, view_class, user, **kwargs):
+    request = AsyncRequestFactory().get('/')
+    request.user = user
+    request.tenant = SimpleLazyObject(lambda: get_tenant(user))
+    response = await view_class.as_view()(request, **kwargs)
+    # Rendering must not need the database, it would raise SynchronousOnlyOperation here
+    if hasattr(response, 'render'):
+      response.render()
+    return response
+
+  async def test_lead_list(self):
+    response = await self.get(async_views.LeadListView, self.organizer)
+    self.assertContains(response, 'Joe')
+    self.assertContains(response, 'Unassigned')
+
+  async def test_cached_fragments_skip_the_queries_behind_them(self):
+    await sync_to_async(cache.clear)()
+    await self.get(async_views.LeadListView, self.organizer)
+    await self.get(async_views.CategoryListView, self.organizer)
+    with (
+      mock.patch.object(KeysetPage, 'aload') as aload,
+      mock.patch.object(LeadStatistic.objects, 'acounts') as acounts,
+    ):
+      response = await self.get(async_views.LeadListView, self.organizer)
+      self.assertContains(response, 'Unassigned')
+      response = await self.get(async_views.CategoryListView, self.organizer)
+      self.assertContains(response, 'Contacted')
+    aload.assert_not_called()
+    acounts.assert_not_called()
+
+  async def test_lead_detail(self):
+    response = await self.get(async_views.LeadDetailView, self.organizer, pk=self.lead.pk)
+    self.assertContains(response, 'agent@test.com')
+
+  async def test_categories(self):
+    response = await self.get(async_views.CategoryListView, self.organizer)
+    self.assertContains(response, 'Contacted')
+    response = await self.get(async_views.CategoryDetailView, self.organizer, pk=self.category.pk)
+    self.assertContains(response, 'Smith')
+
+  async def test_other_organizations_get_404(self):
+    other = await User.objects.acreate(username='other')
+    with self.assertRaises(Exception) as raised:
+      await self.get(async_views.LeadDetailView, other, pk=self.lead.pk)
+    self.assertEqual(type(raised.exception).__name__, 'Http404')
+
+  async def test_asgi_middleware_stack(self):
+    await sync_to_async(self.async_client.force_login)(self.organizer)
+    response = await self.async_client.get(reverse('leads:lead-list'))
+    self.assertContains(response, 'Joe')
+    self.assertIn('Server-Timing', response.headers)
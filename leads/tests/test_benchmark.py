@@ -0,0 +1,48 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from leads.models import User, Agent, Category, Lead
+from leads.stats import find_drift
+
+
+class SeedAndBenchmarkTest(TestCase):
+
+  @classmethod
+  def setUpTestData(cls):
+    call_command(
+      'seed_crm', leads=300, organizations=2, agents=3, categories=4, batch_size=100, stdout=StringIO()
+    )
+
+  def test_seed_data(self):
+    self.assertEqual(Lead.objects.count(), 300)
+    self.assertEqual(Agent.objects.count(), 6)
+    self.assertEqual(Category.objects.count(), 8)
+    organizer = User.objects.get(username='seed-org0')
+    self.assertFalse(organizer.has_usable_password())
+    self.assertGreater(Lead.objects.dates('date_added', 'day').count(), 1)
+    for organization in (organizer.userprofile, User.objects.get(username='seed-org1').userprofile):
+      self.assertEqual(find_drift(organization), [])
+
+  def test_seed_refuses_existing_prefix(self):
+    with self.assertRaises(CommandError):
+      call_command('seed_crm', leads=1)
+
+  def test_benchmark_and_baseline(self):
+    with tempfile.TemporaryDirectory() as directory:
+      output = os.path.join(directory, 'baseline.json')
+      call_command('benchmark_views', iterations=2, warmup=0, output=output, stdout=StringIO())
+      with open(output) as f:
+        results = json.load(f)
+      self.assertEqual(results['views']['leads:lead-list']['status'], 200)
+      self.assertIn('agents:agent-detail', results['views'])
+
+      for result in results['views'].values():
+        result['queries'] -= 1
+      with open(output, 'w') as f:
+        json.dump(results, f)
+      with self.assertRaisesMessage(CommandError, 'leads:lead-list'):
+        call_command('benchmark_views', iterations=2, warmup=0, baseline=output, stdout=StringIO())
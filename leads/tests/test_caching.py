@@ -0,0 +1,81 @@
+from django.core.cache import cache
+from django.db import connection
+from django.shortcuts import reverse
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from leads.caching import fragment_cache_stats, organization_version
+from leads.models import User, Category, Lead
+
+
+class FragmentCacheTest(TestCase):
+
+  def setUp(self):
+    cache.clear()
+    self.organizer = User.objects.create_user(username='organizer')
+    self.organization = self.organizer.userprofile
+    self.category = Category.objects.create(name='Contacted', organization=self.organization)
+    self.client.force_login(self.organizer)
+
+  def get(self):
+    with CaptureQueriesContext(connection) as queries:
+      response = self.client.get(reverse('leads:category-list'))
+    return response, len(queries)
+
+  def test_fragment_is_reused_until_a_write(self):
+    _, first = self.get()
+    response, second = self.get()
+    self.assertLess(second, first)
+    self.assertEqual(fragment_cache_stats()['category_list'], (1, 1))
+
+    version = organization_version(self.organization.pk)
+    Lead.objects.create(
+      first_name='Joe', last_name='Smith', organization=self.organization, category=self.category,
+      description='', phone_number='555', email='joe@test.com'
+    )
+    self.assertGreater(organization_version(self.organization.pk), version)
+    response, _ = self.get()
+    self.assertContains(response, '<td class="px-4 py-3">1</td>', html=True)
+
+  def test_version_survives_eviction(self):
+    version = organization_version(self.organization.pk)
+    cache.clear()
+    self.assertGreater(organization_version(self.organization.pk), version)
+
+
+class ConditionalGetTest(TestCase):
+
+  def setUp(self):
+    cache.clear()
+    self.organizer = User.objects.create_user(username='organizer')
+    self.organization = self.organizer.userprofile
+    self.client.force_login(self.organizer)
+
+  def create_lead(self):
+    return Lead.objects.create(
+      first_name='Joe', last_name='Smith', organization=self.organization,
+      description='', phone_number='555', email='joe@test.com'
+    )
+
+  def test_unchanged_pages_are_not_modified(self):
+    self.create_lead()
+    for url in (reverse('leads:lead-list'), reverse('leads:api-lead-list')):
+      with self.subTest(url=url):
+        response = self.client.get(url)
+        etag = response['ETag']
+        with CaptureQueriesContext(connection) as queries:
+          response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse([q for q in queries if 'leads_lead' in q['sql']])
+        # A second resolution date can't tell apart writes made within the same second
+        self.assertFalse(self.client.get(url).has_header('Last-Modified'))
+
+        self.create_lead()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+  def test_updated_at(self):
+    lead = self.create_lead()
+    self.assertEqual(Lead.objects.get(pk=lead.pk).updated_at, lead.updated_at)
+    lead.first_name = 'Jim'
+    lead.save()
+    lead.refresh_from_db()
+    self.assertGreater(lead.updated_at, lead.date_added)
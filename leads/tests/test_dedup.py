@@ -0,0 +1,73 @@
+from io import StringIO
+from django.shortcuts import reverse
+from django.test import TestCase
+from leads.dedup import canonical_email, e164_phone, soundex, sweep
+from leads.importer import LeadImporter, read_csv
+from leads.models import User, Lead, LeadBlockingKey, LeadActivity
+
+
+CSV = """first_name,last_name,age,description,phone_number,email
+Jon,Smyth,30,Second visit,555 867 5309,jon.smyth+crm@gmail.com
+Ann,Lee,41,New,+44 20 7946 0958,ann@test.com
+Ann,Lee,41,Same file,0044 20 7946 0958,ann.lee@test.com
+"""
+
+
+class LeadDedupTest(TestCase):
+
+  def setUp(self):
+    self.organizer = User.objects.create_user(username='organizer')
+    self.organization = self.organizer.userprofile
+    self.lead = self.create_lead('John', 'Smith', email='JonSmyth@gmail.com', phone_number='(555) 867-5309')
+    self.create_lead('Mary', 'Jones', email='mary@test.com', phone_number='555 000 1111')
+    self.client.force_login(self.organizer)
+
+  def create_lead(self, first_name, last_name, **kwargs):
+    return Lead.objects.create(
+      first_name=first_name, last_name=last_name, organization=self.organization, description='', **kwargs
+    )
+
+  def test_normalization(self):
+    self.assertEqual(canonical_email(' Jon.Smyth+crm@GoogleMail.com'), 'jonsmyth@gmail.com')
+    self.assertEqual(e164_phone('(555) 867-5309'), '+15558675309')
+    self.assertEqual(e164_phone('0044 20 7946 0958'), '+442079460958')
+    self.assertEqual(e164_phone('555'), '')
+    names = ('Robert', 'Rupert', 'Ashcraft', 'Tymczak')
+    self.assertEqual([soundex(name) for name in names], ['R163', 'R163', 'A261', 'T522'])
+
+  def test_create_view_warns_about_duplicates(self):
+    url = reverse('leads:lead-create')
+    data = {
+      'first_name': 'Jon', 'last_name': 'Smyth', 'age': 30, 'description': 'Again',
+      'phone_number': '555-867-5309', 'email': 'jon.smyth@gmail.com'
+    }
+    response = self.client.post(url, data)
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual([lead for _, lead in response.context['duplicates']], [self.lead])
+    self.assertEqual(Lead.objects.count(), 2)
+    self.assertRedirects(self.client.post(url, {**data, 'create_anyway': '1'}), reverse('leads:lead-list'))
+    self.assertEqual(Lead.objects.count(), 3)
+
+  def test_import_skips_duplicates(self):
+    errors = []
+    importer = LeadImporter(self.organization, on_error=lambda *error: errors.append(error), skip_duplicates=True)
+    result = importer.run(read_csv(StringIO(CSV)))
+    self.assertEqual((result.created, result.failed), (1, 2))
+    self.assertEqual([line for line, _ in errors], [2, 4])
+    self.assertIn(f'lead {self.lead.pk}', errors[0][1])
+    self.assertEqual(LeadBlockingKey.objects.filter(lead__first_name='Ann').count(), 3)
+
+  def test_sweep_and_merge(self):
+    duplicate = self.create_lead('Jon', 'Smyth', email='jon.smyth@gmail.com', phone_number='', age=40)
+    self.create_lead('Jon', 'Smyth', email='other@test.com', phone_number='')
+    pairs = sweep(self.organization)
+    self.assertEqual([(pair.lead_id, pair.duplicate_id) for pair in pairs], [(self.lead.pk, duplicate.pk)])
+    self.assertContains(self.client.get(reverse('leads:duplicate-list')), 'Merge')
+
+    url = reverse('leads:lead-merge', args=[self.lead.pk, duplicate.pk])
+    response = self.client.post(url, {'keep': self.lead.pk})
+    self.assertRedirects(response, reverse('leads:lead-detail', args=[self.lead.pk]))
+    self.assertFalse(Lead.objects.filter(pk=duplicate.pk).exists())
+    self.lead.refresh_from_db()
+    self.assertEqual(self.lead.age, 40)
+    self.assertEqual(LeadActivity.objects.get(lead_id=self.lead.pk).changes, {'age': [0, 40]})
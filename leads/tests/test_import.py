@@ -0,0 +1,62 @@
+from io import StringIO
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.shortcuts import reverse
+from django.test import TestCase
+from leads.importer import LeadImporter, read_csv, read_jsonl
+from leads.models import User, Agent, Category, Lead, LeadStatistic
+from leads.stats import find_drift
+
+
+CSV = """first_name,last_name,age,description,phone_number,email,agent,category
+Joe,Smith,30,Met at a fair,555-1212,joe@test.com,agent,Contacted
+Jane,Doe,41,Referral,555-1313,jane@test.com,,
+Bad,Email,20,Referral,555-1414,not-an-email,,
+Lost,Agent,20,Referral,555-1515,lost@test.com,nobody,
+"""
+
+
+class LeadImportTest(TestCase):
+
+  def setUp(self):
+    self.organizer = User.objects.create_user(username='organizer')
+    self.organization = self.organizer.userprofile
+    agent_user = User.objects.create_user(username='agent', is_organizer=False, is_agent=True)
+    self.agent = Agent.objects.create(user=agent_user, organization=self.organization)
+    self.category = Category.objects.create(name='Contacted', organization=self.organization)
+
+  def test_csv_rows_are_validated_and_batched(self):
+    errors = []
+    importer = LeadImporter(self.organization, batch_size=1, on_error=lambda *error: errors.append(error))
+    result = importer.run(read_csv(StringIO(CSV)))
+    self.assertEqual((result.created, result.failed), (2, 2))
+    self.assertEqual([line for line, _ in errors], [4, 5])
+    self.assertIn('email', errors[0][1])
+    self.assertIn('unknown agent "nobody"', errors[1][1])
+
+    joe = Lead.objects.get(first_name='Joe')
+    self.assertEqual((joe.agent, joe.category), (self.agent, self.category))
+    self.assertEqual(LeadStatistic.objects.counts(self.organization, LeadStatistic.AGENT)[self.agent.pk], 1)
+    self.assertEqual(find_drift(self.organization), [])
+
+  def test_jsonl(self):
+    rows = '{"first_name": "Joe", "last_name": "Smith", "age": 3, "description": "x", ' \
+      '"phone_number": "555", "email": "joe@test.com"}\n\n{not json}\n{"first_name": "Ann", "agent": 5}\n'
+    result = LeadImporter(self.organization).run(read_jsonl(StringIO(rows)))
+    self.assertEqual((result.created, result.failed), (1, 2))
+    self.assertEqual(result.errors[0][0], 3)
+    self.assertIn('unknown agent "5"', result.errors[1][1])
+
+  def test_upload_view(self):
+    self.client.force_login(self.organizer)
+    upload = SimpleUploadedFile('leads.csv', CSV.encode())
+    response = self.client.post(reverse('leads:lead-import'), {'file': upload})
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(response.context['result'].created, 2)
+    self.assertEqual(Lead.objects.filter(organization=self.organization).count(), 2)
+
+  def test_upload_view_rejects_other_encodings(self):
+    self.client.force_login(self.organizer)
+    upload = SimpleUploadedFile('leads.csv', CSV.replace('Joe', 'Zoë').encode('latin-1'))
+    response = self.client.post(reverse('leads:lead-import'), {'file': upload})
+    self.assertEqual(response.status_code, 200)
+    self.assertIn('not UTF-8', response.context['form'].errors['file'][0])
@@ -0,0 +1,64 @@
+from unittest import mock
+from django.core import mail
+from django.shortcuts import reverse
+from django.test import TestCase
+from leads.models import User, Lead, OutboxEmail
+from leads.outbox import OutboxWorker, queue_mail
+
+
+class OutboxTest(TestCase):
+
+  def test_lead_create_queues_mail(self):
+    organizer = User.objects.create_user(username='organizer')
+    self.client.force_login(organizer)
+    response = self.client.post(reverse('leads:lead-create'), {
+      'first_name': 'Joe', 'last_name': 'Smith', 'age': 30, 'description': 'A lead',
+      'phone_number': '555', 'email': 'joe@test.com',
+    })
+    self.assertRedirects(response, reverse('leads:lead-list'))
+    self.assertEqual(Lead.objects.count(), 1)
+    self.assertEqual(len(mail.outbox), 0)
+    self.assertEqual(OutboxEmail.objects.get().subject, 'A lead has been created')
+
+  def test_password_reset_queues_mail(self):
+    User.objects.create_user(username='organizer', email='organizer@test.com', password='pass')
+    self.client.post(reverse('reset-password'), {'email': 'organizer@test.com'})
+    self.assertEqual(len(mail.outbox), 0)
+    self.assertEqual(OutboxEmail.objects.get().recipients, ['organizer@test.com'])
+
+  def test_worker_sends_batches(self):
+    for i in range(5):
+      queue_mail(f'Subject {i}', 'Body', 'admin@test.com', ['test@test.com'])
+    sent, failed = OutboxWorker(batch_size=2).run()
+    self.assertEqual((sent, failed), (5, 0))
+    self.assertEqual(len(mail.outbox), 5)
+    self.assertFalse(OutboxEmail.objects.exclude(status=OutboxEmail.SENT).exists())
+
+  def test_worker_retries_then_dead_letters(self):
+    email = queue_mail('Subject', 'Body', 'admin@test.com', ['test@test.com'])
+    worker = OutboxWorker(max_attempts=2, retry_backoff=60)
+    with mock.patch.object(worker.connection, 'send_messages', side_effect=OSError('relay down')):
+      self.assertEqual(worker.deliver_batch(), (0, 1))
+      email.refresh_from_db()
+      self.assertEqual((email.status, email.attempts), (OutboxEmail.PENDING, 1))
+      self.assertIn('relay down', email.last_error)
+
+      # Not due again until the backoff has passed
+      self.assertEqual(worker.deliver_batch(), (0, 0))
+      OutboxEmail.objects.update(next_attempt_at=email.created_at)
+      self.assertEqual(worker.deliver_batch(), (0, 1))
+    email.refresh_from_db()
+    self.assertEqual((email.status, email.attempts), (OutboxEmail.DEAD, 2))
+
+  def test_messages_are_leased_while_sending(self):
+    queue_mail('Subject', 'Body', 'admin@test.com', ['test@test.com'])
+    worker = OutboxWorker()
+
+    def send(email):
+      # Claimed and committed before the SMTP round trip, other workers skip it
+      self.assertEqual(OutboxEmail.objects.get().attempts, 1)
+      self.assertEqual(OutboxWorker().claim(), [])
+
+    with mock.patch.object(worker, 'send', side_effect=send):
+      self.assertEqual(worker.deliver_batch(), (1, 0))
+    self.assertEqual(OutboxEmail.objects.get().status, OutboxEmail.SENT)
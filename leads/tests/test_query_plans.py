@@ -0,0 +1,97 @@
+import re
+from django.db import connection
+from django.db.models import Count
+from django.test import TestCase, RequestFactory
+from leads import views
+from leads.models import User, Agent, Category, Lead
+from leads.stats import count_lead_statistics
+
+
+# Matches a full scan of the lead table, but not a scan of one of its indexes
+SEQUENTIAL_SCAN = {
+  'postgresql': re.compile(r'Seq Scan on leads_lead\b'),
+  'sqlite': re.compile(r'\bSCAN leads_lead\b(?! USING)'),
+}
+
+
+class LeadQueryPlanTest(TestCase):
+  """Each tenant-scoped Lead query must be answerable from an index"""
+
+  @classmethod
+  def setUpTestData(cls):
+    leads = []
+    for i in range(4):
+      organizer = User.objects.create_user(username=f'organizer{i}')
+      organization = organizer.userprofile
+      agents = [
+        Agent.objects.create(
+          user=User.objects.create_user(username=f'agent{i}-{j}', is_organizer=False, is_agent=True),
+          organization=organization
+        )
+        for j in range(3)
+      ]
+      categories = [Category.objects.create(name=f'Category{j}', organization=organization) for j in range(3)]
+      for j in range(250):
+        leads.append(Lead(
+          first_name='Joe', last_name=f'Smith{j}', organization=organization,
+          agent=agents[j % 4] if j % 4 < 3 else None,
+          category=categories[j % 5] if j % 5 < 3 else None,
+          description='', phone_number='555', email='joe@test.com'
+        ))
+    Lead.objects.bulk_create(leads)
+    cls.organizer = User.objects.get(username='organizer0')
+    cls.agent_user = User.objects.get(username='agent0-0')
+    cls.lead = Lead.objects.filter(organization=cls.organizer.userprofile).first()
+    cls.category = Category.objects.filter(organization=cls.organizer.userprofile).first()
+    with connection.cursor() as cursor:
+      cursor.execute('ANALYZE')
+
+  def setUp(self):
+    if connection.vendor not in SEQUENTIAL_SCAN:
+      self.skipTest(f'No query plan check for {connection.vendor}')
+    if connection.vendor == 'postgresql':
+      # The seeded table is small enough that a scan would win on cost alone
+      with connection.cursor() as cursor:
+        cursor.execute('SET LOCAL enable_seqscan = off')
+
+  def get_queryset(self, view_class, user, **kwargs):
+    request = RequestFactory().get('/')
+    request.user = user
+    view = view_class()
+    view.setup(request, **kwargs)
+    return view.get_queryset()
+
+  def assertIndexed(self, queryset):
+    plan = queryset.explain()
+    self.assertIsNone(SEQUENTIAL_SCAN[connection.vendor].search(plan), f'{queryset.query}\n{plan}')
+
+  def test_lead_list(self):
+    for user in (self.organizer, self.agent_user):
+      with self.subTest(user=user.username):
+        queryset = self.get_queryset(views.LeadListView, user)
+        self.assertIndexed(queryset.order_by('date_added', 'id')[:50])
+
+  def test_unassigned_leads(self):
+    queryset = Lead.objects.filter(organization=self.organizer.userprofile, agent__isnull=True)
+    self.assertIndexed(queryset.order_by('date_added', 'id')[:10])
+
+  def test_lead_detail_views(self):
+    for view_class in (views.LeadDetailView, views.LeadUpdateView, views.LeadDeleteView, views.LeadCategoryUpdateView):
+      with self.subTest(view=view_class.__name__):
+        queryset = self.get_queryset(view_class, self.organizer, pk=self.lead.pk)
+        self.assertIndexed(queryset.filter(pk=self.lead.pk))
+
+  def test_category_detail_leads(self):
+    self.assertIndexed(self.category.Leads.all())
+
+  def test_uncategorized_leads(self):
+    self.assertIndexed(Lead.objects.filter(organization=self.organizer.userprofile, category__isnull=True))
+
+  def test_statistics_recount(self):
+    organization = self.organizer.userprofile
+    leads = Lead.objects.filter(organization=organization).order_by()
+    for field in ('agent', 'category'):
+      with self.subTest(field=field):
+        self.assertIndexed(leads.values_list(field).annotate(Count('id')))
+    # Sanity check that the seeded data is what the plans were checked against
+    self.assertEqual(sum(v for k, v in count_lead_statistics(organization).items() if k[1] == 'agent'), 250)
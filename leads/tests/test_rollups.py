@@ -0,0 +1,75 @@
+from datetime import timedelta
+from django.shortcuts import reverse
+from django.test import TestCase
+from django.utils import timezone
+from leads.models import User, Agent, Category, Lead, LeadDailyRollup, LeadStatistic
+from leads.rollups import count_days, refresh_rollups
+
+
+class LeadRollupTest(TestCase):
+
+  def setUp(self):
+    self.organizer = User.objects.create_user(username='organizer')
+    self.organization = self.organizer.userprofile
+    self.agent = Agent.objects.create(
+      user=User.objects.create_user(username='agent', email='agent@test.com', is_organizer=False, is_agent=True),
+      organization=self.organization
+    )
+    self.category = Category.objects.create(name='Contacted', organization=self.organization)
+    self.now = timezone.now()
+    # Two leads a day over the last ten days, written an hour ago
+    for days in range(10):
+      for i in range(2):
+        self.create_lead(days_ago=days, agent=self.agent if i else None)
+    self.client.force_login(self.organizer)
+
+  def create_lead(self, days_ago=0, **kwargs):
+    lead = Lead.objects.create(
+      first_name='Joe', last_name='Smith', organization=self.organization, category=self.category,
+      description='', phone_number='555', email='joe@test.com', **kwargs
+    )
+    if days_ago:
+      Lead.objects.filter(pk=lead.pk).update(
+        date_added=self.now - timedelta(days=days_ago), updated_at=self.now - timedelta(hours=1)
+      )
+    return lead
+
+  def stored(self):
+    return {
+      (dimension, day, key): lead_count
+      for dimension, day, key, lead_count in LeadDailyRollup.objects.values_list(
+        'dimension', 'day', 'key', 'lead_count'
+      )
+    }
+
+  def refresh(self):
+    days = []
+    refresh_rollups([self.organization.pk], overlap=timedelta(0), on_organization=lambda pk, count: days.append(count))
+    return days[0]
+
+  def test_incremental_refresh(self):
+    self.assertEqual(self.refresh(), 10)
+    self.assertEqual(self.stored(), count_days(self.organization.pk))
+    self.assertEqual(self.refresh(), 0)
+
+    self.create_lead()
+    Lead.objects.filter(date_added__lt=self.now - timedelta(days=8)).first().delete()
+    self.assertEqual(self.refresh(), 2)
+    self.assertEqual(self.stored(), count_days(self.organization.pk))
+    today = timezone.localdate()
+    self.assertEqual(self.stored()[(LeadStatistic.AGENT, today, LeadStatistic.NONE)], 2)
+
+  def test_dashboard_reads_rollups_only(self):
+    self.refresh()
+    url = reverse('leads:dashboard')
+    # Caches the user
+    self.client.get(url)
+    for days in (30, 200, 2000):
+      with self.subTest(days=days):
+        start = (timezone.localdate() - timedelta(days=days)).isoformat()
+        # Session, three rollup sums, names and the watermark, whatever the range
+        with self.assertNumQueries(7):
+          response = self.client.get(url, {'start': start})
+        self.assertEqual(response.context['total'], 20)
+        self.assertContains(response, 'agent@test.com')
+    self.assertEqual(self.client.get(url, {'end': '2024-02-30'}).status_code, 404)
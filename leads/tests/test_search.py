@@ -0,0 +1,50 @@
+from django.db import connection
+from django.shortcuts import reverse
+from django.test import TestCase
+from leads.models import User, Agent, Lead
+from leads.search import search_leads
+
+
+class LeadSearchTest(TestCase):
+
+  @classmethod
+  def setUpTestData(cls):
+    cls.organizer = User.objects.create_user(username='organizer')
+    organization = cls.organizer.userprofile
+    cls.agent_user = User.objects.create_user(username='agent', is_organizer=False)
+    agent = Agent.objects.create(user=cls.agent_user, organization=organization)
+    other = User.objects.create_user(username='other').userprofile
+    cls.joe = cls.create_lead(organization, 'Joe', 'Smith', agent=agent, description='Wants a quote for roofing')
+    cls.jane = cls.create_lead(organization, 'Jane', 'Smithers', email='jane@roof.com')
+    cls.create_lead(other, 'Joe', 'Smith')
+
+  @classmethod
+  def create_lead(cls, organization, first_name, last_name, email='lead@test.com', **kwargs):
+    kwargs.setdefault('description', '')
+    return Lead.objects.create(
+      first_name=first_name, last_name=last_name, organization=organization,
+      phone_number='613-555-1212', email=email, **kwargs
+    )
+
+  def search(self, user, query):
+    self.client.force_login(user)
+    response = self.client.get(reverse('leads:lead-search'), {'q': query})
+    return {lead.pk for lead in response.context['leads']}
+
+  def test_prefix_terms_across_fields(self):
+    self.assertEqual(self.search(self.organizer, 'smi'), {self.joe.pk, self.jane.pk})
+    self.assertEqual(self.search(self.organizer, 'joe roof'), {self.joe.pk})
+    self.assertEqual(self.search(self.organizer, 'roof'), {self.joe.pk, self.jane.pk})
+
+  def test_results_are_scoped(self):
+    self.assertEqual(self.search(self.agent_user, 'smith'), {self.joe.pk})
+
+  def test_index_follows_updates_and_deletes(self):
+    if connection.vendor != 'sqlite':
+      self.skipTest('FTS5 triggers are SQLite only')
+    self.joe.last_name = 'Brown'
+    self.joe.save()
+    queryset = Lead.objects.filter(organization=self.organizer.userprofile)
+    self.assertEqual(list(search_leads(queryset, 'brown')), [self.joe])
+    self.jane.delete()
+    self.assertEqual(list(search_leads(queryset, 'smithers')), [])
@@ -0,0 +1,84 @@
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.db import connection
+from django.shortcuts import reverse
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from leads.models import User, Agent
+from leads.sessions import SessionStore
+
+
+class CachedUserTest(TestCase):
+
+  def setUp(self):
+    cache.clear()
+    self.organizer = User.objects.create_user(username='organizer')
+    self.agent_user = User.objects.create_user(username='agent', is_organizer=False, is_agent=True)
+    Agent.objects.create(user=self.agent_user, organization=self.organizer.userprofile)
+
+  def auth_queries(self, url):
+    with CaptureQueriesContext(connection) as queries:
+      self.client.get(url)
+    tables = ('leads_user', 'leads_userprofile', 'leads_agent', 'django_session')
+    return [
+      q['sql'] for q in queries
+      if any(table in q['sql'] for table in tables) and 'leads_lead' not in q['sql']
+    ]
+
+  @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cache')
+  def test_steady_state_needs_no_auth_queries(self):
+    for user in (self.organizer, self.agent_user):
+      with self.subTest(user=user.username):
+        self.client.force_login(user)
+        url = reverse('leads:lead-list')
+        self.auth_queries(url)
+        self.assertEqual(self.auth_queries(url), [])
+
+  @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cache')
+  def test_saving_the_user_invalidates_the_cache(self):
+    self.client.force_login(self.organizer)
+    url = reverse('leads:lead-list')
+    self.auth_queries(url)
+    self.organizer.first_name = 'Changed'
+    self.organizer.save()
+    self.assertNotEqual(self.auth_queries(url), [])
+    self.assertEqual(self.auth_queries(url), [])
+
+  def test_deactivated_user_is_logged_out(self):
+    self.client.force_login(self.organizer)
+    self.client.get(reverse('leads:lead-list'))
+    User.objects.filter(pk=self.organizer.pk).update(is_active=False)
+    self.organizer.refresh_from_db()
+    self.organizer.save()
+    response = self.client.get(reverse('leads:lead-list'))
+    self.assertEqual(response.status_code, 302)
+
+
+@override_settings(SESSION_WRITE_BEHIND_INTERVAL=300)
+class WriteBehindSessionTest(TestCase):
+
+  def setUp(self):
+    cache.clear()
+
+  def test_database_is_written_once_per_interval(self):
+    session = SessionStore()
+    session['a'] = 1
+    session.create()
+    session['a'] = 2
+    session.save()
+    self.assertEqual(SessionStore(session.session_key)['a'], 2)
+    stored = Session.objects.get(session_key=session.session_key).get_decoded()
+    self.assertEqual(stored['a'], 1)
+
+    cache.delete(session.cache_key + ':synced')
+    session['a'] = 3
+    session.save()
+    stored = Session.objects.get(session_key=session.session_key).get_decoded()
+    self.assertEqual(stored['a'], 3)
+
+  def test_falls_back_to_the_database(self):
+    session = SessionStore()
+    session['a'] = 1
+    session.create()
+    cache.delete(session.cache_key)
+    self.assertEqual(SessionStore(session.session_key)['a'], 1)
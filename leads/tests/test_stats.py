@@ -0,0 +1,63 @@
+from io import StringIO
+from django.core.management import call_command
+from django.test import TestCase
+from leads.models import User, Agent, Category, Lead, LeadStatistic
+from leads.stats import find_drift
+
+
+class LeadStatisticTest(TestCase):
+
+  def setUp(self):
+    organizer = User.objects.create_user(username='organizer')
+    self.organization = organizer.userprofile
+    agent_user = User.objects.create_user(username='agent', is_organizer=False, is_agent=True)
+    self.agent = Agent.objects.create(user=agent_user, organization=self.organization)
+    self.category = Category.objects.create(name='Contacted', organization=self.organization)
+    self.lead = self.create_lead()
+
+  def create_lead(self, **kwargs):
+    return Lead.objects.create(
+      first_name='Joe', last_name='Smith', organization=self.organization,
+      description='', phone_number='555', email='joe@test.com', **kwargs
+    )
+
+  def counts(self, dimension):
+    return LeadStatistic.objects.counts(self.organization, dimension)
+
+  def test_counts_follow_saves_and_deletes(self):
+    self.create_lead(agent=self.agent)
+    self.assertEqual(self.counts(LeadStatistic.AGENT), {LeadStatistic.NONE: 1, self.agent.pk: 1})
+
+    self.lead.agent = self.agent
+    self.lead.category = self.category
+    self.lead.save()
+    self.assertEqual(self.counts(LeadStatistic.AGENT), {LeadStatistic.NONE: 0, self.agent.pk: 2})
+    self.assertEqual(self.counts(LeadStatistic.CATEGORY), {LeadStatistic.NONE: 1, self.category.pk: 1})
+
+    self.lead.delete()
+    self.assertEqual(self.counts(LeadStatistic.AGENT), {LeadStatistic.NONE: 0, self.agent.pk: 1})
+    self.assertEqual(find_drift(self.organization), [])
+
+  def test_deleting_an_agent_moves_its_leads_to_unassigned(self):
+    self.create_lead(agent=self.agent)
+    self.agent.delete()
+    self.assertEqual(self.counts(LeadStatistic.AGENT), {LeadStatistic.NONE: 2})
+    self.assertEqual(find_drift(self.organization), [])
+
+  def test_deleting_an_agents_user_moves_its_leads_to_unassigned(self):
+    self.create_lead(agent=self.agent)
+    self.agent.user.delete()
+    self.assertEqual(self.counts(LeadStatistic.AGENT), {LeadStatistic.NONE: 2})
+    self.assertEqual(find_drift(self.organization), [])
+
+  def test_deleting_the_organizer_deletes_the_statistics(self):
+    self.create_lead(agent=self.agent)
+    self.organization.user.delete()
+    self.assertFalse(LeadStatistic.objects.exists())
+
+  def test_rebuild_command_fixes_drift(self):
+    Lead.objects.filter(pk=self.lead.pk).update(category=self.category)
+    out = StringIO()
+    call_command('rebuild_lead_statistics', stdout=out)
+    self.assertIn('stored 0, actual 1', out.getvalue())
+    self.assertEqual(find_drift(self.organization), [])
@@ -1,5 +1,10 @@
+from unittest import mock
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.shortcuts import reverse
+from leads.models import User, Agent, Category, Lead
+from leads.views import LeadListView
 
 
 class LandingPageTest(TestCase):
@@ -9,3 +14,137 @@ class LandingPageTest(TestCase):
     response = self.client.get(reverse('landing-page'))
     self.assertEqual(response.status_code, 200)
     self.assertTemplateUsed(response, 'landing.html')
+
+
+class LeadListViewTest(TestCase):
+
+  @classmethod
+  def setUpTestData(cls):
+    cls.organizer = User.objects.create_user(username='organizer', password='pass')
+    organization = cls.organizer.userprofile
+    agent_user = User.objects.create_user(username='agent', is_organizer=False, is_agent=True)
+    agent = Agent.objects.create(user=agent_user, organization=organization)
+    category = Category.objects.create(name='Contacted', organization=organization)
+    for i in range(7):
+      Lead.objects.create(
+        first_name=f'Lead{i}', last_name='Smith', organization=organization,
+        agent=agent, category=category, description='', phone_number='555', email='a@b.com'
+      )
+
+  def setUp(self):
+    self.client.force_login(self.organizer)
+
+  @mock.patch.object(LeadListView, 'paginate_by', 3)
+  def test_keyset_pages_cover_all_leads(self):
+    url = reverse('leads:lead-list')
+    seen = []
+    params = {}
+    while True:
+      response = self.client.get(url, params)
+      page = response.context['page_obj']
+      seen.extend(lead.first_name for lead in page)
+      if not page.has_next():
+        break
+      params = {'after': page.next_cursor}
+    self.assertEqual(seen, [f'Lead{i}' for i in range(7)])
+
+    response = self.client.get(url, {'before': page.previous_cursor})
+    self.assertEqual([lead.first_name for lead in response.context['page_obj']], ['Lead3', 'Lead4', 'Lead5'])
+
+  def test_category_is_not_fetched_per_row(self):
+    url = reverse('leads:lead-list')
+    with self.assertNumQueries(4):
+      self.client.get(url)
+
+  def test_agent_tenant_is_resolved_once(self):
+    self.client.force_login(User.objects.get(username='agent'))
+    # session, user with its agent and organization, leads
+    with self.assertNumQueries(3):
+      response = self.client.get(reverse('leads:lead-list'))
+    self.assertEqual(len(response.context['leads']), 7)
+
+  def test_cannot_assign_another_organizations_lead(self):
+    other = User.objects.create_user(username='other')
+    other_agent = Agent.objects.create(
+      user=User.objects.create_user(username='other-agent'), organization=other.userprofile
+    )
+    self.client.force_login(other)
+    lead = Lead.objects.first()
+    response = self.client.post(reverse('leads:assign-agent', args=[lead.pk]), {'agent': other_agent.pk})
+    self.assertEqual(response.status_code, 404)
+    self.assertNotEqual(Lead.objects.get(pk=lead.pk).agent, other_agent)
+    self.assertEqual(self.client.get(reverse('leads:lead-detail', args=[lead.pk])).status_code, 404)
+
+
+class CategoryListViewTest(TestCase):
+
+  def create_organization(self, username, category_count):
+    organizer = User.objects.create_user(username=username)
+    organization = organizer.userprofile
+    for i in range(category_count):
+      category = Category.objects.create(name=f'Category{i}', organization=organization)
+      for j in range(i + 1):
+        Lead.objects.create(
+          first_name=f'Lead{j}', last_name='Smith', organization=organization,
+          category=category, description='', phone_number='555', email='a@b.com'
+        )
+    Lead.objects.create(
+      first_name='New', last_name='Lead', organization=organization,
+      description='', phone_number='555', email='a@b.com'
+    )
+    return organizer
+
+  def get_query_count(self, organizer):
+    self.client.force_login(organizer)
+    with CaptureQueriesContext(connection) as queries:
+      response = self.client.get(reverse('leads:category-list'))
+    self.assertEqual(response.status_code, 200)
+    return response, len(queries)
+
+  def test_lead_counts(self):
+    response, _ = self.get_query_count(self.create_organization('organizer', 3))
+    counts = {category.name: category.lead_count for category in response.context['category_list']}
+    self.assertEqual(counts, {'Category0': 1, 'Category1': 2, 'Category2': 3})
+    self.assertEqual(response.context['unassigned_lead_count'], 1)
+    self.assertContains(response, '<td class="px-4 py-3">3</td>', html=True)
+
+  def test_query_count_does_not_depend_on_category_count(self):
+    _, small = self.get_query_count(self.create_organization('small', 1))
+    _, large = self.get_query_count(self.create_organization('large', 12))
+    self.assertEqual(small, large)
+
+
+class LeadExportViewTest(TestCase):
+
+  @classmethod
+  def setUpTestData(cls):
+    cls.organizer = User.objects.create_user(username='organizer')
+    organization = cls.organizer.userprofile
+    cls.agent_user = User.objects.create_user(username='agent', email='agent@test.com', is_organizer=False)
+    agent = Agent.objects.create(user=cls.agent_user, organization=organization)
+    for i, lead_agent in enumerate((agent, None, agent)):
+      Lead.objects.create(
+        first_name=f'Lead{i}', last_name='Smith', organization=organization,
+        agent=lead_agent, description='', phone_number='555', email=f'lead{i}@test.com'
+      )
+
+  def export(self, user, format, **params):
+    self.client.force_login(user)
+    response = self.client.get(reverse('leads:lead-export', args=[format]), params)
+    return response, b''.join(response.streaming_content).decode() if response.streaming else None
+
+  def test_csv_columns_and_filters(self):
+    response, content = self.export(self.organizer, 'csv', columns='first_name,agent', agent='none')
+    self.assertEqual(response['Content-Type'], 'text/csv')
+    self.assertEqual(content.splitlines(), ['first_name,agent', 'Lead1,'])
+
+  def test_agents_only_export_their_leads(self):
+    _, content = self.export(self.agent_user, 'jsonl', columns='first_name,agent')
+    self.assertEqual(content.splitlines(), [
+      '{"first_name":"Lead0","agent":"agent@test.com"}',
+      '{"first_name":"Lead2","agent":"agent@test.com"}',
+    ])
+
+  def test_unknown_column(self):
+    response, _ = self.export(self.organizer, 'csv', columns='password')
+    self.assertEqual(response.status_code, 400)
@@ -1,16 +1,41 @@
+from django.conf import settings
 from django.urls import path
-from .views import LeadListView, LeadDetailView, LeadCreateView, LeadUpdateView, LeadDeleteView, AssignAgentView, CategoryListView, CategoryDetailView, LeadCategoryUpdateView
+from . import async_views, views
+from .views import (
+  LeadCreateView, LeadUpdateView, LeadDeleteView, AssignAgentView, LeadCategoryUpdateView, LeadImportView,
+  LeadExportView, LeadSearchView, DistributeLeadsView, LeadActivityListView, ArchivedLeadListView,
+  ArchivedLeadDetailView, ArchivedLeadRestoreView, DashboardView, DuplicateLeadListView, LeadMergeView
+)
+from .api import LeadApiView, LeadApiDetailView, CategoryApiView, AgentApiView
+
+# Read-heavy pages as async views, for the ASGI deployment
+read_views = async_views if settings.ASYNC_VIEWS else views
 
 app_name = 'leads'
 
 urlpatterns = [
-  path('', LeadListView.as_view(), name='lead-list'),
-  path('<int:pk>/', LeadDetailView.as_view(), name='lead-detail'),
+  path('', read_views.LeadListView.as_view(), name='lead-list'),
+  path('<int:pk>/', read_views.LeadDetailView.as_view(), name='lead-detail'),
   path('<int:pk>/update', LeadUpdateView.as_view(), name='lead-update'),
   path('<int:pk>/delete', LeadDeleteView.as_view(), name='lead-delete'),
   path('<int:pk>/assign-agent/', AssignAgentView.as_view(), name='assign-agent'),
   path('<int:pk>/category/', LeadCategoryUpdateView.as_view(), name='lead-category-update'),
+  path('<int:pk>/merge/<int:other>/', LeadMergeView.as_view(), name='lead-merge'),
   path('create/', LeadCreateView.as_view(), name='lead-create'),
-  path('categories/', CategoryListView.as_view(), name='category-list'),
-  path('categories/<int:pk>/', CategoryDetailView.as_view(), name='category-detail'),
+  path('search/', LeadSearchView.as_view(), name='lead-search'),
+  path('import/', LeadImportView.as_view(), name='lead-import'),
+  path('distribute/', DistributeLeadsView.as_view(), name='distribute-leads'),
+  path('archive/', ArchivedLeadListView.as_view(), name='archived-lead-list'),
+  path('archive/<int:pk>/', ArchivedLeadDetailView.as_view(), name='archived-lead-detail'),
+  path('archive/<int:pk>/restore/', ArchivedLeadRestoreView.as_view(), name='archived-lead-restore'),
+  path('duplicates/', DuplicateLeadListView.as_view(), name='duplicate-list'),
+  path('dashboard/', DashboardView.as_view(), name='dashboard'),
+  path('activity/', LeadActivityListView.as_view(), name='lead-activity'),
+  path('export.<str:format>', LeadExportView.as_view(), name='lead-export'),
+  path('categories/', read_views.CategoryListView.as_view(), name='category-list'),
+  path('categories/<int:pk>/', read_views.CategoryDetailView.as_view(), name='category-detail'),
+  path('api/leads/', LeadApiView.as_view(), name='api-lead-list'),
+  path('api/leads/<int:pk>/', LeadApiDetailView.as_view(), name='api-lead-detail'),
+  path('api/categories/', CategoryApiView.as_view(), name='api-category-list'),
+  path('api/agents/', AgentApiView.as_view(), name='api-agent-list'),
 ]
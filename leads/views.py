@@ -1,10 +1,31 @@
-from django.shortcuts import reverse
+from datetime import timedelta
+from django.conf import settings
+from django.http import Http404, HttpResponseBadRequest, HttpResponseRedirect, StreamingHttpResponse
+from django.shortcuts import redirect, reverse, get_object_or_404
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.core.mail import send_mail
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.utils.functional import SimpleLazyObject, cached_property
 from django.views  import generic
-from .models import Lead, Category
-from .forms import LeadModelForm, CustomUserCreationForm, AssignAgentForm, LeadCategoryUpdateForm
+from .models import Lead, ArchivedLead, Category, DuplicateLeadPair, LeadActivity, LeadStatistic
+from .forms import (
+  LeadModelForm, CustomUserCreationForm, AssignAgentForm, LeadCategoryUpdateForm, LeadImportForm,
+  AssignmentStrategyForm
+)
+from .activity import ActivityPage
+from .archive import restore_lead, search_archived_leads
+from .assignment import assign_new_leads, distribute_backlog
+from .conditional import OrganizationConditionMixin
+from .dedup import find_duplicates, merge_leads
+from .export import EXPORT_COLUMNS, filter_leads, start_of_day, stream_csv, stream_jsonl
+from .importer import LeadImporter, guess_format, open_upload, read_rows
+from .outbox import queue_mail
+from .pagination import KeysetPaginationMixin
+from .rollups import dashboard
+from .search import search_leads
 from agents.mixin import OrganizerAndLoginRequiredMixin
+from djcrm.metrics import LEADS_ASSIGNED, LEADS_CREATED
 
 
 # CRUD+L - Create, Retrieve (Read), Update, Delete, and List
@@ -22,46 +43,193 @@ class LandingPageView(generic.TemplateView):
   template_name = 'landing.html'
 
 
-class LeadListView(LoginRequiredMixin, generic.ListView):
+class LeadListView(LoginRequiredMixin, OrganizationConditionMixin, KeysetPaginationMixin, generic.ListView):
   template_name = 'leads/lead_list.html'
   context_object_name = 'leads'
+  paginate_by = 50
+  unassigned_paginate_by = 10
 
   def get_queryset(self):
-    user = self.request.user
-    # Initial queryset of leads for an organizer
-    if user.is_organizer:
-      queryset = Lead.objects.filter(organization=user.userprofile, agent__isnull=False)
-    else:
-      queryset = Lead.objects.filter(organization=user.agent.organization, agent__isnull=False)
-      # agent filter for current logged in user
-      queryset = queryset.filter(agent__user=user)
-    return queryset
+    queryset = Lead.objects.for_user(self.request.user).filter(agent__isnull=False)
+    # description is not shown in the table
+    return queryset.select_related('category').defer('description')
   
   def get_context_data(self, **kwargs):
     user = self.request.user
     context = super(LeadListView, self).get_context_data(**kwargs)
     if user.is_organizer:
-      queryset = Lead.objects.filter(organization=user.userprofile, agent__isnull=True)
+      queryset = Lead.objects.for_user(user).filter(agent__isnull=True)
       context.update({
-        "unassigned_leads": queryset
+        "unassigned_leads": self.keyset_paginate(
+          queryset.only('first_name', 'last_name', 'description', 'date_added'),
+          self.unassigned_paginate_by,
+          prefix='unassigned_'
+        )
       })
     return context
 
 
-class LeadDetailView(LoginRequiredMixin, generic.DetailView):
+class LeadTimelineMixin:
+  activities_per_page = 20
+
+  def get_context_data(self, **kwargs):
+    context = super(LeadTimelineMixin, self).get_context_data(**kwargs)
+    # Newest first, from the (lead, timestamp, id) index
+    activities = LeadActivity.objects.filter(lead_id=self.object.pk).select_related('actor').only(
+      'lead', 'action', 'changes', 'timestamp', 'actor', 'actor__username'
+    )
+    context.update({
+      'activities': ActivityPage(
+        activities,
+        ('-timestamp', '-id'),
+        self.activities_per_page,
+        after=self.request.GET.get('activity_after'),
+        before=self.request.GET.get('activity_before'),
+      )
+    })
+    return context
+
+
+class LeadDetailView(LoginRequiredMixin, OrganizationConditionMixin, LeadTimelineMixin, generic.DetailView):
   template_name = 'leads/lead_detail.html'
   context_object_name = 'lead'
 
   def get_queryset(self):
-    user = self.request.user
-    # Initial queryset of leads for an organizer
-    if user.is_organizer:
-      queryset = Lead.objects.filter(organization=user.userprofile)
+    return Lead.objects.for_user(self.request.user)
+
+  def get(self, request, *args, **kwargs):
+    try:
+      return super(LeadDetailView, self).get(request, *args, **kwargs)
+    except Http404:
+      # Links to archived leads lead to their archived page, where they can be restored
+      if ArchivedLead.objects.for_user(request.user).filter(pk=kwargs['pk']).exists():
+        return redirect('leads:archived-lead-detail', pk=kwargs['pk'])
+      raise
+
+
+class LeadActivityListView(OrganizerAndLoginRequiredMixin, KeysetPaginationMixin, generic.ListView):
+  """Everything that happened to the organization's leads on one day, today unless `day` is given"""
+  template_name = 'leads/lead_activity.html'
+  context_object_name = 'activities'
+  keyset_ordering = ('-timestamp', '-id')
+  keyset_page_class = ActivityPage
+
+  @cached_property
+  def day(self):
+    return self.request.GET.get('day') or timezone.localdate().isoformat()
+
+  def get_queryset(self):
+    try:
+      start, end = start_of_day(self.day), start_of_day(self.day, days_later=1)
+    except ValueError:
+      raise Http404('Invalid day')
+    # A range of the (organization, timestamp, id) index
+    queryset = LeadActivity.objects.filter(
+      organization=self.request.tenant.organization, timestamp__gte=start, timestamp__lt=end
+    )
+    return queryset.select_related('actor', 'lead').only(
+      'action', 'changes', 'timestamp', 'actor', 'actor__username', 'lead', 'lead__first_name', 'lead__last_name'
+    )
+
+  def get_context_data(self, **kwargs):
+    context = super(LeadActivityListView, self).get_context_data(**kwargs)
+    context.update({
+      'day': self.day,
+    })
+    return context
+
+
+class LeadExportView(LoginRequiredMixin, generic.View):
+  """
+  Stream the user's leads as CSV or JSON Lines. `columns` picks the fields and
+  `agent`, `category` (an id or "none"), `added_after` and `added_before` filter.
+  """
+  chunk_size = 2000
+
+  def get_queryset(self):
+    return Lead.objects.for_user(self.request.user)
+
+  def get(self, request, *args, **kwargs):
+    format = kwargs['format']
+    if format not in ('csv', 'jsonl'):
+      raise Http404('Unknown export format')
+    columns = request.GET.get('columns')
+    columns = columns.split(',') if columns else list(EXPORT_COLUMNS)
+    if any(column not in EXPORT_COLUMNS for column in columns):
+      return HttpResponseBadRequest(f'Columns must be among {", ".join(EXPORT_COLUMNS)}')
+    try:
+      queryset = filter_leads(self.get_queryset(), request.GET)
+    except (TypeError, ValueError):
+      return HttpResponseBadRequest('Invalid filter')
+
+    # A server-side cursor keeps only one chunk of rows in memory at a time
+    rows = queryset.order_by('date_added', 'id').values_list(
+      *[EXPORT_COLUMNS[column] for column in columns]
+    ).iterator(chunk_size=self.chunk_size)
+    if format == 'csv':
+      content = stream_csv(columns, rows)
+      content_type = 'text/csv'
     else:
-      queryset = Lead.objects.filter(organization=user.agent.organization)
-      # agent filter for current logged in user
-      queryset = queryset.filter(agent__user=user)
-    return queryset
+      content = stream_jsonl(columns, rows)
+      content_type = 'application/x-ndjson'
+    response = StreamingHttpResponse(content, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="leads.{format}"'
+    return response
+
+
+class ArchivedLeadListView(OrganizerAndLoginRequiredMixin, KeysetPaginationMixin, generic.ListView):
+  template_name = 'leads/archived_lead_list.html'
+  context_object_name = 'leads'
+
+  def get_queryset(self):
+    queryset = ArchivedLead.objects.for_user(self.request.user)
+    query = self.request.GET.get('q', '')
+    if query:
+      queryset = search_archived_leads(queryset, query)
+    return queryset.only('first_name', 'last_name', 'email', 'date_added', 'archived_at')
+
+  def get_context_data(self, **kwargs):
+    context = super(ArchivedLeadListView, self).get_context_data(**kwargs)
+    context.update({
+      'query': self.request.GET.get('q', ''),
+    })
+    return context
+
+
+class ArchivedLeadDetailView(LoginRequiredMixin, LeadTimelineMixin, generic.DetailView):
+  template_name = 'leads/archived_lead_detail.html'
+  context_object_name = 'lead'
+
+  def get_queryset(self):
+    return ArchivedLead.objects.for_user(self.request.user)
+
+
+class ArchivedLeadRestoreView(OrganizerAndLoginRequiredMixin, generic.View):
+  http_method_names = ['post']
+
+  def post(self, request, *args, **kwargs):
+    archived = get_object_or_404(ArchivedLead.objects.for_user(request.user), pk=kwargs['pk'])
+    lead = restore_lead(archived)
+    return redirect('leads:lead-detail', pk=lead.pk)
+
+
+class LeadSearchView(LoginRequiredMixin, generic.ListView):
+  template_name = 'leads/lead_search.html'
+  context_object_name = 'leads'
+  max_results = 50
+
+  def get_queryset(self):
+    queryset = Lead.objects.for_user(self.request.user).select_related('category')
+    queryset = search_leads(queryset, self.request.GET.get('q', ''))
+    return queryset[:self.max_results]
+
+  def get_context_data(self, **kwargs):
+    context = super(LeadSearchView, self).get_context_data(**kwargs)
+    context.update({
+      'query': self.request.GET.get('q', ''),
+      'max_results': self.max_results
+    })
+    return context
 
 
 class LeadCreateView(OrganizerAndLoginRequiredMixin, generic.CreateView):
@@ -71,16 +239,25 @@ class LeadCreateView(OrganizerAndLoginRequiredMixin, generic.CreateView):
   def get_success_url(self):
     return reverse('leads:lead-list')
 
+  @transaction.atomic
   def form_valid(self, form):
     lead = form.save(commit=False)
-    lead.organization = self.request.user.userprofile
+    lead.organization = self.request.tenant.organization
+    if not self.request.POST.get('create_anyway'):
+      duplicates = find_duplicates(lead)
+      if duplicates:
+        return self.render_to_response(self.get_context_data(form=form, duplicates=duplicates))
     lead.save()
-    send_mail(
+    assign_new_leads(lead.organization, [lead])
+    LEADS_CREATED.inc(source='web')
+    queue_mail(
       subject='A lead has been created', 
       message='Please go to the CRM site to see details of the new lead', from_email='admin@test.com', 
       recipient_list=['test@test.com']
       )
-    return super(LeadCreateView, self).form_valid(form)
+    # The lead is already saved, don't let ModelFormMixin save it a second time
+    self.object = lead
+    return HttpResponseRedirect(self.get_success_url())
 
 
 class LeadUpdateView(OrganizerAndLoginRequiredMixin, generic.UpdateView):
@@ -88,8 +265,7 @@ class LeadUpdateView(OrganizerAndLoginRequiredMixin, generic.UpdateView):
   form_class = LeadModelForm
 
   def get_queryset(self):
-    user = self.request.user
-    return Lead.objects.filter(organization=user.userprofile)
+    return Lead.objects.for_user(self.request.user)
 
   def get_success_url(self):
     return reverse('leads:lead-list')
@@ -99,13 +275,68 @@ class LeadDeleteView(OrganizerAndLoginRequiredMixin, generic.DeleteView):
   template_name = 'leads/lead_delete.html'
   
   def get_queryset(self):
-    user = self.request.user
-    return Lead.objects.filter(organization=user.userprofile)
+    return Lead.objects.for_user(self.request.user)
 
   def get_success_url(self):
     return reverse('leads:lead-list')
 
 
+class DuplicateLeadListView(OrganizerAndLoginRequiredMixin, KeysetPaginationMixin, generic.ListView):
+  """Pairs found by the last sweep_duplicates run, most likely first"""
+  template_name = 'leads/duplicate_list.html'
+  context_object_name = 'pairs'
+  keyset_ordering = ('-score', 'id')
+
+  def get_queryset(self):
+    pairs = DuplicateLeadPair.objects.filter(organization=self.request.tenant.organization)
+    return pairs.select_related('lead', 'duplicate')
+
+
+class LeadMergeView(OrganizerAndLoginRequiredMixin, generic.TemplateView):
+  """Merge two leads, keeping the one picked and filling its blanks from the other"""
+  template_name = 'leads/lead_merge.html'
+
+  def get_leads(self):
+    leads = Lead.objects.for_user(self.request.user).select_related('agent__user', 'category').in_bulk(
+      [self.kwargs['pk'], self.kwargs['other']]
+    )
+    if len(leads) != 2:
+      raise Http404('No such leads')
+    return leads[self.kwargs['pk']], leads[self.kwargs['other']]
+
+  def get_context_data(self, **kwargs):
+    context = super(LeadMergeView, self).get_context_data(**kwargs)
+    context.update({
+      'leads': self.get_leads(),
+    })
+    return context
+
+  def post(self, request, *args, **kwargs):
+    lead, other = self.get_leads()
+    kept, merged = (other, lead) if request.POST.get('keep') == str(other.pk) else (lead, other)
+    merge_leads(kept, merged)
+    return redirect('leads:lead-detail', pk=kept.pk)
+
+
+class LeadImportView(OrganizerAndLoginRequiredMixin, generic.FormView):
+  template_name = 'leads/lead_import.html'
+  form_class = LeadImportForm
+
+  def form_valid(self, form):
+    upload = form.cleaned_data['file']
+    format = form.cleaned_data['format'] or guess_format(upload.name)
+    stream = open_upload(upload)
+    importer = LeadImporter(
+      self.request.tenant.organization,
+      batch_size=settings.LEAD_IMPORT_BATCH_SIZE,
+      skip_duplicates=form.cleaned_data['skip_duplicates']
+    )
+    result = importer.run(read_rows(stream, format))
+    if result.unreadable:
+      form.add_error('file', f'{result.unreadable}, the import stopped after {result.created} lead(s)')
+    return self.render_to_response(self.get_context_data(form=form, result=result))
+
+
 class AssignAgentView(OrganizerAndLoginRequiredMixin, generic.FormView):
   template_name = 'leads/assign_agent.html'
   form_class = AssignAgentForm
@@ -122,68 +353,98 @@ class AssignAgentView(OrganizerAndLoginRequiredMixin, generic.FormView):
 
   def form_valid(self, form):
     agent = form.cleaned_data['agent']
-    lead = Lead.objects.get(id=self.kwargs['pk'])
+    lead = get_object_or_404(Lead.objects.for_user(self.request.user), pk=self.kwargs['pk'])
     lead.agent = agent
     lead.save()
+    LEADS_ASSIGNED.inc(method='manual')
     return super(AssignAgentView, self).form_valid(form)
 
 
-class CategoryListView(OrganizerAndLoginRequiredMixin, generic.ListView):
+class DistributeLeadsView(OrganizerAndLoginRequiredMixin, generic.UpdateView):
+  template_name = 'leads/distribute_leads.html'
+  form_class = AssignmentStrategyForm
+
+  def get_object(self, queryset=None):
+    return self.request.tenant.organization
+
+  def get_success_url(self):
+    return reverse('leads:lead-list')
+
+  def form_valid(self, form):
+    response = super(DistributeLeadsView, self).form_valid(form)
+    if form.cleaned_data['distribute_now']:
+      distribute_backlog(self.object)
+    return response
+
+
+class DashboardView(OrganizerAndLoginRequiredMixin, generic.TemplateView):
+  """Lead trends read from the daily rollups only, last 30 days unless `start` / `end` are given"""
+  template_name = 'leads/dashboard.html'
+  default_days = 30
+
+  def get_range(self):
+    try:
+      # parse_date() returns None for malformed dates but raises for impossible ones like 2024-02-30
+      end = parse_date(self.request.GET.get('end') or '') or timezone.localdate()
+      start = parse_date(self.request.GET.get('start') or '') or end - timedelta(days=self.default_days - 1)
+    except ValueError:
+      raise Http404('Invalid date')
+    return min(start, end), max(start, end)
+
+  def get_context_data(self, **kwargs):
+    context = super(DashboardView, self).get_context_data(**kwargs)
+    start, end = self.get_range()
+    context.update(dashboard(self.request.tenant.organization, start, end))
+    context.update({
+      'start': start,
+      'end': end,
+    })
+    return context
+
+
+class CategoryListView(OrganizerAndLoginRequiredMixin, OrganizationConditionMixin, generic.ListView):
   template_name = 'leads/category_list.html'
   context_object_name = 'category_list'
 
+  @cached_property
+  def lead_counts(self):
+    # One lookup in the statistics table, key NONE being the unassigned leads
+    return LeadStatistic.objects.counts(self.request.tenant.organization, LeadStatistic.CATEGORY)
+
+  def get_categories_with_counts(self):
+    category_list = list(self.object_list)
+    for category in category_list:
+      category.lead_count = self.lead_counts.get(category.pk, 0)
+    return category_list
+
   def get_context_data(self, **kwargs):
     context = super(CategoryListView, self).get_context_data(**kwargs)
-    user = self.request.user
-    if user.is_organizer:
-      queryset = Lead.objects.filter(organization=user.userprofile)
-    else:
-      queryset = Lead.objects.filter(organization=user.agent.organization)
-
+    # Lazy, so that nothing is queried when the template fragment is cached
     context.update({
-      'unassigned_lead_count': queryset.filter(category__isnull=True).count()
+      'category_list': SimpleLazyObject(self.get_categories_with_counts),
+      'unassigned_lead_count': SimpleLazyObject(lambda: self.lead_counts.get(LeadStatistic.NONE, 0))
     })
     return context
 
   def get_queryset(self):
-    user = self.request.user
-    if user.is_organizer:
-      queryset = Category.objects.filter(organization=user.userprofile)
-    else:
-      queryset = Category.objects.filter(organization=user.agent.organization)
-    return queryset
+    return Category.objects.for_user(self.request.user)
 
 
-class CategoryDetailView(LoginRequiredMixin, generic.DetailView):
+class CategoryDetailView(LoginRequiredMixin, OrganizationConditionMixin, generic.DetailView):
   template_name = 'leads/category_detail.html'
   context_object_name = 'category'
 
-  # def get_context_data(self, **kwargs):
-  #   context = super(CategoryDetailView, self).get_context_data(**kwargs)
-  #   leads = self.get_object().Leads.all()
-
-  #   context.update({
-  #     'leads': leads,
-  #   })
-  #   return context
-
-  def get_queryset(self):
-    user = self.request.user
-    if user.is_organizer:
-      queryset = Category.objects.filter(organization=user.userprofile)
-    else:
-      queryset = Category.objects.filter(organization=user.agent.organization)
-    return queryset
+  def get_context_data(self, **kwargs):
+    context = super(CategoryDetailView, self).get_context_data(**kwargs)
+    leads = Lead.objects.for_user(self.request.user).filter(category=self.object)
 
+    context.update({
+      'leads': leads.only('first_name', 'last_name').order_by('date_added', 'id'),
+    })
+    return context
 
   def get_queryset(self):
-    user = self.request.user
-    # Initial queryset of leads for an organizer
-    if user.is_organizer:
-      queryset = Category.objects.filter(organization=user.userprofile)
-    else:
-      queryset = Category.objects.filter(organization=user.agent.organization)
-    return queryset
+    return Category.objects.for_user(self.request.user)
 
 
 class LeadCategoryUpdateView(LoginRequiredMixin, generic.UpdateView):
@@ -191,12 +452,7 @@ class LeadCategoryUpdateView(LoginRequiredMixin, generic.UpdateView):
   form_class = LeadCategoryUpdateForm
 
   def get_queryset(self):
-    user = self.request.user
-    if user.is_organizer:
-      queryset = Lead.objects.filter(organization=user.userprofile)
-    else:
-      queryset = Lead.objects.filter(organization=user.agent.organization)
-    return queryset
+    return Lead.objects.for_user(self.request.user)
 
   def get_success_url(self):
-    return reverse('leads:lead-detail', kwargs={'pk': self.get_object().id})
+    return reverse('leads:lead-detail', kwargs={'pk': self.object.id})
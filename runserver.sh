@@ -1,7 +1,20 @@
 #!/bin/sh
 
-python manage.py collectstatic --no-input
+# collectstatic and migrate only run when static files changed or migrations
+# are pending, BOOT=full runs both anyway
+if [ "$BOOT" = "full" ]; then
+  python manage.py boot --force
+else
+  python manage.py boot
+fi
 
-python manage.py migrate
+# Metric files of the previous run, see djcrm.metrics
+rm -rf "${METRICS_DIR:-/tmp/djcrm-metrics}"
 
-gunicorn --worker-tmp-dir /dev/shm djcrm.wsgi
+# SERVER=asgi ./runserver.sh starts the ASGI server instead, both read gunicorn.conf.py
+if [ "$SERVER" = "asgi" ]; then
+  # One event loop per worker keeps many slow clients in flight at once
+  ASYNC_VIEWS=True exec gunicorn -k uvicorn.workers.UvicornWorker djcrm.asgi
+else
+  exec gunicorn djcrm.wsgi
+fi